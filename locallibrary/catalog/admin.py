@@ -1,5 +1,11 @@
-from django.contrib import admin
-from .models import Author, Genre, Book, BookInstance, Language
+import datetime
+from django.contrib import admin, messages
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.html import format_html
+from . import circulation
+from .pagination import EstimatedCountPaginator
+from .models import Author, Genre, Book, BookInstance, CirculationEvent, Hold, Language
 # в обязательном порядке импортируем внедренные модели
 
 admin.site.register(Genre) # регистрация модели
@@ -19,33 +25,133 @@ admin.site.register(Language)
 
 
 
+class LimitedInlineFormSet(BaseInlineFormSet):
+    # у популярной книги или плодовитого автора сотни строк: форма изменения показывает только
+    # первые max_rows, остальные открываются ссылкой на отфильтрованный список
+    max_rows = 20
+
+    def get_queryset(self):
+        # порядок модели (due_back у экземпляров, title у книг) повторяется и бывает NULL: без pk
+        # GET формы и ее POST могли бы взять разные max_rows строк и изменить не тот экземпляр
+        if not hasattr(self, '_limited_queryset'):
+            queryset = super().get_queryset()
+            ordering = queryset.query.order_by or queryset.model._meta.ordering
+            self._limited_queryset = queryset.order_by(*ordering, 'pk')[:self.max_rows]
+        return self._limited_queryset
+
+
 class BookInstanceInline(admin.TabularInline): # класс позволяющий определить вид отображения таблицы и внедрения её в иной модуль
     model = BookInstance                       # данный класс наследуется от TabularInline вид отображение, в данном случае
                                                # в горизональном виде, также имеется и второй вид отображаения передающийся из
                                                # StackedInline позволяющий отобразить данные в вертикальном формате
                                                # исползьует атрибут model который принимает модель которая будет подтвержена изменению
                                                # и внедрению в данном случае BookInstance 
+    formset = LimitedInlineFormSet
+    extra = 0
+    # читатель выбирается поиском, а не <select> со всеми пользователями в каждой строке
+    autocomplete_fields = ('borrower',)
 
 class BookInline(admin.TabularInline):
     model = Book
+    formset = LimitedInlineFormSet
+    extra = 0
+    # книги автора только просматриваются и открываются ссылкой: жанры и язык в каждой строке
+    # означали бы полный список вариантов на строку
+    fields = ('title', 'isbn')
+    show_change_link = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'dislpay_genre', 'language',)
     inlines = [BookInstanceInline] # данный атрибут принимает внутрь себя класс содержащий в себе модель для внедрения её 
                                    # внутрь колонок
+    list_select_related = ('author', 'language')
+    search_fields = ('title', 'isbn')
+    autocomplete_fields = ('author',)
+    readonly_fields = ('copies_link',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # dislpay_genre читает жанры из prefetch: один запрос на страницу, а не на строку
+        return super().get_queryset(request).prefetch_related('genre')
+
+    @admin.display(description='Экземпляры')
+    def copies_link(self, obj):
+        if obj.pk is None:
+            return '—'
+        url = reverse('admin:catalog_bookinstance_changelist') + f'?book__id__exact={obj.pk}'
+        return format_html('<a href="{}">Все экземпляры ({})</a>', url, obj.bookinstance_set.count())
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
     list_display = ('book','status','due_back','id', 'borrower')
     list_filter = ('status', 'due_back') # также используя list_filter мы можем внедрить в ветку, в данном случае BookInstance
                                          # фильтр, с применением тех колонок, которые мы хотим
+    list_select_related = ('book', 'borrower')
+    search_fields = ('book__title', 'borrower__username')
+    autocomplete_fields = ('book', 'borrower')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (                                                         # создание секций полей, это кортеж принимающий в себя
                 (None, {'fields': ('book', 'imprint', 'id')}),            # кортеж в котором первое значение идет наименование
                 ('Availability', {'fields': ('status', 'due_back', 'borrower')}),     # секции может быть None или же именовать любым именем
     )                                                                     # второе значение словарь, с обязательным ключом
                                                                           # fields значениями данного ключа выступают колонки на наш выбор
+    actions = ['renew_selected', 'return_selected', 'maintenance_selected']
+
+    # массовые операции идут через catalog/circulation.py: один UPDATE на пачку,
+    # со счетчиками и кэшем, в отличие от сохранения каждого объекта
+    @admin.action(description='Продлить выбранные экземпляры на 3 недели', permissions=['change'])
+    def renew_selected(self, request, queryset):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+        self.report(request, circulation.renew_copies(queryset.values_list('pk', flat=True), due_back))
+
+    @admin.action(description='Принять возврат выбранных экземпляров', permissions=['change'])
+    def return_selected(self, request, queryset):
+        self.report(request, circulation.return_copies(queryset.values_list('pk', flat=True)))
+
+    @admin.action(description='Отправить выбранные экземпляры на обслуживание', permissions=['change'])
+    def maintenance_selected(self, request, queryset):
+        self.report(request, circulation.mark_maintenance(queryset.values_list('pk', flat=True)))
+
+    def report(self, request, outcomes, limit=20):
+        skipped = [(pk, outcome) for pk, outcome in outcomes.items() if outcome != circulation.DONE]
+        self.message_user(request, f'Выполнено: {len(outcomes) - len(skipped)} из {len(outcomes)}', messages.SUCCESS)
+        for pk, outcome in skipped[:limit]:
+            self.message_user(request, f'{pk}: {circulation.OUTCOME_LABELS[outcome]}', messages.WARNING)
+        if len(skipped) > limit:
+            self.message_user(request, f'...и еще {len(skipped) - limit} пропущено', messages.WARNING)
+
+@admin.register(CirculationEvent)
+class CirculationEventAdmin(admin.ModelAdmin):
+    # журнал только для чтения: события пишет catalog/circulation.py
+    list_display = ('created', 'action', 'copy_id', 'book_id', 'borrower_id', 'status_from', 'status_to', 'due_back')
+    list_filter = ('action',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    list_display = ('book', 'borrower', 'priority', 'status', 'created', 'copy')
+    list_filter = ('status',)
+    raw_id_fields = ('book', 'borrower', 'copy')
+    list_select_related = ('book', 'borrower', 'copy__book')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
@@ -63,4 +169,7 @@ class AuthorAdmin(admin.ModelAdmin):
                                                                              # если мы обернули колонки в кортеж
                                                                              # отображение выбранных колонок производится
                                                                              # в рамках одноой строки
-    inlines = [BookInline]
\ No newline at end of file
+    inlines = [BookInline]
+    search_fields = ('last_name', 'first_name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
\ No newline at end of file
@@ -0,0 +1,380 @@
+import datetime
+import json
+import re
+import uuid
+from collections import Counter
+
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import Case, Count, F, IntegerField, Min, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from django.views import View
+
+from . import typeahead
+from .circulation import DONE, NOT_FOUND, checkout_copies, return_copies
+from .forms import validate_renewal_date
+from .models import Author, Book, BookInstance, IsbnKey
+from .pagination import CursorPaginationMixin
+
+# Read-only JSON API каталога (/catalog/api/v1/...). Строки читаются через values()
+# только с запрошенными полями (?fields=title,author), без создания объектов моделей.
+# ?ids=1,2,3 - пакетная выборка одним запросом, списки - курсорная пагинация,
+# ответы с ETag: повторный запрос с If-None-Match получает 304 без тела.
+
+MAX_IDS = 100
+MAX_LIMIT = 100
+AUTOCOMPLETE_LIMIT = 10
+# результат станции выдачи для повторно отсканированного в пачке экземпляра
+DUPLICATE = 'duplicate'
+ISBN_RE = re.compile(r'\d{9}[\dX]|\d{13}')
+
+
+class ApiError(Exception):
+    pass
+
+
+def json_response(request, data, status=200):
+    response = JsonResponse(data, status=status, json_dumps_params={'ensure_ascii': False})
+    if status != 200:
+        return response
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def parse_list(value, convert=str):
+    try:
+        return [convert(item.strip()) for item in value.split(',') if item.strip()]
+    except (ValueError, ValidationError):
+        raise ApiError(f'Неверный список: {value}')
+
+
+class ApiView(View):
+    http_method_names = ['get', 'head', 'options']
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as e:
+            return json_response(request, {'error': str(e)}, status=400)
+        except Http404 as e:
+            return json_response(request, {'error': str(e) or 'Не найдено'}, status=404)
+
+
+class ApiPermissionRequiredMixin(PermissionRequiredMixin):
+    # отказ в доступе - JSON с ошибкой, а не HTML-страница 403 или перенаправление на вход
+
+    def handle_no_permission(self):
+        return json_response(self.request, {'error': 'Недостаточно прав'}, status=403)
+
+
+class ResourceView(CursorPaginationMixin, ApiView):
+    # fields: имя в API -> столбец для values(); related_fields - поля, которые
+    # досчитываются одним дополнительным запросом на страницу (метод load_<имя>)
+    model = None
+    fields = {}
+    default_fields = None
+    related_fields = ()
+    filters = {}
+    page_size = 20
+
+    def use_cursor_pagination(self):
+        return True
+
+    def cursor_values(self, obj):
+        return obj[self.cursor_key], obj['pk']
+
+    def requested_fields(self):
+        available = [*self.fields, *self.related_fields]
+        if 'fields' not in self.request.GET:
+            return self.default_fields or available
+        names = parse_list(self.request.GET['fields'])
+        unknown = [name for name in names if name not in available]
+        if unknown or not names:
+            raise ApiError(f'Неизвестные поля: {", ".join(unknown)}. Доступны: {", ".join(available)}')
+        return names
+
+    def get_queryset(self):
+        queryset = self.model._default_manager.all()
+        for param, lookup in self.filters.items():
+            if param in self.request.GET:
+                try:
+                    queryset = queryset.filter(**{lookup: self.request.GET[param] or None})
+                except (ValueError, ValidationError):
+                    raise ApiError(f'Неверное значение {param}')
+        return queryset
+
+    def get_rows(self, queryset, names):
+        columns = {self.fields[name] for name in names if name in self.fields} - {'pk', self.cursor_key}
+        # ключ курсора и pk нужны всегда: по ним строится следующий токен и related_fields
+        return queryset.values('pk', self.cursor_key, *columns)
+
+    def serialize(self, rows, names):
+        related = {name: getattr(self, f'load_{name}')([row['pk'] for row in rows])
+                   for name in names if name in self.related_fields}
+        return [
+            {name: related[name].get(row['pk'], []) if name in related else row[self.fields[name]]
+             for name in names}
+            for row in rows
+        ]
+
+    def page_limit(self):
+        try:
+            limit = int(self.request.GET.get('limit', self.page_size))
+        except ValueError:
+            raise ApiError('limit должен быть числом')
+        return max(1, min(limit, MAX_LIMIT))
+
+    def get(self, request, pk=None):
+        names = self.requested_fields()
+        queryset = self.get_queryset()
+
+        if pk is not None:
+            rows = list(self.get_rows(queryset.filter(pk=pk), names))
+            if not rows:
+                raise Http404
+            return json_response(request, self.serialize(rows, names)[0])
+
+        if 'ids' in request.GET:
+            ids = parse_list(request.GET['ids'], self.model._meta.pk.to_python)
+            if len(ids) > MAX_IDS:
+                raise ApiError(f'Не больше {MAX_IDS} ids за запрос')
+            rows = {row['pk']: row for row in self.get_rows(queryset.filter(pk__in=ids), names)}
+            # порядок ответа совпадает с порядком ids, ненайденные пропускаются
+            rows = [rows[pk] for pk in dict.fromkeys(ids) if pk in rows]
+            return json_response(request, {'results': self.serialize(rows, names)})
+
+        _, page, rows, _ = self.paginate_queryset(self.get_rows(queryset, names), self.page_limit())
+        data = {'results': self.serialize(rows, names), 'next': None}
+        if page.has_next:
+            params = request.GET.copy()
+            params[self.cursor_param] = page.next_cursor
+            params.pop('count', None)
+            data['next'] = f'{request.path}?{params.urlencode()}'
+        if page.total is not None:
+            data['count'] = page.total
+        return json_response(request, data)
+
+
+class BookResource(ResourceView):
+    model = Book
+    cursor_key = 'title'
+    fields = {
+        'id': 'pk',
+        'title': 'title',
+        'summary': 'summary',
+        'isbn': 'isbn',
+        'author': 'author_id',
+        'language': 'language_id',
+    }
+    default_fields = ['id', 'title', 'author', 'isbn']
+    related_fields = ('genre',)
+    filters = {'author': 'author_id'}
+
+    def load_genre(self, book_ids):
+        genres = {}
+        through = Book.genre.through.objects.filter(book_id__in=book_ids).order_by('genre_id')
+        for book_id, genre_id in through.values_list('book_id', 'genre_id'):
+            genres.setdefault(book_id, []).append(genre_id)
+        return genres
+
+
+class AuthorResource(ResourceView):
+    model = Author
+    cursor_key = 'last_name'
+    fields = {
+        'id': 'pk',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'date_of_birth': 'date_of_birth',
+        'date_of_death': 'date_of_death',
+    }
+
+
+class BookInstanceResource(ResourceView):
+    # читатель (borrower) в публичный API не попадает
+    model = BookInstance
+    cursor_key = 'due_back'
+    fields = {
+        'id': 'pk',
+        'book': 'book_id',
+        'imprint': 'imprint',
+        'status': 'status',
+        'due_back': 'due_back',
+    }
+    filters = {'book': 'book_id', 'status': 'status'}
+
+
+class AvailabilityView(ApiView):
+    # наличие экземпляров для пачки книг одним GROUP BY запросом: ?ids=1,2,3
+
+    def get(self, request):
+        ids = parse_list(request.GET.get('ids', ''), int)
+        if not ids or len(ids) > MAX_IDS:
+            raise ApiError(f'Нужен параметр ids: от 1 до {MAX_IDS} id книг')
+        rows = BookInstance.objects.filter(book_id__in=ids).order_by().values('book_id').annotate(
+            total=Count('pk'),
+            available=Count('pk', filter=Q(status='a')),
+            next_due_back=Min('due_back', filter=Q(status='o')),
+        )
+        found = {row.pop('book_id'): row for row in rows}
+        empty = {'total': 0, 'available': 0, 'next_due_back': None}
+        return json_response(request, {
+            'results': [{'book': pk, **found.get(pk, empty)} for pk in dict.fromkeys(ids)],
+        })
+
+
+class AutocompleteView(ApiPermissionRequiredMixin, ApiView):
+    # варианты для AutocompleteWidget (форма книги, консоль библиотекаря) по префиксу любого слова ?q=.
+    # Отвечает индекс подсказок в памяти процесса (catalog/typeahead.py): регистр сравнивается
+    # через casefold() в Python, а LIKE/istartswith на SQLite без учета регистра только для ASCII
+    permission_required = 'catalog.can_edit'
+    kind = None
+
+    def get(self, request):
+        found = typeahead.typeahead.search(request.GET.get('q', ''), AUTOCOMPLETE_LIMIT, kinds=[self.kind])[self.kind]
+        return json_response(request, {'results': [{'id': pk, 'text': label} for pk, label in found]})
+
+
+class AuthorAutocomplete(AutocompleteView):
+    kind = 'authors'
+
+
+class BookAutocomplete(AutocompleteView):
+    kind = 'books'
+
+
+class TypeaheadView(ApiView):
+    # публичные подсказки к поиску книг и авторов: ?q=<начало любого слова>&kind=books|authors.
+    # Отвечает индекс в памяти процесса (catalog/typeahead.py), без запросов к базе
+    kinds = {'books': 'book_detail', 'authors': 'author_detail'}
+
+    def get(self, request):
+        kind = request.GET.get('kind', 'books')
+        if kind not in self.kinds:
+            raise ApiError(f'kind: {" или ".join(self.kinds)}')
+        found = typeahead.typeahead.search(request.GET.get('q', ''), AUTOCOMPLETE_LIMIT, kinds=[kind])[kind]
+        return json_response(request, {'results': [
+            {'id': pk, 'text': label, 'url': reverse(self.kinds[kind], args=[pk])} for pk, label in found
+        ]})
+
+
+class ScanView(ApiPermissionRequiredMixin, ApiView):
+    # станция выдачи: пачка отсканированных кодов за один POST
+    # {"action": "checkout" | "return", "borrower": "<логин>", "due_back": "2026-01-31", "items": [uuid или ISBN, ...]}
+    # -> {"done": 1, "results": [{"item": ..., "copy": uuid | null,
+    #                             "result": "done" | "conflict" | "not_found" | "invalid" | "duplicate"}]}
+    # duplicate - экземпляр уже встречался раньше в этой пачке (отсканирован повторно)
+    # Все экземпляры пачки переводятся одним условным UPDATE (catalog/circulation.py).
+    # Сессионная авторизация библиотекаря, CSRF-токен - в заголовке X-CSRFToken
+    permission_required = 'catalog.can_mark_returned'
+    http_method_names = ['post', 'options']
+
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            raise ApiError('Тело запроса должно быть JSON')
+        if not isinstance(data, dict):
+            raise ApiError('Тело запроса должно быть JSON-объектом')
+        action = data.get('action')
+        if action not in ('checkout', 'return'):
+            raise ApiError('action: checkout или return')
+        items = data.get('items')
+        if not isinstance(items, list) or not 0 < len(items) <= MAX_IDS:
+            raise ApiError(f'items: от 1 до {MAX_IDS} отсканированных кодов')
+
+        borrower = None
+        if data.get('borrower') or action == 'checkout':
+            borrower = User.objects.filter(username=data.get('borrower') or '').first()
+            if borrower is None:
+                raise ApiError('borrower: читатель не найден')
+
+        copies = self.resolve(items, action, borrower)
+        pks = [pk for pk in copies if pk]
+        if action == 'checkout':
+            outcomes = checkout_copies(pks, borrower, self.due_back(data)) if pks else {}
+        else:
+            outcomes = return_copies(pks) if pks else {}
+
+        seen = set()
+        results = []
+        for item, pk in zip(items, copies):
+            if not pk:
+                result = 'invalid' if pk is None else NOT_FOUND
+            elif pk in seen:
+                result = DUPLICATE
+            else:
+                result = outcomes[pk]
+                seen.add(pk)
+            results.append({'item': item, 'copy': pk or None, 'result': result})
+        return JsonResponse({'done': sum(1 for row in results if row['result'] == DONE), 'results': results},
+                            json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+    def due_back(self, data):
+        if not data.get('due_back'):
+            return datetime.date.today() + datetime.timedelta(weeks=3)
+        try:
+            due_back = parse_date(str(data['due_back']))
+        except ValueError:
+            due_back = None
+        if due_back is None:
+            raise ApiError('due_back: дата YYYY-MM-DD')
+        # те же ограничения срока, что у продления в формах
+        try:
+            return validate_renewal_date(due_back)
+        except ValidationError as e:
+            raise ApiError(f'due_back: {" ".join(e.messages)}')
+
+    def resolve(self, items, action, borrower):
+        # код -> pk экземпляра; None - код не разобран, False - по ISBN нет подходящего экземпляра.
+        # ISBN заменяется любым экземпляром книги в нужном статусе (на возврате - у этого читателя,
+        # на выдаче - сначала отложенным для него)
+        parsed = []
+        for item in items:
+            code = str(item).strip().replace('-', '').upper()
+            try:
+                parsed.append(('copy', uuid.UUID(code)))
+            except ValueError:
+                parsed.append(('isbn', code) if ISBN_RE.fullmatch(code) else (None, None))
+
+        wanted = Counter(value for kind, value in parsed if kind == 'isbn')
+        pools = {}
+        if wanted:
+            scanned = {value for kind, value in parsed if kind == 'copy'}
+            # ISBN в базе может быть записан с дефисами - сравниваются обе стороны без них.
+            # Книги выбираются подзапросом по индексу book_isbn_key_idx, экземпляры - по book_id
+            books = Book.objects.alias(scan_isbn=IsbnKey('isbn')).filter(scan_isbn__in=wanted)
+            queryset = (BookInstance.objects.filter(book__in=books).exclude(pk__in=scanned)
+                        .annotate(scan_isbn=IsbnKey('book__isbn')))
+            if action == 'checkout':
+                # отложенный по очереди этому читателю экземпляр выдается раньше свободных с полки
+                own = Q(status='r', borrower=borrower) if borrower is not None else Q(pk__in=[])
+                queryset = queryset.filter(Q(status='a') | own).annotate(
+                    own=Case(When(own, then=Value(0)), default=Value(1), output_field=IntegerField()),
+                )
+            else:
+                queryset = queryset.filter(status__in=['o', 'r']).annotate(own=Value(0))
+                if borrower is not None:
+                    queryset = queryset.filter(borrower=borrower)
+            # не больше экземпляров каждой книги, чем ее ISBN отсканировано, а не все копии популярной книги
+            queryset = queryset.annotate(number=Window(
+                RowNumber(), partition_by=F('scan_isbn'), order_by=[F('own'), F('due_back'), F('pk')],
+            )).filter(number__lte=max(wanted.values()))
+            for pk, isbn in queryset.order_by('own', 'due_back', 'pk').values_list('pk', 'scan_isbn'):
+                pools.setdefault(isbn, []).append(pk)
+
+        copies = []
+        for kind, value in parsed:
+            if kind == 'copy':
+                copies.append(value)
+            elif kind == 'isbn':
+                pool = pools.get(value)
+                copies.append(pool.pop(0) if pool else False)
+            else:
+                copies.append(None)
+        return copies
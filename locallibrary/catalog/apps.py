@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CatalogConfig(AppConfig):
     name = 'catalog'
+
+    def ready(self):
+        # подключаем обработчики сигналов моделей
+        from . import signals  # noqa: F401
@@ -0,0 +1,79 @@
+import asyncio
+
+from django.http import Http404
+from django.template.response import TemplateResponse
+
+from . import views
+from .counters import aget_counters
+from .models import Book
+from .visits import acount_visit, remember_visit, site_visits, visitor_visits
+
+# Асинхронные варианты страниц чтения для ASGI (CATALOG_ASYNC_VIEWS, см. catalog/urls.py):
+# запрос не занимает поток на время работы с базой и кэшем. Имена совпадают с catalog/views.py,
+# логика (queryset, контекст, шаблоны, кэш страниц) наследуется от синхронных классов.
+# Шаблон рендерится обработчиком ASGI в отдельном потоке (TemplateResponse), поэтому
+# ленивые queryset внутри кэшируемых фрагментов по-прежнему выполняются только при промахе кэша.
+
+
+async def index(request):
+    # счетчики и новые поступления - независимые запросы. Асинхронный ORM Django
+    # выполняет их через sync_to_async в потоке запроса, так что база видит их
+    # последовательно, но страница ждет оба сразу, не блокируя цикл событий
+    await acount_visit()
+    counters, new_books = await asyncio.gather(
+        aget_counters(),
+        _alist(Book.objects.with_availability().order_by('-pk')[:5]),
+    )
+    num_visits = visitor_visits(request)
+
+    context = {**counters, 'num_visits': num_visits, 'num_site_visits': site_visits(counters), 'new_books': new_books}
+    return remember_visit(TemplateResponse(request, 'catalog/index.html', context), num_visits + 1)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+class AsyncListMixin:
+    # ListView: страница выбирается apaginate_queryset(), get_context_data() получает готовый результат
+
+    async def get(self, request, *args, **kwargs):
+        return await self.aget(request, *args, **kwargs)
+
+    async def aget_response(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        self._async_page = await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        return self.render_to_response(self.get_context_data())
+
+    def paginate_queryset(self, queryset, page_size):
+        return self._async_page
+
+
+class AsyncDetailMixin:
+
+    async def get(self, request, *args, **kwargs):
+        return await self.aget(request, *args, **kwargs)
+
+    async def aget_response(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        try:
+            self.object = await queryset.aget(pk=self.kwargs[self.pk_url_kwarg])
+        except queryset.model.DoesNotExist:
+            raise Http404(f'{queryset.model._meta.verbose_name} не найден')
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+class BookListView(AsyncListMixin, views.BookListView):
+    pass
+
+
+class BookDetailView(AsyncDetailMixin, views.BookDetailView):
+    pass
+
+
+class AuthorListView(AsyncListMixin, views.AuthorListView):
+    pass
+
+
+class AuthorDetailView(AsyncDetailMixin, views.AuthorDetailView):
+    pass
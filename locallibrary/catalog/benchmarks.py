@@ -0,0 +1,25 @@
+import statistics
+
+# общие части нагрузочных команд (benchmark_views, benchmark_asgi)
+
+BENCH_HOST = 'localhost'
+
+
+def latency_summary(latencies):
+    # задержки в миллисекундах -> медиана, 95-й перцентиль и максимум
+    latencies = sorted(latencies)
+    p95 = statistics.quantiles(latencies, n=20, method='inclusive')[18] if len(latencies) > 1 else latencies[0]
+    return {
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(p95, 2),
+        'max_ms': round(latencies[-1], 2),
+    }
+
+
+def bench_settings(settings, with_cache=False):
+    # для override_settings: запросы идут на BENCH_HOST, кэш страниц по умолчанию выключен,
+    # чтобы измерялась работа представлений, а не чтение готового HTML
+    overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, BENCH_HOST]}
+    if not with_cache:
+        overrides['CATALOG_PAGE_CACHE_TIMEOUT'] = 0
+    return overrides
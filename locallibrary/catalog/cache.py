@@ -0,0 +1,144 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+# Кэш страниц каталога. Ключ страницы включает "поколения" областей (scope),
+# от которых она зависит: 'books', 'authors', 'book:<pk>', 'author:<pk>',
+# 'lookups' (жанры и языки) и 'all'. Сигналы моделей увеличивают поколение
+# затронутой области (bump) после коммита, и старые ключи просто перестают запрашиваться.
+
+GENERATION_KEY = 'catalog:gen:%s'
+
+
+def _new_generation():
+    return time.time_ns()
+
+
+def _generation_keys(scopes):
+    return {GENERATION_KEY % scope: scope for scope in ('all', *scopes)}
+
+
+def _missing_generations(keys, found):
+    # после вытеснения ключа поколения новое значение не совпадет ни с одним прежним
+    return {key: _new_generation() for key in keys if key not in found}
+
+
+def get_generations(scopes):
+    keys = _generation_keys(scopes)
+    found = cache.get_many(keys)
+    missing = _missing_generations(keys, found)
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+async def aget_generations(scopes):
+    keys = _generation_keys(scopes)
+    found = await cache.aget_many(keys)
+    missing = _missing_generations(keys, found)
+    if missing:
+        await cache.aset_many(missing, None)
+        found.update(missing)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def bump(*scopes):
+    # возвращает новые поколения областей в том же порядке
+    generations = []
+    for scope in scopes:
+        key = GENERATION_KEY % scope
+        try:
+            generations.append(cache.incr(key))
+        except ValueError:
+            generations.append(_new_generation())
+            cache.set(key, generations[-1], None)
+    return generations
+
+
+def bump_on_commit(*scopes):
+    # для сигналов моделей: поколение меняется только после коммита. Иначе параллельный
+    # запрос прочитал бы новое поколение вместе со старыми строками и сохранил устаревшую
+    # страницу под новым ключом
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def invalidate_all():
+    # для массовых операций в обход сигналов (импорт, пересчеты)
+    bump('all')
+
+
+def page_timeout():
+    return getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 600)
+
+
+class CachedPageMixin:
+    # Готовый HTML страницы кэшируется только для анонимных GET-запросов: у вошедшего
+    # пользователя в base.html есть имя и csrf-токен формы выхода. Для вошедших
+    # кэшируются фрагменты шаблонов (тег {% cache %} с cache_version и ролью).
+    cache_name = None
+
+    def cache_scopes(self):
+        return []
+
+    def cache_version(self):
+        if not hasattr(self, '_cache_version'):
+            self._cache_version = get_generations(self.cache_scopes())
+        return self._cache_version
+
+    def page_cache_key(self):
+        params = '&'.join(f'{k}={v}' for k, v in sorted(self.request.GET.lists()))
+        raw = f'{self.cache_name}|{self.kwargs.get("pk", "")}|{params}|{self.cache_version()}'
+        return 'catalog:response:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def cache_response(self, key, response):
+        # вместе с телом - заголовки ответа представления (Content-Type и другие)
+        response.add_post_render_callback(
+            lambda r: cache.set(key, (r.content, dict(r.items())), page_timeout()))
+
+    @staticmethod
+    def cached_response(entry):
+        content, headers = entry
+        return HttpResponse(content, headers=headers)
+
+    def get(self, request, *args, **kwargs):
+        if not page_timeout() or request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        key = self.page_cache_key()
+        entry = cache.get(key)
+        if entry is not None:
+            return self.cached_response(entry)
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            self.cache_response(key, response)
+        return response
+
+    async def aget(self, request, *args, **kwargs):
+        # то же для асинхронных представлений (catalog/async_views.py): кэш и пользователь
+        # читаются без блокировки, страницу строит aget_response()
+        self._cache_version = await aget_generations(self.cache_scopes())
+        user = await request.auser()
+        if not page_timeout() or user.is_authenticated:
+            return await self.aget_response(request, *args, **kwargs)
+
+        key = self.page_cache_key()
+        entry = await cache.aget(key)
+        if entry is not None:
+            return self.cached_response(entry)
+
+        response = await self.aget_response(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            self.cache_response(key, response)
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cache_version'] = self.cache_version()
+        context['cache_timeout'] = page_timeout()
+        return context
@@ -0,0 +1,215 @@
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import cache, counters, holds
+from .models import BookInstance, CirculationEvent, Hold
+
+# операции выдачи и возврата экземпляров. Каждый переход статуса - один условный
+# UPDATE ... WHERE status IN (...), поэтому два читателя не могут одновременно
+# получить один и тот же экземпляр: второй UPDATE просто не найдет строку.
+# QuerySet.update() не вызывает сигналы, поэтому счетчики (включая Book.available_copies)
+# и кэш страниц правим здесь же. Каждый переход записывается в журнал CirculationEvent
+# в той же транзакции. Возвращенный экземпляр, на книгу которого есть очередь
+# (catalog/holds.py), сразу откладывается следующему в ней; так же - отложенный экземпляр,
+# который читатель не забрал в срок или от которого отказался (release_holds).
+
+
+class CirculationConflict(Exception):
+    # экземпляр уже в другом статусе (например, его только что забрал другой читатель)
+    pass
+
+
+# результаты массовых операций для каждого экземпляра
+DONE = 'done'
+NOT_FOUND = 'not_found'
+CONFLICT = 'conflict'
+OUTCOME_LABELS = {
+    DONE: 'выполнено',
+    NOT_FOUND: 'экземпляр не найден',
+    CONFLICT: 'статус экземпляра не позволяет',
+}
+# экземпляров в одном UPDATE и одной транзакции
+BULK_BATCH_SIZE = 500
+ROW_FIELDS = ('pk', 'status', 'book_id', 'borrower_id', 'due_back')
+
+
+def reserve_copy(pk, borrower, due_back):
+    with transaction.atomic():
+        row = _locked_row(pk)
+        updated = BookInstance.objects.filter(pk=pk, status='a').update(
+            status='o', borrower=borrower, due_back=due_back,
+        )
+        if not updated:
+            raise CirculationConflict('Экземпляр уже выдан другому читателю')
+        counters.increment('num_instance_available', -1)
+        counters.adjust_available_copies(row['book_id'], -1)
+        _event('checkout', row, 'o', borrower.pk, due_back).save()
+    _invalidate_book_page(row['book_id'])
+
+
+def return_copy(pk):
+    with transaction.atomic():
+        row = _locked_row(pk)
+        updated = BookInstance.objects.filter(pk=pk, status__in=['o', 'r']).update(
+            status='a', borrower=None, due_back=None,
+        )
+        if not updated:
+            raise CirculationConflict('Экземпляр уже возвращен')
+        counters.increment('num_instance_available')
+        counters.adjust_available_copies(row['book_id'], 1)
+        events = _dispatch_holds([row])
+        CirculationEvent.objects.bulk_create([_event('return', row, 'a'), *events])
+    _invalidate_book_page(row['book_id'])
+
+
+def renew_copy(pk, due_back):
+    with transaction.atomic():
+        row = _locked_row(pk)
+        # только выданные: у отложенного ('r') due_back - срок получения по очереди (catalog/holds.py)
+        if not BookInstance.objects.filter(pk=pk, status='o').update(due_back=due_back):
+            raise CirculationConflict('Экземпляр не выдан, продлевать нечего')
+        _event('renew', row, row['status'], due_back=due_back).save()
+    _invalidate_book_page(row['book_id'])
+
+
+def checkout_copies(pks, borrower, due_back):
+    # выдаются доступные экземпляры и отложенные по очереди именно этому читателю
+    return _bulk_transition(pks, 'checkout', ['a'], reserved_for=borrower.pk,
+                            status='o', borrower=borrower, due_back=due_back)
+
+
+def renew_copies(pks, due_back):
+    return _bulk_transition(pks, 'renew', ['o'], due_back=due_back)
+
+
+def return_copies(pks):
+    return _bulk_transition(pks, 'return', ['o', 'r'], status='a', borrower=None, due_back=None)
+
+
+def mark_maintenance(pks):
+    # отложенный по очереди экземпляр ('r') - конфликт: заявка читателя осталась бы выполненной
+    # без экземпляра. Его сначала снимают с отложенных (release_holds) или выдают
+    return _bulk_transition(pks, 'maintenance', ['a', 'o'], status='m', borrower=None, due_back=None)
+
+
+def release_holds(hold_pks, status):
+    # выполненные заявки, экземпляр которых еще ждет читателя ('r' у него же): экземпляр
+    # снимается с отложенных и переходит следующему в очереди или на полку, заявка получает
+    # status ('e' - срок получения истек, 'c' - читатель отказался). Возвращает число снятых
+    with transaction.atomic():
+        held = list(Hold.objects.select_for_update().filter(pk__in=list(hold_pks), status='f', copy__isnull=False))
+        rows = {row['pk']: row for row in BookInstance.objects.select_for_update()
+                .filter(pk__in=[hold.copy_id for hold in held]).order_by().values(*ROW_FIELDS)}
+        # экземпляр уже выдан читателю или изменен вручную - заявка выполнена, снимать нечего
+        held = [hold for hold in held if rows[hold.copy_id]['status'] == 'r'
+                and rows[hold.copy_id]['borrower_id'] == hold.borrower_id]
+        if not held:
+            return 0
+        released = [rows[hold.copy_id] for hold in held]
+        Hold.objects.filter(pk__in=[hold.pk for hold in held]).update(status=status)
+        BookInstance.objects.filter(pk__in=[row['pk'] for row in released], status='r').update(
+            status='a', borrower=None, due_back=None,
+        )
+        counters.increment('num_instance_available', len(released))
+        counters.adjust_available_copies_many(Counter(row['book_id'] for row in released))
+        events = _dispatch_holds(released)
+        CirculationEvent.objects.bulk_create([*(_event('release', row, 'a') for row in released), *events])
+    cache.bump('copies', *(f'book:{row["book_id"]}' for row in released))
+    return len(released)
+
+
+def expire_holds(today=None):
+    # отложенные экземпляры, которые не забрали до due_back (срок получения)
+    expired = Hold.objects.filter(
+        status='f', copy__status='r', copy__borrower=F('borrower'), copy__due_back__lt=today or datetime.date.today(),
+    ).values_list('pk', flat=True)
+    return release_holds(expired, 'e')
+
+
+def _bulk_transition(pks, action, allowed, reserved_for=None, **values):
+    # массовые операции консоли и админки: на каждую пачку - чтение статусов под блокировкой
+    # и один UPDATE ... WHERE pk IN (...) AND status IN (...) в одной транзакции.
+    # Возвращает {pk: DONE | NOT_FOUND | CONFLICT} в порядке переданных pk
+    pks = list(dict.fromkeys(pks))
+    outcomes = {}
+    for start in range(0, len(pks), BULK_BATCH_SIZE):
+        batch = pks[start:start + BULK_BATCH_SIZE]
+        with transaction.atomic():
+            rows = {row['pk']: row for row in BookInstance.objects.select_for_update()
+                    .filter(pk__in=batch).order_by().values(*ROW_FIELDS)}
+            condition = Q(status__in=allowed)
+            if reserved_for is not None:
+                condition |= Q(status='r', borrower_id=reserved_for)
+            eligible = {pk for pk in batch if pk in rows and (
+                rows[pk]['status'] in allowed
+                or (reserved_for is not None and rows[pk]['status'] == 'r' and rows[pk]['borrower_id'] == reserved_for)
+            )}
+            if eligible:
+                BookInstance.objects.filter(condition, pk__in=eligible).update(**values)
+            borrower = values.get('borrower')
+            events = [
+                _event(action, rows[pk], values.get('status', rows[pk]['status']),
+                       borrower.pk if borrower else None, values.get('due_back'))
+                for pk in batch if pk in eligible
+            ]
+            deltas = Counter()
+            if 'status' in values:
+                for pk in eligible:
+                    row = rows[pk]
+                    deltas[row['book_id']] += (values['status'] == 'a') - (row['status'] == 'a')
+                counters.increment('num_instance_available', sum(deltas.values()))
+                counters.adjust_available_copies_many(deltas)
+                if values['status'] == 'a':
+                    events.extend(_dispatch_holds([rows[pk] for pk in batch if pk in eligible]))
+            CirculationEvent.objects.bulk_create(events)
+        for pk in batch:
+            outcomes[pk] = NOT_FOUND if pk not in rows else DONE if pk in eligible else CONFLICT
+        books = {rows[pk]['book_id'] for pk in eligible} - {None}
+        if eligible:
+            cache.bump('copies', *(f'book:{book_id}' for book_id in books))
+    return outcomes
+
+
+def _locked_row(pk):
+    # состояние экземпляра до перехода: для счетчиков и записи в журнал
+    row = BookInstance.objects.select_for_update().filter(pk=pk).order_by().values(*ROW_FIELDS).first()
+    return row or dict.fromkeys(ROW_FIELDS)
+
+
+def _dispatch_holds(rows):
+    # rows - только что возвращенные экземпляры, уже учтенные в available_copies: UPDATE строки
+    # книги держит ее блокировку до конца транзакции, и place_hold, перечитывающий доступность
+    # под той же блокировкой, не может встать в очередь между разбором очереди и коммитом.
+    # Отложенные экземпляры вычитаются обратно; возвращает события откладывания
+    copies = defaultdict(list)
+    for row in rows:
+        if row['book_id'] is not None:
+            copies[row['book_id']].append(row['pk'])
+    due_back = holds.pickup_due()
+    deltas, events = Counter(), []
+    for pk, hold in holds.assign_copies(copies, due_back):
+        deltas[hold.book_id] -= 1
+        events.append(CirculationEvent(
+            action='hold', copy_id=pk, book_id=hold.book_id, borrower_id=hold.borrower_id,
+            status_from='a', status_to='r', due_back=due_back,
+        ))
+    counters.increment('num_instance_available', sum(deltas.values()))
+    counters.adjust_available_copies_many(deltas)
+    return events
+
+
+def _event(action, row, status, borrower_id=None, due_back=None):
+    # читатель и срок - новые (выдача, продление) или прежние, если переход их сбрасывает
+    return CirculationEvent(
+        action=action, copy_id=row['pk'], book_id=row['book_id'],
+        borrower_id=borrower_id or row['borrower_id'], status_from=row['status'], status_to=status,
+        due_back=due_back or row['due_back'],
+    )
+
+
+def _invalidate_book_page(book_id):
+    scopes = ['copies'] if book_id is None else ['copies', f'book:{book_id}']
+    cache.bump(*scopes)
@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Author, Book, BookInstance, CatalogCounter, Genre
+
+# имя счетчика -> функция, считающая его "с нуля"; имена совпадают с ключами
+# контекста шаблона catalog/index.html
+COUNTERS = {
+    'num_books': lambda: Book.objects.count(),
+    'num_instance': lambda: BookInstance.objects.count(),
+    'num_authors': lambda: Author.objects.count(),
+    'num_genre': lambda: Genre.objects.count(),
+    'num_instance_available': lambda: BookInstance.objects.filter(status__exact='a').count(),
+    'num_tbooks': lambda: Book.objects.exclude(title='').count(),
+}
+
+
+def rebuild_counters():
+    values = {name: count() for name, count in COUNTERS.items()}
+    with transaction.atomic():
+        for name, value in values.items():
+            CatalogCounter.objects.update_or_create(name=name, defaults={'value': value})
+        rebuild_available_copies()
+    return values
+
+
+def rebuild_available_copies():
+    # Book.available_copies для всех книг одним UPDATE с подзапросом
+    available = BookInstance.objects.filter(book=OuterRef('pk'), status='a').order_by().values('book')
+    Book.objects.update(available_copies=Coalesce(Subquery(available.annotate(n=Count('pk')).values('n')), 0))
+
+
+def get_counters():
+    # все счетчики читаются одним запросом; если таблица еще не заполнена
+    # (например, сразу после миграции) - пересчитываем. Кроме COUNTERS в таблице бывают
+    # счетчики без пересчета "с нуля" (num_site_visits из catalog/visits.py)
+    values = dict(CatalogCounter.objects.values_list('name', 'value'))
+    if COUNTERS.keys() - values.keys():
+        values = rebuild_counters()
+    return values
+
+
+async def aget_counters():
+    values = {name: value async for name, value in CatalogCounter.objects.values_list('name', 'value')}
+    if COUNTERS.keys() - values.keys():
+        values = await sync_to_async(rebuild_counters)()
+    return values
+
+
+def increment(name, delta=1):
+    if delta:
+        CatalogCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def _available_copies(delta):
+    # счетчик мог разойтись с экземплярами (правка в обход сигналов, update() в shell) -
+    # не уходим ниже нуля: PositiveIntegerField иначе сорвал бы выдачу IntegrityError,
+    # точное значение восстанавливает rebuild_counters
+    if delta < 0:
+        return Greatest(F('available_copies') + delta, 0)
+    return F('available_copies') + delta
+
+
+def adjust_available_copies(book_id, delta):
+    if book_id is not None and delta:
+        Book.objects.filter(pk=book_id).update(available_copies=_available_copies(delta))
+
+
+def adjust_available_copies_many(deltas):
+    # {book_id: delta} после массовой операции: один UPDATE на каждое различное значение delta
+    by_delta = defaultdict(list)
+    for book_id, delta in deltas.items():
+        if book_id is not None and delta:
+            by_delta[delta].append(book_id)
+    for delta, book_ids in by_delta.items():
+        Book.objects.filter(pk__in=book_ids).update(available_copies=_available_copies(delta))
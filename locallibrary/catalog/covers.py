@@ -0,0 +1,138 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+from . import cache
+from .models import Book
+
+# Обложки книг: из загруженного файла (Book.cover) строятся уменьшенные копии
+# нескольких ширин в форматах AVIF/WEBP/JPEG. Имена файлов содержат хэш
+# исходника, поэтому их можно отдавать с "вечными" заголовками кэширования.
+# Результат хранится в Book.cover_variants: {формат: {ширина: имя файла}}.
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640)
+FORMATS = {
+    # формат: (расширение, параметры сохранения Pillow)
+    'avif': ('avif', {'quality': 50}),
+    'webp': ('webp', {'quality': 75, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIR = 'covers/v'
+
+_executor = None
+
+
+def supported_formats():
+    from PIL import features
+
+    return [fmt for fmt in FORMATS if fmt == 'jpeg' or features.check(fmt)]
+
+
+def encode_variants(data):
+    # только Pillow, без базы и хранилища: в пул процессов передаются байты исходника,
+    # обратно возвращаются байты копий. Результат: {(формат, ширина): (имя файла, байты)}
+    from PIL import Image, ImageOps
+
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    encoded = {}
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source).convert('RGB')
+        widths = [w for w in WIDTHS if w < source.width] or [source.width]
+        for width in widths:
+            height = round(source.height * width / source.width)
+            image = source.resize((width, height), Image.Resampling.LANCZOS)
+            for fmt in supported_formats():
+                ext, params = FORMATS[fmt]
+                buffer = io.BytesIO()
+                image.save(buffer, fmt.upper(), **params)
+                encoded[fmt, width] = (f'{VARIANTS_DIR}/{digest}-{width}.{ext}', buffer.getvalue())
+    return encoded
+
+
+def store_variants(encoded):
+    variants = {}
+    for (fmt, width), (target, content) in encoded.items():
+        if not default_storage.exists(target):
+            default_storage.save(target, ContentFile(content))
+        variants.setdefault(fmt, {})[str(width)] = target
+    return variants
+
+
+def read_cover(name):
+    with default_storage.open(name, 'rb') as f:
+        return f.read()
+
+
+def build_variants(name):
+    return store_variants(encode_variants(read_cover(name)))
+
+
+def _variant_names(variants):
+    return {name for by_width in variants.values() for name in by_width.values()}
+
+
+def delete_stale_variants(book_id, old, new):
+    # копии прежней обложки удаляются, если на них не ссылается другая книга:
+    # имена содержат хэш исходника, и у книг с одинаковой обложкой файлы общие
+    stale = _variant_names(old) - _variant_names(new)
+    if not stale:
+        return
+    others = (Book.objects.exclude(pk=book_id)
+              .annotate(variants_text=Cast('cover_variants', TextField())))
+    for digest in {name.rsplit('/', 1)[-1].split('-', 1)[0] for name in stale}:
+        if others.filter(variants_text__contains=digest).exists():
+            continue
+        for name in stale:
+            if f'/{digest}-' in name:
+                default_storage.delete(name)
+
+
+def save_variants(book_id, variants):
+    old = Book.objects.filter(pk=book_id).values_list('cover_variants', flat=True).first() or {}
+    # update() вместо save(): не нужно переиндексировать поиск и пересчитывать счетчики
+    Book.objects.filter(pk=book_id).update(cover_variants=variants)
+    cache.bump(f'book:{book_id}', 'books')
+    delete_stale_variants(book_id, old, variants)
+
+
+def process_book(book_id):
+    name = Book.objects.filter(pk=book_id).values_list('cover', flat=True).first()
+    save_variants(book_id, build_variants(name) if name else {})
+
+
+def _process_in_background(book_id):
+    try:
+        process_book(book_id)
+    except Exception:
+        logger.exception('Не удалось обработать обложку книги %s', book_id)
+    finally:
+        # у фонового потока свое соединение с базой
+        connection.close()
+
+
+def schedule_processing(book_id):
+    # после загрузки обложки: в фоновом потоке, если CATALOG_COVERS_ASYNC, иначе сразу
+    def run():
+        global _executor
+        if getattr(settings, 'CATALOG_COVERS_ASYNC', True):
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='covers')
+            _executor.submit(_process_in_background, book_id)
+        else:
+            process_book(book_id)
+
+    transaction.on_commit(run)
+
+
+def srcset(variants, fmt):
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in variants.get(fmt, {}).items())
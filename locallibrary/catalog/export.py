@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+
+from django.db.models import Prefetch
+
+from .models import Book, BookInstance
+
+# выгрузка каталога без сборки результата в памяти: книги читаются курсором
+# пачками по chunk_size (жанры и экземпляры подгружаются для каждой пачки),
+# строки отдаются генератором. Выгрузку можно продолжить с pk последней книги.
+
+CSV_COLUMNS = ['book_id', 'title', 'isbn', 'author', 'language', 'genres',
+               'copy_id', 'imprint', 'status', 'due_back']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/jsonl',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def iter_books(after=None, chunk_size=2000):
+    books = Book.objects.select_related('author', 'language').prefetch_related(
+        'genre',
+        Prefetch('bookinstance_set', queryset=BookInstance.objects.order_by('pk')),
+    ).order_by('pk')
+    if after is not None:
+        books = books.filter(pk__gt=after)
+    return books.iterator(chunk_size=chunk_size)
+
+
+def book_record(book):
+    return {
+        'id': book.pk,
+        'title': book.title,
+        'isbn': book.isbn,
+        'author': str(book.author) if book.author else None,
+        'language': str(book.language) if book.language else None,
+        'genres': [genre.name for genre in book.genre.all()],
+        'copies': [
+            {
+                'id': str(copy.pk),
+                'imprint': copy.imprint,
+                'status': copy.status,
+                'due_back': copy.due_back.isoformat() if copy.due_back else None,
+            }
+            for copy in book.bookinstance_set.all()
+        ],
+    }
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def render_header(fmt):
+    return _csv_line(CSV_COLUMNS) if fmt == 'csv' else ''
+
+
+def render_book(book, fmt):
+    record = book_record(book)
+    if fmt != 'csv':
+        return json.dumps(record, ensure_ascii=False) + '\n'
+    # в CSV одна строка на экземпляр, книга без экземпляров - одна строка с пустыми колонками
+    book_columns = [record['id'], record['title'], record['isbn'], record['author'] or '',
+                    record['language'] or '', ';'.join(record['genres'])]
+    copies = record['copies'] or [{'id': '', 'imprint': '', 'status': '', 'due_back': None}]
+    return ''.join(
+        _csv_line(book_columns + [copy['id'], copy['imprint'], copy['status'], copy['due_back'] or ''])
+        for copy in copies
+    )
+
+
+def stream_export(fmt, after=None, chunk_size=2000):
+    header = render_header(fmt)
+    if header and after is None:
+        yield header
+    for book in iter_books(after, chunk_size):
+        yield render_book(book, fmt)
@@ -1,24 +1,47 @@
 from django import forms
 import datetime
+import uuid
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.forms import ModelForm
+from django.urls import reverse_lazy
 from .models import BookInstance, Author, Book
 
 class HTML5DateInput(forms.DateInput):
     input_type = 'date'
 
-class RenewBookModelForm(ModelForm):
-    def clean_due_back(self):
-       data = self.cleaned_data['due_back']
 
-       if data < datetime.date.today():
-           raise ValidationError(_('Invalid date - renewal in past'))
+class AutocompleteWidget(forms.Widget):
+    # выбор объекта вводом текста: варианты подгружаются с url по ?q=, а не выводятся
+    # все в <select>; в скрытом поле хранится pk выбранного объекта
+    template_name = 'catalog/widgets/autocomplete.html'
+
+    def __init__(self, url, model, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+        self.model = model
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = self.url
+        # подпись для уже выбранного значения (форма с ошибками, фильтр из адреса) - один запрос
+        obj = self.model._default_manager.filter(pk=value).first() if str(value or '').isdigit() else None
+        context['widget']['label'] = str(obj) if obj else ''
+        return context
+
+def validate_renewal_date(data):
+    if data < datetime.date.today():
+        raise ValidationError(_('Invalid date - renewal in past'))
 
-       if data > datetime.date.today() + datetime.timedelta(weeks=4):
-           raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+    if data > datetime.date.today() + datetime.timedelta(weeks=4):
+        raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
 
-       return data
+    return data
+
+
+class RenewBookModelForm(ModelForm):
+    def clean_due_back(self):
+       return validate_renewal_date(self.cleaned_data['due_back'])
 
     class Meta:
         model = BookInstance
@@ -63,3 +86,69 @@ class ReserveBookForm(forms.ModelForm):
             'due_back': HTML5DateInput(attrs={'class': 'form-control'}),
         }
 
+
+class ConsoleFilterForm(forms.Form):
+    SORT_CHOICES = (
+        ('due_back', 'Срок возврата: сначала ранние'),
+        ('-due_back', 'Срок возврата: сначала поздние'),
+    )
+
+    # в консоли только экземпляры у читателей: на полке и в ремонте borrower пустой
+    STATUS_CHOICES = tuple((code, label) for code, label in BookInstance.LOAN_STATUS if code in ('o', 'r'))
+
+    borrower = forms.CharField(required=False, label='Читатель',
+                               widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Логин читателя'}))
+    status = forms.ChoiceField(required=False, label='Статус', choices=(('', 'Любой статус'), *STATUS_CHOICES),
+                               widget=forms.Select(attrs={'class': 'form-select'}))
+    book = forms.ModelChoiceField(required=False, label='Книга', queryset=Book.objects.all(),
+                                  widget=AutocompleteWidget(reverse_lazy('api_autocomplete_books'), Book,
+                                                            attrs={'placeholder': 'Название книги'}))
+    author = forms.ModelChoiceField(required=False, label='Автор', queryset=Author.objects.all(),
+                                    widget=AutocompleteWidget(reverse_lazy('api_autocomplete_authors'), Author,
+                                                              attrs={'placeholder': 'Фамилия автора'}))
+    overdue = forms.BooleanField(required=False, label='Просрочено',
+                                 widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}))
+    sort = forms.ChoiceField(required=False, label='Порядок', choices=SORT_CHOICES,
+                             widget=forms.Select(attrs={'class': 'form-select'}))
+
+
+class UUIDListField(forms.Field):
+    # отмеченные экземпляры (<input type="checkbox" name="copies" value="<uuid>">) без выборки из базы
+    widget = forms.MultipleHiddenInput
+
+    def __init__(self, max_items=None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_items = max_items
+
+    def to_python(self, value):
+        try:
+            pks = [uuid.UUID(str(item)) for item in value or []]
+        except ValueError:
+            raise ValidationError('Неверный идентификатор экземпляра')
+        if self.max_items and len(pks) > self.max_items:
+            raise ValidationError(f'Не больше {self.max_items} экземпляров за раз')
+        return pks
+
+
+class BulkCirculationForm(forms.Form):
+    ACTIONS = (
+        ('renew', 'Продлить до даты'),
+        ('return', 'Принять возврат'),
+        ('maintenance', 'На обслуживание'),
+    )
+
+    action = forms.ChoiceField(choices=ACTIONS, widget=forms.Select(attrs={'class': 'form-select'}))
+    due_back = forms.DateField(required=False, widget=HTML5DateInput(attrs={'class': 'form-control'}))
+    copies = UUIDListField(max_items=1000, error_messages={'required': 'Не выбрано ни одного экземпляра'})
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == 'renew':
+            if not cleaned_data.get('due_back'):
+                self.add_error('due_back', 'Укажите новую дату возврата')
+            else:
+                try:
+                    validate_renewal_date(cleaned_data['due_back'])
+                except ValidationError as e:
+                    self.add_error('due_back', e)
+        return cleaned_data
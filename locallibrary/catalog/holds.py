@@ -0,0 +1,84 @@
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Book, BookInstance, Hold
+
+# Очереди ожидания книг. Пока доступных экземпляров нет, читатель встает в очередь; когда
+# экземпляр возвращают, catalog/circulation.py в той же транзакции откладывает его следующему
+# (статус 'r', borrower - читатель из очереди, due_back - срок, до которого его ждут).
+# Следующий в очереди и позиция читателя читаются из частичного индекса hold_queue_idx
+# (book, -priority, id) WHERE status = 'w', а не перебором всех заявок. Экземпляр, который не забрали
+# до due_back, снимает с отложенных команда expire_holds (catalog/circulation.py, expire_holds).
+
+
+class HoldError(Exception):
+    pass
+
+
+def pickup_due(today=None):
+    # сколько дней отложенный экземпляр ждет читателя
+    days = getattr(settings, 'CATALOG_HOLD_PICKUP_DAYS', 3)
+    return (today or datetime.date.today()) + datetime.timedelta(days=days)
+
+
+def waiting(book_id):
+    return Hold.objects.filter(book_id=book_id, status='w')
+
+
+def place_hold(book, borrower, priority=0):
+    try:
+        with transaction.atomic():
+            # доступность перечитывается под блокировкой строки книги, а не из объекта book:
+            # возврат меняет available_copies до разбора очереди, поэтому экземпляр не может
+            # освободиться между проверкой и вставкой заявки
+            available = Book.objects.select_for_update().filter(pk=book.pk).values_list(
+                'available_copies', flat=True).first()
+            if available:
+                raise HoldError('Есть доступные экземпляры, книгу можно взять сразу')
+            return Hold.objects.create(book=book, borrower=borrower, priority=priority)
+    except IntegrityError:
+        raise HoldError('Вы уже стоите в очереди на эту книгу')
+
+
+def cancel_hold(pk, borrower):
+    # из очереди - просто отмена; от уже отложенного экземпляра - он уходит следующему в очереди
+    if Hold.objects.filter(pk=pk, borrower=borrower, status='w').update(status='c'):
+        return True
+    from .circulation import release_holds
+    return bool(release_holds(Hold.objects.filter(pk=pk, borrower=borrower).values_list('pk', flat=True), 'c'))
+
+
+def queue_position(hold):
+    # 1 - следующий; считаются только заявки книги, по тому же индексу
+    ahead = waiting(hold.book_id).filter(
+        Q(priority__gt=hold.priority) | Q(priority=hold.priority, id__lt=hold.id),
+    ).count()
+    return ahead + 1
+
+
+def next_holds(book_id, limit=1):
+    return waiting(book_id).order_by('-priority', 'id')[:limit]
+
+
+def assign_copies(copies, due_back):
+    # copies - {book_id: [pk, ...]} только что освободившихся экземпляров. Вызывается внутри
+    # транзакции возврата; возвращает [(pk экземпляра, заявка)] для отложенных экземпляров
+    if not copies:
+        return []
+    books = (Hold.objects.filter(status='w', book_id__in=list(copies)).order_by()
+             .values_list('book_id', flat=True).distinct())
+    now = timezone.now()
+    assigned = []
+    for book_id in list(books):
+        for hold, pk in zip(next_holds(book_id, len(copies[book_id])).select_for_update(), copies[book_id]):
+            if BookInstance.objects.filter(pk=pk, status='a').update(
+                    status='r', borrower_id=hold.borrower_id, due_back=due_back):
+                hold.status, hold.copy_id, hold.fulfilled = 'f', pk, now
+                assigned.append((pk, hold))
+    if assigned:
+        Hold.objects.bulk_update([hold for _, hold in assigned], ['status', 'copy', 'fulfilled'])
+    return assigned
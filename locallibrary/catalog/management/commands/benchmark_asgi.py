@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+from catalog.benchmarks import BENCH_HOST, bench_settings, latency_summary
+from catalog.models import Author, Book
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность страниц чтения под WSGI (синхронные views, пул потоков) '
+            'и ASGI (async_views, цикл событий) на данных текущей базы. Каждый режим запускается '
+            'в отдельном процессе, запросы подаются прямо в обработчик Django, без HTTP-сервера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='запросов на каждый режим')
+        parser.add_argument('--concurrency', type=int, default=16, help='одновременных запросов')
+        parser.add_argument('--with-cache', action='store_true',
+                            help='не отключать кэш страниц (по умолчанию измеряется работа представлений)')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], help='внутренний параметр: один режим в этом процессе')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            return self.run_mode(options)
+
+        results = {}
+        for mode in ('wsgi', 'asgi'):
+            results[mode] = self.spawn(mode, options)
+            self.stdout.write(
+                f'{mode}: {results[mode]["rps"]:.1f} запр/с, p50 {results[mode]["p50_ms"]:.1f} мс, '
+                f'p95 {results[mode]["p95_ms"]:.1f} мс, ошибок {results[mode]["errors"]}'
+            )
+        results['asgi_vs_wsgi'] = round(results['asgi']['rps'] / results['wsgi']['rps'], 3)
+        self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+
+    def spawn(self, mode, options):
+        # режим задается до загрузки urls: CATALOG_ASYNC_VIEWS читается в settings
+        env = {**os.environ, 'CATALOG_ASYNC_VIEWS': '1' if mode == 'asgi' else '0'}
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_asgi', '--mode', mode,
+                   '--requests', str(options['requests']), '--concurrency', str(options['concurrency'])]
+        if options['with_cache']:
+            command.append('--with-cache')
+        proc = subprocess.run(command, env=env, capture_output=True, text=True)
+        if proc.returncode:
+            raise CommandError(f'{mode}: {proc.stderr}')
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def urls(self):
+        book = Book.objects.order_by('pk').first()
+        author = Author.objects.order_by('pk').first()
+        if book is None or author is None:
+            raise CommandError('В базе нет книг или авторов, сначала заполните ее')
+        return [
+            reverse('index'),
+            reverse('books'),
+            reverse('books') + '?after=',
+            reverse('book_detail', kwargs={'pk': book.pk}),
+            reverse('authors'),
+            reverse('author_detail', kwargs={'pk': author.pk}),
+        ]
+
+    def run_mode(self, options):
+        urls = self.urls()
+        targets = [urls[num % len(urls)] for num in range(options['requests'])]
+
+        run = self.run_wsgi if options['mode'] == 'wsgi' else self.run_asgi
+        with override_settings(**bench_settings(settings, options['with_cache'])):
+            started = time.perf_counter()
+            timings = run(targets, options['concurrency'])
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(json.dumps({
+            'requests': len(timings),
+            'concurrency': options['concurrency'],
+            'seconds': round(elapsed, 3),
+            'rps': round(len(timings) / elapsed, 1),
+            **latency_summary([ms for ms, ok in timings]),
+            'errors': sum(1 for ms, ok in timings if not ok),
+        }))
+
+    def run_wsgi(self, targets, concurrency):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        handler = WSGIHandler()
+
+        def call(url):
+            parts = urlsplit(url)
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': parts.path, 'QUERY_STRING': parts.query,
+                'SERVER_NAME': BENCH_HOST, 'SERVER_PORT': '80', 'HTTP_HOST': BENCH_HOST, 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+            }
+            status = []
+            started = time.perf_counter()
+            response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return (time.perf_counter() - started) * 1000, status[0].startswith('200')
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(call, targets))
+
+    def run_asgi(self, targets, concurrency):
+        from django.core.handlers.asgi import ASGIHandler
+
+        handler = ASGIHandler()
+
+        async def call(url, limit):
+            parts = urlsplit(url)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': parts.path, 'raw_path': parts.path.encode(),
+                'query_string': parts.query.encode(), 'headers': [(b'host', BENCH_HOST.encode())],
+                'server': (BENCH_HOST, 80), 'client': ('127.0.0.1', 0),
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            disconnect = asyncio.Event()
+            status = []
+
+            async def receive():
+                # тело запроса, затем "клиент отключился" - после того как ответ отправлен
+                if messages:
+                    return messages.pop()
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with limit:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                disconnect.set()
+                return (time.perf_counter() - started) * 1000, status[0] == 200
+
+        async def main():
+            limit = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(call(url, limit) for url in targets))
+
+        return asyncio.run(main())
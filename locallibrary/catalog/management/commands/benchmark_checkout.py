@@ -0,0 +1,105 @@
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from catalog.benchmarks import BENCH_HOST, bench_settings, latency_summary
+from catalog.models import Book, BookInstance, CirculationEvent
+
+
+class Command(BaseCommand):
+    help = ('Измеряет станцию выдачи api/v1/circulation/scan/: пачки выдачи и возврата доступных экземпляров '
+            'и, для сравнения, выдачу и возврат по одному через HTML-формы. Временные книга, экземпляры, '
+            'пользователи и их события журнала удаляются после прогона')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=20, help='кодов в одном запросе станции')
+        parser.add_argument('--rounds', type=int, default=25, help='пар запросов выдача + возврат')
+        parser.add_argument('--form-copies', type=int, default=10,
+                            help='экземпляров для сравнения с формами reserve_book/return_book, 0 - без сравнения')
+        parser.add_argument('--output', help='файл для результатов, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        if options['batch'] < 1:
+            raise CommandError('--batch должно быть больше нуля')
+        # свои книга и экземпляры: прогон не трогает каталог и не попадает в статистику выдач
+        # (most_borrowed_books, рекомендации) - события журнала удаляются вместе с ними
+        book = Book.objects.create(title='Бенчмарк станции выдачи', summary='-', isbn='bench-checkout')
+        # по одному, а не bulk_create: сигналы ведут счетчики доступных экземпляров книги
+        copies = [str(BookInstance.objects.create(book=book, imprint='-', status='a').pk)
+                  for _ in range(options['batch'])]
+        librarian = User.objects.create_superuser(f'bench_librarian_{time.time_ns()}', password=None)
+        reader = User.objects.create_user(f'bench_reader_{time.time_ns()}', password=None)
+        try:
+            with override_settings(**bench_settings(settings)):
+                result = {
+                    'batch': options['batch'],
+                    'rounds': options['rounds'],
+                    'scan': self.measure_scan(librarian, reader, copies, options['rounds']),
+                }
+                if options['form_copies']:
+                    # в форме ms_per_item - выдача и возврат одного экземпляра вместе
+                    result['form'] = self.measure_forms(reader, copies[:options['form_copies']])
+                    scan = result['scan']['checkout']['ms_per_item'] + result['scan']['return']['ms_per_item']
+                    result['speedup'] = round(result['form']['ms_per_item'] / scan, 1)
+        finally:
+            CirculationEvent.objects.filter(book_id=book.pk).delete()
+            BookInstance.objects.filter(pk__in=copies).delete()
+            book.delete()
+            User.objects.filter(pk__in=[librarian.pk, reader.pk]).delete()
+
+        data = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
+        else:
+            self.stdout.write(data)
+
+    def measure_scan(self, librarian, reader, copies, rounds):
+        client = Client(HTTP_HOST=BENCH_HOST)
+        client.force_login(librarian)
+        url = reverse('api_scan')
+        bodies = {
+            'checkout': json.dumps({'action': 'checkout', 'borrower': reader.username, 'items': copies}),
+            'return': json.dumps({'action': 'return', 'items': copies}),
+        }
+        timings = {'checkout': [], 'return': []}
+        # первая пара прогревает шаблоны запросов и сессию и в результаты не входит
+        for num in range(rounds + 1):
+            for action in ('checkout', 'return'):
+                started = time.perf_counter()
+                response = client.post(url, bodies[action], content_type='application/json')
+                elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code != 200 or response.json()['done'] != len(copies):
+                    raise CommandError(f'{action}: {response.status_code} {response.content[:500]!r}')
+                if num:
+                    timings[action].append(elapsed)
+        client.logout()
+        return {
+            action: {**latency_summary(values), 'ms_per_item': round(sum(values) / len(values) / len(copies), 3)}
+            for action, values in timings.items()
+        }
+
+    def measure_forms(self, reader, copies):
+        # прежний путь стойки выдачи: POST формы бронирования и POST возврата на каждый экземпляр
+        client = Client(HTTP_HOST=BENCH_HOST)
+        client.force_login(reader)
+        due_back = datetime.date.today().isoformat()
+        timings = []
+        for pk in copies:
+            started = time.perf_counter()
+            responses = [
+                client.post(reverse('reserve_book', kwargs={'pk': pk}), {'due_back': due_back}),
+                client.post(reverse('return_book', kwargs={'pk': pk})),
+            ]
+            timings.append((time.perf_counter() - started) * 1000)
+            if any(response.status_code != 302 for response in responses):
+                raise CommandError(f'{pk}: формы ответили {[response.status_code for response in responses]}')
+        client.logout()
+        return {**latency_summary(timings), 'ms_per_item': round(sum(timings) / len(timings), 3)}
@@ -0,0 +1,87 @@
+import datetime
+import json
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.benchmarks import latency_summary
+from catalog.circulation import checkout_copies, return_copy
+from catalog.holds import next_holds, queue_position, waiting
+from catalog.models import Book, BookInstance, CirculationEvent, Hold
+
+
+class Command(BaseCommand):
+    help = ('Измеряет очередь ожидания на одну популярную книгу: возврат экземпляра с передачей '
+            'следующему в очереди и расчет позиции читателя при тысячах заявок. Книга, заявки и '
+            'временные пользователи удаляются после прогона')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--holds', type=int, default=5000, help='заявок в очереди')
+        parser.add_argument('--rounds', type=int, default=200, help='возвратов с передачей по очереди')
+        parser.add_argument('--priority-share', type=float, default=0.1, help='доля заявок с повышенным приоритетом')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='файл для результатов, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        if options['rounds'] >= options['holds']:
+            raise CommandError('--rounds должно быть меньше --holds: каждый возврат забирает одну заявку')
+        rnd = random.Random(options['seed'])
+        prefix = f'bench_hold_{time.time_ns()}_'
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}{num}', password='!') for num in range(options['holds'] + 1)],
+            batch_size=1000,
+        )
+        if users[0].pk is None:
+            users = list(User.objects.filter(username__startswith=prefix).order_by('pk'))
+        book = Book.objects.create(title='Бенчмарк очереди', summary='-', isbn='bench-holds')
+        copy = BookInstance.objects.create(book=book, imprint='-', status='a')
+        try:
+            checkout_copies([copy.pk], users[0], datetime.date.today())
+            Hold.objects.bulk_create([
+                Hold(book=book, borrower=user, priority=int(rnd.random() < options['priority_share']))
+                for user in users[1:]
+            ], batch_size=1000)
+            result = {
+                'holds': options['holds'],
+                'rounds': options['rounds'],
+                'dispatch': self.measure_dispatch(copy, options['rounds']),
+                'position': self.measure_position(book, options['rounds'], rnd),
+                'next_hold_plan': next_holds(book.pk).explain(),
+            }
+        finally:
+            CirculationEvent.objects.filter(book_id=book.pk).delete()
+            book.delete()
+            User.objects.filter(username__startswith=prefix).delete()
+
+        data = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
+        else:
+            self.stdout.write(data)
+
+    def measure_dispatch(self, copy, rounds):
+        # возврат откладывает экземпляр следующему; выдача ему же (вне замера) готовит новый круг
+        timings = []
+        due_back = datetime.date.today()
+        for _ in range(rounds):
+            started = time.perf_counter()
+            return_copy(copy.pk)
+            timings.append((time.perf_counter() - started) * 1000)
+            copy.refresh_from_db(fields=['status', 'borrower'])
+            if copy.status != 'r':
+                raise CommandError(f'экземпляр не отложен по очереди: статус {copy.status}')
+            checkout_copies([copy.pk], copy.borrower, due_back)
+        return latency_summary(timings)
+
+    def measure_position(self, book, samples, rnd):
+        holds = list(waiting(book.pk).only('id', 'book_id', 'priority'))
+        timings = []
+        for hold in rnd.sample(holds, min(samples, len(holds))):
+            started = time.perf_counter()
+            queue_position(hold)
+            timings.append((time.perf_counter() - started) * 1000)
+        return latency_summary(timings)
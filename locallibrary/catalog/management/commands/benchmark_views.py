@@ -0,0 +1,150 @@
+import datetime
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from catalog import urls as catalog_urls
+from catalog.benchmarks import BENCH_HOST, bench_settings, latency_summary
+from catalog.models import Author, Book, BookInstance
+
+# обязательные GET-параметры адресов: параметр -> вид образца из urls()
+QUERY_PARAMS = {
+    'api_availability': {'ids': 'book'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет GET-запросы ко всем адресам catalog/urls.py через тестовый клиент и сохраняет '
+            'p50/p95 задержки, число SQL-запросов и пик памяти по каждому представлению в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='запросов к каждому адресу')
+        parser.add_argument('--user', help='имя пользователя, от которого идут запросы (по умолчанию аноним)')
+        parser.add_argument('--with-cache', action='store_true', help='не отключать кэш страниц')
+        parser.add_argument('--output', help='файл для результатов, по умолчанию stdout')
+        parser.add_argument('--compare', help='JSON предыдущего прогона: вывести изменение p50 и числа запросов')
+
+    def handle(self, *args, **options):
+        # ошибка представления попадает в результаты как status 500, а не прерывает прогон
+        client = Client(raise_request_exception=False, HTTP_HOST=BENCH_HOST)
+        if options['user']:
+            try:
+                client.force_login(User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {options["user"]} не найден')
+
+        views = {}
+        with override_settings(**bench_settings(settings, options['with_cache'])):
+            for name, url in self.urls():
+                views[name] = self.measure(client, url, options['repeat'])
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{name}: {views[name]}')
+
+        result = {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'user': options['user'],
+            'repeat': options['repeat'],
+            'dataset': {
+                'books': Book.objects.count(),
+                'copies': BookInstance.objects.count(),
+                'authors': Author.objects.count(),
+                'users': User.objects.count(),
+            },
+            'views': views,
+        }
+        data = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
+        else:
+            self.stdout.write(data)
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                self.compare(json.load(f)['views'], views)
+
+    def urls(self):
+        # образцы pk для адресов с параметрами: int - книга или автор (по имени адреса), uuid - экземпляр
+        samples = {
+            'book': Book.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'author': Author.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'instance': BookInstance.objects.order_by('pk').values_list('pk', flat=True).first(),
+        }
+        for pattern in catalog_urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            kwargs = {}
+            for param, converter in pattern.pattern.converters.items():
+                if converter.regex.startswith('[0-9a-f]{8}'):
+                    kind = 'instance'
+                else:
+                    kind = 'author' if 'author' in pattern.name else 'book'
+                if samples[kind] is None:
+                    break
+                kwargs[param] = samples[kind]
+            else:
+                query = '&'.join(f'{param}={samples[kind]}' for param, kind in QUERY_PARAMS.get(pattern.name, {}).items())
+                yield pattern.name, reverse(pattern.name, kwargs=kwargs) + (f'?{query}' if query else '')
+                continue
+            self.stderr.write(f'{pattern.name}: пропущен, в базе нет объектов для параметров')
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, client, url, repeat):
+        # первый запрос прогревает шаблоны и кэши, память меряется отдельным запросом:
+        # tracemalloc замедляет выполнение и исказил бы задержки
+        status = self.request(client, url).status_code
+        latencies, queries = [], []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                self.request(client, url)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(ctx.captured_queries))
+
+        tracemalloc.start()
+        try:
+            self.request(client, url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'url': url,
+            'status': status,
+            **latency_summary(latencies),
+            'queries': int(statistics.median(queries)),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def compare(self, before, after):
+        self.stdout.write('Сравнение с предыдущим прогоном (p50, запросы):')
+        for name, now in after.items():
+            old = before.get(name)
+            if not old:
+                self.stdout.write(f'  {name}: новый адрес')
+                continue
+            change = (now['p50_ms'] / old['p50_ms'] - 1) * 100 if old['p50_ms'] else 0
+            self.stdout.write(
+                f'  {name}: {old["p50_ms"]} -> {now["p50_ms"]} мс ({change:+.0f}%), '
+                f'запросов {old["queries"]} -> {now["queries"]}'
+            )
@@ -0,0 +1,103 @@
+import json
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+
+from catalog import views, visits
+from catalog.benchmarks import BENCH_HOST, bench_settings, latency_summary
+from catalog.models import CatalogCounter
+from locallibrary import urls as project_urls
+
+_WRITE = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE)\b[^"]*"(\w+)"', re.IGNORECASE)
+
+
+def session_index(request):
+    # главная до буфера посещений: счетчик читателя в сессии, запись в хранилище сессий на каждый просмотр
+    request.session['num_visits'] = request.session.get('num_visits', 0) + 1
+    return views.index(request)
+
+
+urlpatterns = [
+    path('bench/session_index/', session_index, name='bench_session_index'),
+    *project_urls.urlpatterns,
+]
+
+
+class Command(BaseCommand):
+    help = ('Считает записи в базу на каждые 1000 просмотров главной анонимными читателями: прежний '
+            'счетчик в сессии против cookie и буфера посещений, для хранилищ сессий db, cache и cookies')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hits', type=int, default=1000, help='просмотров главной в каждом режиме')
+        parser.add_argument('--visitors', type=int, default=50, help='разных читателей (клиентов с cookie)')
+        parser.add_argument('--output', help='файл для результатов, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        runs = [('before', 'db', 'bench_session_index')] + [
+            (f'after_{store}', store, 'index') for store in settings.CATALOG_SESSION_ENGINES
+        ]
+        result = {'hits': options['hits'], 'visitors': options['visitors'], 'modes': {}}
+        # просмотры бенчмарка не должны попасть в общий счетчик посещений
+        visits.buffer.flush()
+        site_visits = CatalogCounter.objects.filter(name=visits.COUNTER).values_list('value', flat=True).first()
+        try:
+            with override_settings(ROOT_URLCONF=__name__, **bench_settings(settings)):
+                for name, store, url_name in runs:
+                    with override_settings(SESSION_ENGINE=settings.CATALOG_SESSION_ENGINES[store]):
+                        result['modes'][name] = self.measure(reverse(url_name), options['hits'], options['visitors'])
+        finally:
+            visits.buffer.flush()
+            if site_visits is None:
+                CatalogCounter.objects.filter(name=visits.COUNTER).delete()
+            else:
+                CatalogCounter.objects.filter(name=visits.COUNTER).update(value=site_visits)
+        before = result['modes']['before']['writes_per_1000']
+        after = result['modes']['after_db']['writes_per_1000']
+        result['reduction'] = round(before / after, 1) if after else None
+
+        data = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
+        else:
+            self.stdout.write(data)
+
+    def measure(self, url, hits, visitors):
+        clients = [Client(HTTP_HOST=BENCH_HOST) for _ in range(visitors)]
+        visits.buffer.flush()
+        timings = []
+        # в замер входит и последний сброс буфера - эти записи все равно произойдут
+        with CaptureQueriesContext(connection) as ctx:
+            for num in range(hits):
+                started = time.perf_counter()
+                response = clients[num % visitors].get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'{url}: {response.status_code}')
+            visits.buffer.flush()
+        # сессии, созданные прогоном в базе (для хранилища db)
+        Session.objects.filter(session_key__in=[
+            client.cookies[settings.SESSION_COOKIE_NAME].value
+            for client in clients if settings.SESSION_COOKIE_NAME in client.cookies
+        ]).delete()
+        tables = Counter()
+        for query in ctx.captured_queries:
+            match = _WRITE.match(query['sql'])
+            if match:
+                tables[match.group(2)] += 1
+        writes = sum(tables.values())
+        return {
+            'writes': writes,
+            'writes_per_1000': round(writes * 1000 / hits, 1),
+            'tables': dict(tables),
+            **latency_summary(timings),
+        }
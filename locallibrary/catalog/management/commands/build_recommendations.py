@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.recommendations import TOP_K, build_recommendations
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации "читатели также брали" по совместным выдачам. По умолчанию '
+            'только для книг читателей, у которых появились новые выдачи с прошлого запуска')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='пересчитать рекомендации всех книг')
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='рекомендаций на книгу')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = build_recommendations(full=options['full'], top_k=options['top_k'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано книг: {result["books"]}, строк рекомендаций: {result["rows"]} за {elapsed:.2f} с'
+        ))
@@ -0,0 +1,108 @@
+import re
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+
+from catalog.models import Author, Book, BookInstance
+
+# строки плана, означающие полный просмотр таблицы без индекса
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (\w+)$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+# страницы строятся без кэша: готовая страница или фрагмент {% cache %} из прогретого
+# кэша не выполнили бы ни одного запроса, и проверять было бы нечего
+NO_CACHE_SETTINGS = {
+    'CATALOG_PAGE_CACHE_TIMEOUT': 0,
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+}
+
+
+class Command(BaseCommand):
+    help = ('Выполняет списки и карточки каталога, получает план каждого SQL-запроса '
+            '(EXPLAIN QUERY PLAN) и завершается ошибкой, если какой-то из них читает таблицу целиком')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--allow', action='append', default=[],
+                            help='таблица, полный просмотр которой допустим (можно указывать несколько раз)')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f'Проверка планов не поддерживается для {connection.vendor}')
+        pattern = FULL_SCAN_PATTERNS[connection.vendor]
+        allowed = set(options['allow'])
+
+        failures = 0
+        with override_settings(**NO_CACHE_SETTINGS):
+            for label, url, user in self.pages():
+                failures += self.check_page(label, url, user, pattern, allowed, options['verbosity'])
+
+        if failures:
+            raise CommandError(f'Запросов с полным просмотром таблицы или страниц без запросов: {failures}')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
+
+    def check_page(self, label, url, user, pattern, allowed, verbosity):
+        queries = self.capture_queries(url, user)
+        if not queries:
+            self.stdout.write(self.style.ERROR(f'{label}: ни одного SELECT, план не проверен'))
+            return 1
+
+        failures = 0
+        for sql in queries:
+            plan = self.explain(sql)
+            scans = {table for line in plan for table in pattern.findall(line)} - allowed
+            if scans:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'{label}: полный просмотр {", ".join(sorted(scans))}'))
+                self.stdout.write(f'  {sql}')
+                for line in plan:
+                    self.stdout.write(f'    {line}')
+            elif verbosity > 1:
+                self.stdout.write(f'{label}: {"; ".join(plan)}')
+        self.stdout.write(f'{label}: проверено')
+        return failures
+
+    def pages(self):
+        librarian = User(username='explain', is_active=True, is_staff=True, is_superuser=True)
+        yield 'books', reverse('books'), AnonymousUser()
+        yield 'books?q', reverse('books') + '?q=a', AnonymousUser()
+        yield 'books?after', reverse('books') + '?after=', AnonymousUser()
+        yield 'authors', reverse('authors'), AnonymousUser()
+        yield 'authors?q', reverse('authors') + '?q=a', AnonymousUser()
+        yield 'authors?after', reverse('authors') + '?after=', AnonymousUser()
+        yield 'my_tools', reverse('my_tools'), librarian
+
+        book = Book.objects.order_by('pk').first()
+        if book:
+            yield 'book_detail', reverse('book_detail', kwargs={'pk': book.pk}), AnonymousUser()
+        author = Author.objects.order_by('pk').first()
+        if author:
+            yield 'author_detail', reverse('author_detail', kwargs={'pk': author.pk}), AnonymousUser()
+        borrower = User.objects.filter(pk__in=BookInstance.objects.filter(borrower__isnull=False).values('borrower')[:1]).first()
+        if borrower:
+            yield 'my_books', reverse('my_books'), borrower
+
+    def capture_queries(self, url, user):
+        request = RequestFactory().get(url)
+        request.user = user
+        match = resolve(request.path_info)
+        # страницы только читают, но на всякий случай все откатывается
+        with transaction.atomic(), CaptureQueriesContext(connection) as ctx:
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            transaction.set_rollback(True)
+        return [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+
+    def explain(self, sql):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            rows = cursor.fetchall()
+        # SQLite: (id, parent, notused, detail), PostgreSQL: (строка плана,)
+        return [row[-1] for row in rows]
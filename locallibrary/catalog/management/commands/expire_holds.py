@@ -0,0 +1,17 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from catalog.circulation import expire_holds
+
+
+class Command(BaseCommand):
+    help = ('Снимает с отложенных экземпляры, которые читатели не забрали в срок, и передает их '
+            'следующим в очереди (или возвращает на полку). Запускать раз в день')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, help='дата проверки, по умолчанию сегодня')
+
+    def handle(self, *args, **options):
+        released = expire_holds(options['date'])
+        self.stdout.write(self.style.SUCCESS(f'Снято с отложенных экземпляров: {released}'))
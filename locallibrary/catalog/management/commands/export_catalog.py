@@ -0,0 +1,66 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.export import CONTENT_TYPES, iter_books, render_book, render_header
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка каталога (книги и экземпляры) в CSV/JSONL/NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=CONTENT_TYPES, default='jsonl')
+        parser.add_argument('--output', help='файл выгрузки, по умолчанию stdout')
+        parser.add_argument('--after', type=int, help='начать с книг, pk которых больше указанного')
+        parser.add_argument('--checkpoint',
+                            help='файл с pk последней выгруженной книги и размером выгрузки на тот момент; '
+                                 'если он есть, выгрузка продолжается с него. После полной выгрузки удаляется')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        after = options['after']
+        checkpoint = options['checkpoint']
+        if checkpoint and not options['output']:
+            raise CommandError('--checkpoint требует --output')
+        # дописывать в файл можно только по контрольной точке: --after без нее начинает файл заново
+        resuming = bool(checkpoint) and os.path.exists(checkpoint)
+        offset = None
+        if resuming:
+            with open(checkpoint) as f:
+                after, *offset = map(int, f.read().split())
+            offset = offset[0] if offset else None
+
+        out = open(options['output'], 'a' if resuming else 'w', encoding='utf-8') if options['output'] else self.stdout
+        try:
+            if offset is not None:
+                # строки, записанные после контрольной точки до сбоя, выгрузятся заново - отрезаем их
+                if offset > os.fstat(out.fileno()).st_size:
+                    raise CommandError('Файл выгрузки короче, чем записано в контрольной точке')
+                out.truncate(offset)
+            header = render_header(fmt)
+            if header and not resuming:
+                out.write(header)
+            written = 0
+            for book in iter_books(after, options['chunk_size']):
+                out.write(render_book(book, fmt))
+                written += 1
+                if checkpoint and written % options['chunk_size'] == 0:
+                    self.save_checkpoint(out, checkpoint, book.pk)
+        finally:
+            if out is not self.stdout:
+                out.close()
+        # выгрузка завершена: контрольная точка нужна только прерванной, иначе следующий запуск
+        # с тем же --checkpoint дописал бы к старому файлу только новые книги вместо полной выгрузки
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stderr.write(f'Выгружено книг: {written}')
+
+    def save_checkpoint(self, out, path, pk):
+        # контрольная точка пишется только после того, как данные сброшены на диск
+        out.flush()
+        os.fsync(out.fileno())
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(f'{pk} {out.tell()}')
+        os.replace(tmp, path)
@@ -0,0 +1,66 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+
+from catalog.covers import encode_variants, read_cover, save_variants, store_variants
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии обложек (AVIF/WEBP/JPEG) в пуле потоков или процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='перестроить и уже обработанные обложки')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--processes', action='store_true',
+                            help='пул процессов вместо потоков (кодирование AVIF сильно нагружает CPU)')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(cover='')
+        if not options['all']:
+            books = books.filter(cover_variants={})
+        jobs = iter(list(books.values_list('pk', 'cover')))
+
+        workers = options['workers']
+        if options['processes']:
+            # spawn на всех платформах (fork есть не везде и не наследует состояние безопасно);
+            # django.setup() нужен, чтобы в дочернем процессе импортировался catalog.covers.
+            # Хранилище и настройки остаются в основном процессе - в пул уходят только байты
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=django.setup)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+        started = time.monotonic()
+        done = failed = 0
+        pending = {}
+        with pool:
+            # чтение и запись файлов и базы - в основном потоке, в пуле только кодирование.
+            # В работе не больше двух обложек на исполнителя, чтобы не держать в памяти все сразу
+            while True:
+                for pk, name in jobs:
+                    try:
+                        pending[pool.submit(encode_variants, read_cover(name))] = pk
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f'Книга {pk}: {e}')
+                    if len(pending) >= workers * 2:
+                        break
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pk = pending.pop(future)
+                    try:
+                        save_variants(pk, store_variants(future.result()))
+                        done += 1
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f'Книга {pk}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано обложек: {done}, ошибок: {failed}, {time.monotonic() - started:.1f} с'
+        ))
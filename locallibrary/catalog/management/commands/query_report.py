@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.querystats import aggregate, log_files, read_records
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала статистики запросов (CATALOG_QUERY_STATS_LOG и его архивов): '
+            'задержки, число и время SQL и повторяющиеся запросы по каждому представлению')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='файл журнала, по умолчанию CATALOG_QUERY_STATS_LOG')
+        parser.add_argument('--top', type=int, default=20, help='сколько представлений показать (самые медленные по p95)')
+        parser.add_argument('--json', action='store_true', help='вывести сводку в JSON')
+
+    def handle(self, *args, **options):
+        if not log_files(options['log']):
+            raise CommandError('Журнал статистики запросов не найден')
+        report = aggregate(read_records(options['log']))[:options['top']]
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        for view in report:
+            line = (f'{view["url_name"]}: {view["requests"]} запр., p50 {view["p50_ms"]} мс, '
+                    f'p95 {view["p95_ms"]} мс, max {view["max_ms"]} мс')
+            if view['queries'] is not None:
+                line += f', SQL {view["queries"]} (до {view["max_queries"]}) за {view["db_ms"]} мс'
+            self.stdout.write(line)
+            for item in view['repeated']:
+                self.stdout.write(self.style.WARNING(f'    повтор в {item["requests"]} запр.: {item["sql"][:200]}'))
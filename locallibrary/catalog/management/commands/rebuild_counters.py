@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from catalog.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики главной страницы с нуля'
+
+    def handle(self, *args, **options):
+        for name, value in rebuild_counters().items():
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
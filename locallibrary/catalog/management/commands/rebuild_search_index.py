@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cache import invalidate_all
+from catalog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс книг и авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild(chunk_size=options['chunk_size'])
+        invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f'Индекс перестроен ({type(backend).__name__})'))
@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog.rollups import most_borrowed_books, rollup_circulation
+
+
+class Command(BaseCommand):
+    help = ('Строит сводки выдач по дням (книги, жанры, авторы) из журнала CirculationEvent. '
+            'По умолчанию пересчитывает только дни начиная с последнего посчитанного')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=datetime.date.fromisoformat, help='пересчитать начиная с этой даты')
+        parser.add_argument('--full', action='store_true', help='пересчитать весь журнал')
+        parser.add_argument('--top', type=int, default=0, help='вывести самые выдаваемые книги текущего месяца')
+
+    def handle(self, *args, **options):
+        written = rollup_circulation(options['since'], options['full'])
+        if written is None:
+            self.stdout.write('Журнал выдач пуст')
+        else:
+            summary = ', '.join(f'{name}: {count}' for name, count in written.items())
+            self.stdout.write(self.style.SUCCESS(f'Сводки обновлены ({summary})'))
+
+        if options['top']:
+            month = timezone.localdate().replace(day=1)
+            self.stdout.write(f'Чаще всего выдавали с {month:%d.%m.%Y}:')
+            for book, loans in most_borrowed_books(month, limit=options['top']):
+                self.stdout.write(f'  {loans:5}  {book.title}')
@@ -0,0 +1,69 @@
+import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.core.management.base import BaseCommand
+
+from catalog.models import BookInstance
+
+
+def overdue_loans(today, chunk_size):
+    # просроченные выдачи, отсортированные по читателю (индекс borrower, status, due_back),
+    # читаются курсором - в памяти только текущая пачка строк
+    return BookInstance.objects.overdue(today).filter(borrower__isnull=False).order_by(
+        'borrower_id', 'due_back', 'pk',
+    ).values(
+        'borrower_id', 'borrower__username', 'borrower__email', 'book__title', 'due_back',
+    ).iterator(chunk_size=chunk_size)
+
+
+def build_notice(loans, today):
+    first = loans[0]
+    lines = [
+        f'- {loan["book__title"] or "—"}: срок возврата {loan["due_back"]:%d.%m.%Y}, '
+        f'просрочено на {(today - loan["due_back"]).days} дн.'
+        for loan in loans
+    ]
+    body = f'Здравствуйте, {first["borrower__username"]}!\n\nУ вас есть просроченные книги:\n' + '\n'.join(lines)
+    return ('Просроченные книги', body, settings.DEFAULT_FROM_EMAIL, [first['borrower__email']])
+
+
+class Command(BaseCommand):
+    help = 'Находит просроченные выдачи и отправляет читателям по одному письму пакетами send_mass_mail'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='строк за одно чтение из базы')
+        parser.add_argument('--batch-size', type=int, default=500, help='писем за одно соединение с почтой')
+        parser.add_argument('--date', type=datetime.date.fromisoformat, help='дата проверки, по умолчанию сегодня')
+        parser.add_argument('--dry-run', action='store_true', help='только посчитать, письма не отправлять')
+
+    def handle(self, *args, **options):
+        today = options['date'] or datetime.date.today()
+        loans = borrowers = skipped = sent = 0
+        batch = []
+
+        rows = overdue_loans(today, options['chunk_size'])
+        for _, group in groupby(rows, key=itemgetter('borrower_id')):
+            group = list(group)
+            loans += len(group)
+            borrowers += 1
+            if not group[0]['borrower__email']:
+                skipped += 1
+                continue
+            batch.append(build_notice(group, today))
+            if len(batch) >= options['batch_size']:
+                sent += self.flush(batch, options['dry_run'])
+                batch = []
+        sent += self.flush(batch, options['dry_run'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Просроченных выдач: {loans}, читателей: {borrowers}, '
+            f'писем: {sent}, без email: {skipped}'
+        ))
+
+    def flush(self, batch, dry_run):
+        if not batch or dry_run:
+            return len(batch)
+        return send_mass_mail(batch, fail_silently=False)
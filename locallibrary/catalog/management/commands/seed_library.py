@@ -0,0 +1,143 @@
+import datetime
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from catalog.cache import invalidate_all
+from catalog.counters import rebuild_counters
+from catalog.management.commands.import_catalog import chunked
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.search import get_search_backend
+
+# Синтетическая библиотека для нагрузочных тестов. Все значения берутся из random.Random(--seed),
+# поэтому одинаковые параметры на пустой базе дают одинаковые данные.
+
+SYLLABLES = ['ка', 'ла', 'ми', 'но', 'ре', 'си', 'то', 'ва', 'ду', 'жа', 'ло', 'ры', 'ск', 'ин', 'ов', 'ев']
+WORDS = ['война', 'мир', 'сад', 'дом', 'море', 'ночь', 'город', 'река', 'путь', 'время', 'письма',
+         'тайна', 'остров', 'зима', 'дорога', 'сердце', 'звезда', 'память', 'лес', 'огонь']
+GENRES = ['Роман', 'Повесть', 'Драма', 'Поэзия', 'Фантастика', 'Детектив', 'История', 'Биография',
+          'Приключения', 'Сказка', 'Философия', 'Наука']
+LANGUAGES = ['Русский', 'Казахский', 'English', 'Deutsch', 'Français']
+IMPRINTS = ['АСТ', 'Эксмо', 'Азбука', 'Просвещение', 'Фолиант']
+# статус экземпляра: доступен, выдан, зарезервирован, на обслуживании
+STATUS_WEIGHTS = {'a': 60, 'o': 30, 'r': 7, 'm': 3}
+
+
+class Command(BaseCommand):
+    help = 'Генерирует воспроизводимую синтетическую библиотеку пакетами bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--copies-per-book', type=int, default=3, help='среднее число экземпляров книги')
+        parser.add_argument('--users', type=int, default=100, help='читатели reader<N> с паролем "password"')
+        parser.add_argument('--authors', type=int, help='по умолчанию одна десятая от числа книг')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('База данных не возвращает pk из bulk_create')
+        self.random = random.Random(options['seed'])
+        self.today = datetime.date.today()
+        started = time.monotonic()
+
+        with transaction.atomic():
+            genres = self.lookup(Genre, 'name', GENRES)
+            languages = self.lookup(Language, 'lang', LANGUAGES)
+            users = self.create_users(options['users'])
+            authors = self.create_authors(options['authors'] or max(1, options['books'] // 10))
+
+        books = copies = 0
+        numbers = range(options['books'])
+        for chunk in chunked(numbers, options['chunk_size']):
+            with transaction.atomic():
+                copies += self.create_books(chunk, authors, genres, languages, users, options['copies_per_book'])
+            books += len(chunk)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{books} книг, {copies} экземпляров')
+
+        # bulk_create не вызывает сигналы - производные данные пересчитываются целиком
+        rebuild_counters()
+        get_search_backend().rebuild()
+        invalidate_all()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {books} книг, {copies} экземпляров, {len(authors)} авторов, '
+            f'{len(users)} читателей за {elapsed:.1f} с'
+        ))
+
+    def lookup(self, model, field, names):
+        existing = dict(model.objects.filter(**{f'{field}__in': names}).values_list(field, 'pk'))
+        created = model.objects.bulk_create([model(**{field: name}) for name in names if name not in existing])
+        existing.update((getattr(obj, field), obj.pk) for obj in created)
+        return [existing[name] for name in names]
+
+    def create_users(self, count):
+        # один хэш на всех: make_password для каждого читателя занял бы секунды
+        password = make_password('password')
+        names = [f'reader{num}' for num in range(count)]
+        User.objects.bulk_create([
+            User(username=name, email=f'{name}@example.com', password=password) for name in names
+        ], ignore_conflicts=True)
+        return list(User.objects.filter(username__in=names).order_by('pk').values_list('pk', flat=True))
+
+    def name(self, syllables=3):
+        return ''.join(self.random.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+    def create_authors(self, count):
+        authors = []
+        for _ in range(count):
+            born = self.today - datetime.timedelta(days=self.random.randint(25, 200) * 365)
+            died = born + datetime.timedelta(days=self.random.randint(40, 90) * 365)
+            authors.append(Author(
+                first_name=self.name(2),
+                last_name=self.name(3) + self.random.choice(['ов', 'ин', 'ский', 'ева']),
+                date_of_birth=born,
+                date_of_death=died if died < self.today else None,
+            ))
+        return [author.pk for author in Author.objects.bulk_create(authors)]
+
+    def create_books(self, numbers, authors, genres, languages, users, copies_per_book):
+        rnd = self.random
+        books = Book.objects.bulk_create([
+            Book(
+                title=' '.join(rnd.sample(WORDS, rnd.randint(1, 3))).capitalize() + f' {num + 1}',
+                summary=' '.join(rnd.choices(WORDS, k=rnd.randint(20, 60))).capitalize() + '.',
+                isbn=''.join(rnd.choices('0123456789', k=13)),
+                author_id=rnd.choice(authors),
+                language_id=rnd.choice(languages),
+            )
+            for num in numbers
+        ])
+
+        Through = Book.genre.through
+        Through.objects.bulk_create([
+            Through(book_id=book.pk, genre_id=genre_id)
+            for book in books
+            for genre_id in rnd.sample(genres, rnd.randint(1, 3))
+        ])
+
+        statuses, weights = list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values())
+        instances = []
+        for book in books:
+            for _ in range(rnd.randint(0, 2 * copies_per_book)):
+                status = rnd.choices(statuses, weights)[0]
+                loaned = status in ('o', 'r') and users
+                instances.append(BookInstance(
+                    # uuid4() по умолчанию случаен, а pk тоже должен повторяться от запуска к запуску
+                    id=uuid.UUID(int=rnd.getrandbits(128), version=4),
+                    book_id=book.pk,
+                    imprint=f'{rnd.choice(IMPRINTS)}, {rnd.randint(1950, self.today.year)}',
+                    status=status,
+                    borrower_id=rnd.choice(users) if loaned else None,
+                    # около четверти выдач просрочены
+                    due_back=self.today + datetime.timedelta(days=rnd.randint(-10, 30)) if loaned else None,
+                ))
+        BookInstance.objects.bulk_create(instances)
+        return len(instances)
@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 19:40
+
+from django.db import migrations
+
+
+def create_fts_tables(apps, schema_editor):
+    # полнотекстовый индекс нужен только на SQLite, остальные базы используют LikeSearchBackend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_book_fts "
+        "USING fts5(title, summary, isbn, author, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_author_fts "
+        "USING fts5(first_name, last_name, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO catalog_book_fts (rowid, title, summary, isbn, author) "
+        "SELECT b.id, b.title, b.summary, b.isbn, COALESCE(a.first_name || ' ' || a.last_name, '') "
+        "FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id"
+    )
+    schema_editor.execute(
+        "INSERT INTO catalog_author_fts (rowid, first_name, last_name) "
+        "SELECT id, first_name, last_name FROM catalog_author"
+    )
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS catalog_book_fts")
+    schema_editor.execute("DROP TABLE IF EXISTS catalog_author_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_catalogcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
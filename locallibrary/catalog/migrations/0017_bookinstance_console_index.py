@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 20:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0016_book_available_copies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(condition=models.Q(('book__isnull', False), ('borrower__isnull', False)), fields=['due_back', 'id'], name='bookinst_console_due_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0 on 2026-10-18 20:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0018_book_isbn_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CirculationEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('action', models.CharField(choices=[('checkout', 'Выдача'), ('return', 'Возврат'), ('renew', 'Продление'), ('maintenance', 'На обслуживание')], max_length=12)),
+                ('status_from', models.CharField(max_length=1)),
+                ('status_to', models.CharField(max_length=1)),
+                ('due_back', models.DateField(null=True)),
+                ('book', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.book')),
+                ('borrower', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('copy', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='catalog.bookinstance')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['created'], name='circevent_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyAuthorLoans',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('loans', models.PositiveIntegerField()),
+                ('author', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.author')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'author'), name='daily_author_loans_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyBookLoans',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('loans', models.PositiveIntegerField()),
+                ('book', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'book'), name='daily_book_loans_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyGenreLoans',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('loans', models.PositiveIntegerField()),
+                ('genre', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.genre')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'genre'), name='daily_genre_loans_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 20:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0019_circulation_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='circulationevent',
+            name='action',
+            field=models.CharField(choices=[('checkout', 'Выдача'), ('return', 'Возврат'), ('renew', 'Продление'), ('maintenance', 'На обслуживание'), ('hold', 'Отложен по очереди')], max_length=12),
+        ),
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('priority', models.SmallIntegerField(default=0)),
+                ('status', models.CharField(choices=[('w', 'Ожидает'), ('f', 'Экземпляр отложен'), ('c', 'Отменена')], default='w', max_length=1)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fulfilled', models.DateTimeField(blank=True, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='catalog.book')),
+                ('borrower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to=settings.AUTH_USER_MODEL)),
+                ('copy', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.bookinstance')),
+            ],
+            options={
+                'ordering': ['-priority', 'id'],
+                'indexes': [models.Index(condition=models.Q(('status', 'w')), fields=['book', '-priority', 'id'], name='hold_queue_idx'), models.Index(fields=['borrower', 'status'], name='hold_borrower_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'w')), fields=('book', 'borrower'), name='hold_one_waiting_per_book')],
+            },
+        ),
+    ]
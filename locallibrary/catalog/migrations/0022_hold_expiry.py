@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0021_book_recommendations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='circulationevent',
+            name='action',
+            field=models.CharField(choices=[('checkout', 'Выдача'), ('return', 'Возврат'), ('renew', 'Продление'), ('maintenance', 'На обслуживание'), ('hold', 'Отложен по очереди'), ('release', 'Снят с отложенных')], max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='hold',
+            name='status',
+            field=models.CharField(choices=[('w', 'Ожидает'), ('f', 'Экземпляр отложен'), ('e', 'Срок получения истек'), ('c', 'Отменена')], default='w', max_length=1),
+        ),
+    ]
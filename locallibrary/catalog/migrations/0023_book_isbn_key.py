@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 21:30
+
+import catalog.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0022_hold_expiry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_isbn_idx',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(catalog.models.IsbnKey('isbn'), name='book_isbn_key_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 21:45
+
+from django.db import migrations, models
+
+WATERMARKS = ['recommendations_built_through']
+
+
+def move_watermarks(apps, schema_editor):
+    # отметка build_recommendations раньше хранилась строкой CatalogCounter
+    CatalogCounter = apps.get_model('catalog', 'CatalogCounter')
+    JobWatermark = apps.get_model('catalog', 'JobWatermark')
+    for name, value in CatalogCounter.objects.filter(name__in=WATERMARKS).values_list('name', 'value'):
+        JobWatermark.objects.update_or_create(name=name, defaults={'value': value})
+    CatalogCounter.objects.filter(name__in=WATERMARKS).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0023_book_isbn_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='bookrecommendation',
+            name='built_through',
+        ),
+        migrations.RunPython(move_watermarks, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
 import uuid
 from django.contrib.auth.models import User
 from datetime import date
@@ -12,6 +14,41 @@ class Genre(models.Model):
         return self.name
     # данная функция позволит нам узнать наименование таблицы
 
+class IsbnKey(models.Func):
+    # ISBN без дефисов в верхнем регистре - так его сравнивает станция выдачи (catalog/api.py).
+    # '-' записан в шаблоне, а не параметром: с параметром SQLite не применяет индекс по выражению
+    template = "REPLACE(UPPER(%(expressions)s), '-', '')"
+    output_field = models.CharField()
+
+
+class BookQuerySet(models.QuerySet):
+    # наличие экземпляров: коррелированные подзапросы по индексу book_id вместо JOIN + GROUP BY,
+    # поэтому аннотации совмещаются с поиском (extra), m2m-фильтрами и пагинацией,
+    # а считаются только для строк текущей страницы - все равно один SQL-запрос
+
+    def _copies(self, **filters):
+        copies = BookInstance.objects.filter(book=models.OuterRef('pk'), **filters).order_by()
+        return Coalesce(
+            models.Subquery(copies.values('book').annotate(n=models.Count('pk')).values('n')), 0,
+        )
+
+    def with_availability(self):
+        next_due = BookInstance.objects.filter(
+            book=models.OuterRef('pk'), status='o', due_back__isnull=False,
+        ).order_by('due_back').values('due_back')[:1]
+        return self.annotate(
+            copies_total=self._copies(),
+            copies_available=self._copies(status='a'),
+            copies_on_loan=self._copies(status='o'),
+            copies_reserved=self._copies(status='r'),
+            next_due_back=models.Subquery(next_due),
+        )
+
+    def in_stock(self):
+        # по денормализованному счетчику, без подзапроса к экземплярам
+        return self.filter(available_copies__gt=0)
+
+
 class Book(models.Model):
     title = models.CharField(max_length=200)
     # объявление столбца таблицы с ограничем в 200 символов, charfield существует для обработки небольших текстовых данных
@@ -32,6 +69,17 @@ class Book(models.Model):
 
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
 
+    cover = models.ImageField(upload_to='covers/', blank=True, help_text='Обложка книги')
+
+    cover_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # уменьшенные копии обложки в разных форматах, заполняются catalog/covers.py
+
+    available_copies = models.PositiveIntegerField(default=0, editable=False)
+    # денормализованное число экземпляров со статусом 'a': поддерживается сигналами
+    # и catalog/circulation.py, пересчитывается командой rebuild_counters
+
+    objects = BookQuerySet.as_manager()
+
     def __str__(self):
         return self.title
     
@@ -42,7 +90,31 @@ class Book(models.Model):
         return ', '.join([genre.name for genre in self.genre.all()[:3]])
     
     dislpay_genre.short_description = 'Genre'
+
+    class Meta:
+        ordering = ['title']
+        indexes = [
+            # сортировка списка книг и курсорная пагинация по (title, id)
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+            # станция выдачи: поиск экземпляров по отсканированному ISBN (без дефисов, см. IsbnKey)
+            models.Index(IsbnKey('isbn'), name='book_isbn_key_idx'),
+        ]
     
+class BookInstanceQuerySet(models.QuerySet):
+    # просрочка считается в базе, а не свойством is_overdue для каждой строки
+
+    def overdue(self, today=None):
+        return self.filter(status='o', due_back__lt=today or date.today())
+
+    def with_overdue(self, today=None):
+        # у отложенного экземпляра ('r') due_back - срок получения, а не возврата
+        return self.annotate(db_is_overdue=models.Case(
+            models.When(~models.Q(status='r'), due_back__lt=today or date.today(), then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+
 class BookInstance(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text='Присвоение уникального значения в виде числа')
     # primarykey позволяет решать, уникально ли данное значение или нет
@@ -72,9 +144,14 @@ class BookInstance(models.Model):
 
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    objects = BookInstanceQuerySet.as_manager()
+
     @property
     def is_overdue(self):
-        if self.due_back and date.today() > self.due_back:
+        # значение из with_overdue(), если queryset его посчитал
+        if 'db_is_overdue' in self.__dict__:
+            return self.db_is_overdue
+        if self.status != 'r' and self.due_back and date.today() > self.due_back:
             return True
         return False
 
@@ -85,6 +162,19 @@ class BookInstance(models.Model):
         permissions = (("can_mark_returned", "Set book as returned"),
                        ('can_edit', 'редактирование'),
                        )
+        indexes = [
+            # "Мои книги": borrower = ? AND status IN ('o', 'r') ORDER BY due_back
+            models.Index(fields=['borrower', 'status', 'due_back'], name='bookinst_borrower_status_idx'),
+            # счетчик и поиск доступных экземпляров: status = 'a'
+            models.Index(fields=['book'], condition=models.Q(status='a'), name='bookinst_available_idx'),
+            # консоль библиотекаря: выданные экземпляры (book и borrower не NULL)
+            models.Index(fields=['book', 'borrower'], condition=models.Q(book__isnull=False, borrower__isnull=False),
+                         name='bookinst_loaned_idx'),
+            # консоль библиотекаря: выданные экземпляры по сроку возврата, в обе стороны,
+            # и фильтр "просрочено" (due_back < сегодня)
+            models.Index(fields=['due_back', 'id'], condition=models.Q(book__isnull=False, borrower__isnull=False),
+                         name='bookinst_console_due_idx'),
+        ]
 
     def __str__(self):
         book_title = self.book.title if self.book else "—"
@@ -105,6 +195,9 @@ class Author(models.Model):
     
     class Meta:
         ordering = ['last_name']
+        indexes = [
+            models.Index(fields=['last_name', 'id'], name='author_last_name_idx'),
+        ]
     
 class Language(models.Model):
     lang = models.CharField(max_length=50, unique=True, help_text='Введите язык книги')
@@ -114,8 +207,140 @@ class Language(models.Model):
     
     def __str__(self):
         return self.lang
-    
-    
 
-    
-    
+
+class CatalogCounter(models.Model):
+    # материализованные счетчики для главной страницы, одна строка на счетчик,
+    # значения поддерживаются сигналами (см. catalog/signals.py) и пересчитываются
+    # командой rebuild_counters
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class JobWatermark(models.Model):
+    # докуда фоновая задача уже обработала данные (например, id последнего учтенного события
+    # журнала для build_recommendations). Отдельно от CatalogCounter: те выводятся на главной
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class CirculationEvent(models.Model):
+    # журнал переходов статуса экземпляров, строки только добавляются (catalog/circulation.py).
+    # Ссылки без ограничений в базе: событие переживает удаление экземпляра, книги или читателя
+    ACTIONS = (
+        ('checkout', 'Выдача'),
+        ('return', 'Возврат'),
+        ('renew', 'Продление'),
+        ('maintenance', 'На обслуживание'),
+        ('hold', 'Отложен по очереди'),
+        ('release', 'Снят с отложенных'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    created = models.DateTimeField(default=timezone.now)
+    action = models.CharField(max_length=12, choices=ACTIONS)
+    copy = models.ForeignKey(BookInstance, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    borrower = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    status_from = models.CharField(max_length=1)
+    status_to = models.CharField(max_length=1)
+    # срок возврата после события; для возврата - срок, который был у выдачи
+    due_back = models.DateField(null=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # rollup_circulation пересчитывает сводки с последнего дня: created >= ?
+            models.Index(fields=['created'], name='circevent_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.created:%Y-%m-%d %H:%M} {self.action} {self.copy_id}'
+
+
+class DailyBookLoans(models.Model):
+    # сводки выдач по дням, строятся командой rollup_circulation из CirculationEvent
+    day = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    loans = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'book'], name='daily_book_loans_unique')]
+
+
+class DailyGenreLoans(models.Model):
+    day = models.DateField()
+    genre = models.ForeignKey(Genre, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    loans = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'genre'], name='daily_genre_loans_unique')]
+
+
+class DailyAuthorLoans(models.Model):
+    day = models.DateField()
+    author = models.ForeignKey('Author', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    loans = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'author'], name='daily_author_loans_unique')]
+
+
+class Hold(models.Model):
+    # очередь ожидания книги (catalog/holds.py): первым идет больший priority, при равном - раньше вставший.
+    # Следующий в очереди и позиция читателя берутся из частичного индекса по ожидающим
+    STATUS = (
+        ('w', 'Ожидает'),
+        ('f', 'Экземпляр отложен'),
+        ('e', 'Срок получения истек'),
+        ('c', 'Отменена'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds')
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=1, choices=STATUS, default='w')
+    created = models.DateTimeField(default=timezone.now)
+    # экземпляр, отложенный читателю при выполнении
+    copy = models.ForeignKey(BookInstance, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    fulfilled = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-priority', 'id']
+        indexes = [
+            models.Index(fields=['book', '-priority', 'id'], condition=models.Q(status='w'), name='hold_queue_idx'),
+            models.Index(fields=['borrower', 'status'], name='hold_borrower_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'borrower'], condition=models.Q(status='w'),
+                                    name='hold_one_waiting_per_book'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id}: {self.borrower_id} ({self.get_status_display()})'
+
+
+class BookRecommendation(models.Model):
+    # "читатели также брали": top-k соседей книги по совместным выдачам (catalog/recommendations.py).
+    # Карточка книги читает их одним запросом по (book, rank)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    # читателей, бравших обе книги
+    readers = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='bookrec_book_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} -> {self.recommended_id} (#{self.rank})'
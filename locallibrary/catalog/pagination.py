@@ -0,0 +1,240 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections
+from django.db.models import AutoField, F, Max, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class CursorPage:
+    # страница курсорной пагинации: вместо номера страницы - непрозрачный токен after,
+    # общее количество (total) считается только по запросу ?count=1
+
+    def __init__(self, object_list, has_next, next_cursor, is_first, total=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginationMixin:
+    # keyset-пагинация для ListView: WHERE (ключ, pk) > (последний ключ, последний pk)
+    # вместо OFFSET и без COUNT(*). Включается параметром ?after= или настройкой
+    # CATALOG_CURSOR_PAGINATION; запрос с ?page= по-прежнему обслуживает обычный пагинатор
+    cursor_key = None
+    cursor_param = 'after'
+    cursor_descending = False
+    # параметр поиска: результаты упорядочены бэкендом поиска по релевантности
+    # (search_rank, затем его ключи и pk) - курсор строится по тем же полям, см. search_cursor_keys
+    search_param = None
+    search_keys = None
+
+    def use_cursor_pagination(self):
+        if 'page' in self.request.GET:
+            return False
+        return self.cursor_param in self.request.GET or getattr(settings, 'CATALOG_CURSOR_PAGINATION', False)
+
+    def search_cursor_keys(self, queryset):
+        # поля порядка результатов поиска без pk; None - не поиск, обычный курсор по cursor_key
+        if not self.search_param or not self.request.GET.get(self.search_param, '').strip():
+            return None
+        return [name for name in queryset.query.order_by if name != 'pk'] or None
+
+    def _key_field(self, queryset):
+        return queryset.model._meta.get_field(self.cursor_key)
+
+    def cursor_values(self, obj):
+        if self.search_keys:
+            return *(getattr(obj, name) for name in self.search_keys), obj.pk
+        return getattr(obj, self.cursor_key), obj.pk
+
+    def encode_cursor(self, obj):
+        data = json.dumps(list(self.cursor_values(obj)), cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def _to_python(self, queryset, name, value):
+        # search_rank - аннотация, а не поле модели: число из JSON берется как есть
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise ValueError(name)
+            return value
+        return field.to_python(value)
+
+    def decode_cursor(self, token, queryset):
+        names = self.search_keys or [self.cursor_key]
+        try:
+            data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            *keys, pk = json.loads(data)
+            if len(keys) != len(names):
+                raise ValueError(token)
+            keys = [self._to_python(queryset, name, key) for name, key in zip(names, keys)]
+            pk = queryset.model._meta.pk.to_python(pk)
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            raise Http404('Неверный курсор')
+        return (keys if self.search_keys else keys[0]), pk
+
+    def cursor_order(self, queryset):
+        # NULL-значения ключа идут первыми (при обратном порядке - последними), это учитывается в cursor_filter
+        if self.cursor_descending:
+            return queryset.order_by(F(self.cursor_key).desc(nulls_last=True), '-pk')
+        return queryset.order_by(F(self.cursor_key).asc(nulls_first=True), 'pk')
+
+    def cursor_filter(self, key, pk):
+        if self.cursor_descending:
+            if key is None:
+                return Q(**{f'{self.cursor_key}__isnull': True, 'pk__lt': pk})
+            return (Q(**{f'{self.cursor_key}__lt': key}) | Q(**{self.cursor_key: key, 'pk__lt': pk})
+                    | Q(**{f'{self.cursor_key}__isnull': True}))
+        if key is None:
+            return Q(**{f'{self.cursor_key}__isnull': True, 'pk__gt': pk}) | Q(**{f'{self.cursor_key}__isnull': False})
+        return Q(**{f'{self.cursor_key}__gt': key}) | Q(**{self.cursor_key: key, 'pk__gt': pk})
+
+    def search_cursor_filter(self, keys, pk):
+        # (k1, k2, ..., pk) > (v1, v2, ..., последний pk) по возрастанию, как упорядочил бэкенд поиска;
+        # значения ключей поиска не бывают NULL
+        names, values = [*self.search_keys, 'pk'], [*keys, pk]
+        condition = Q()
+        for i, name in enumerate(names):
+            condition |= Q(**dict(zip(names[:i], values[:i])), **{f'{name}__gt': values[i]})
+        return condition
+
+    def _cursor_queryset(self, queryset, page_size):
+        token = self.request.GET.get(self.cursor_param)
+        self.search_keys = self.search_cursor_keys(queryset)
+        if self.search_keys:
+            # порядок результатов поиска уже задан бэкендом
+            if token:
+                queryset = queryset.filter(self.search_cursor_filter(*self.decode_cursor(token, queryset)))
+        else:
+            queryset = self.cursor_order(queryset)
+            if token:
+                queryset = queryset.filter(self.cursor_filter(*self.decode_cursor(token, queryset)))
+        # лишняя строка показывает, есть ли следующая страница
+        return token, queryset[:page_size + 1]
+
+    def _cursor_result(self, object_list, page_size, token, total):
+        has_next = len(object_list) > page_size
+        object_list = object_list[:page_size]
+        next_cursor = self.encode_cursor(object_list[-1]) if has_next else None
+        page = CursorPage(object_list, has_next, next_cursor, is_first=not token, total=total)
+        return None, page, object_list, has_next or bool(token)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        total = queryset.count() if self.request.GET.get('count') else None
+        token, rows = self._cursor_queryset(queryset, page_size)
+        return self._cursor_result(list(rows), page_size, token, total)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        # асинхронный вариант для catalog/async_views.py, результат тот же, что у paginate_queryset
+        if self.use_cursor_pagination():
+            total = await queryset.acount() if self.request.GET.get('count') else None
+            token, rows = self._cursor_queryset(queryset, page_size)
+            return self._cursor_result([obj async for obj in rows], page_size, token, total)
+
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        # count у Paginator - cached_property, заранее подставляем значение из acount()
+        paginator.count = await queryset.acount()
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        try:
+            page_number = paginator.num_pages if page == 'last' else int(page)
+            page = paginator.page(page_number)
+        except (ValueError, InvalidPage):
+            raise Http404('Неверная страница')
+        page.object_list = [obj async for obj in page.object_list]
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if isinstance(page, CursorPage):
+            context['cursor_pagination'] = True
+            params = self.request.GET.copy()
+            params.pop(self.cursor_param, None)
+            context['first_page_query'] = params.urlencode()
+            if page.has_next:
+                params[self.cursor_param] = page.next_cursor
+                context['next_page_query'] = params.urlencode()
+        elif page is not None:
+            # ссылки обычной пагинации сохраняют все параметры запроса (q, available, фильтры консоли)
+            params = self.request.GET.copy()
+            if page.has_previous():
+                params[self.page_kwarg] = page.previous_page_number()
+                context['previous_page_query'] = params.urlencode()
+            if page.has_next():
+                params[self.page_kwarg] = page.next_page_number()
+                context['next_page_query'] = params.urlencode()
+        return context
+
+
+def estimated_count(model, using='default'):
+    # приблизительное число строк таблицы без COUNT(*): статистика СУБД (pg_class.reltuples,
+    # information_schema, sqlite_stat1 после ANALYZE), для целочисленного pk - MAX(pk), на SQLite - MAX(rowid).
+    # None - оценки нет
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table]),
+        'mysql': ('SELECT table_rows FROM information_schema.tables '
+                  'WHERE table_schema = DATABASE() AND table_name = %s', [table]),
+        # у sqlite_stat1 первое число stat - строк в индексе (idx IS NULL - в таблице без индексов);
+        # частичный индекс (CREATE INDEX ... WHERE) покрывает только часть строк - его пропускаем
+        'sqlite': ('SELECT s.stat FROM sqlite_stat1 s LEFT JOIN sqlite_master m ON m.type = %s AND m.name = s.idx '
+                   "WHERE s.tbl = %s AND (m.sql IS NULL OR instr(upper(m.sql), ' WHERE ') = 0) LIMIT 1",
+                   ['index', table]),
+    }
+    estimate = None
+    if connection.vendor in queries:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(*queries[connection.vendor])
+                row = cursor.fetchone()
+        except DatabaseError:
+            # sqlite_stat1 появляется только после ANALYZE
+            row = None
+        if row and row[0] is not None:
+            estimate = int(str(row[0]).split()[0])
+    if (estimate is None or estimate < 0) and isinstance(model._meta.pk, AutoField):
+        estimate = model._default_manager.using(using).order_by().aggregate(n=Max('pk'))['n'] or 0
+    elif (estimate is None or estimate < 0) and connection.vendor == 'sqlite':
+        # у нецелочисленного pk (UUID у BookInstance) на SQLite оценкой служит скрытый rowid:
+        # MAX(rowid) читается из конца B-дерева таблицы, как MAX(pk) у AutoField
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+            estimate = cursor.fetchone()[0] or 0
+    return None if estimate is None or estimate < 0 else estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    # для админки больших таблиц: без фильтров и поиска число строк берется из оценки
+    # estimated_count(), точный COUNT(*) - только для небольших таблиц и отфильтрованных списков
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is not None and not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_limit:
+                return estimate
+        return super().count
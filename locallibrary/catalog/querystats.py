@@ -0,0 +1,209 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from .benchmarks import latency_summary
+
+# Статистика SQL по представлениям. QueryStatsMiddleware для доли запросов
+# (CATALOG_QUERY_STATS_SAMPLE_RATE) собирает SQL через connection.execute_wrappers - работает и при
+# DEBUG=False - и пишет одну JSON-строку на запрос в логгер catalog.querystats
+# (RotatingFileHandler в settings.LOGGING). Медленные запросы (CATALOG_SLOW_REQUEST_MS)
+# пишутся всегда, даже без выборки, но тогда без данных о SQL.
+# Отчет по логу: команда query_report и страница для персонала query_stats.
+
+logger = logging.getLogger('catalog.querystats')
+
+# столько одинаковых запросов за один HTTP-запрос считается признаком N+1
+REPEAT_THRESHOLD = 3
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+_SPACES = re.compile(r'\s+')
+
+# запись SQL текущего HTTP-запроса. Под ASGI ORM всех запросов выполняется в одном потоке
+# (sync_to_async(thread_sensitive=True)) на общем соединении, поэтому обертка на соединении одна -
+# _dispatch, а запрос находит свой QueryRecorder по контексту: sync_to_async переносит его в поток
+_recorder = contextvars.ContextVar('catalog_query_recorder', default=None)
+
+
+def sql_signature(sql):
+    # параметры и так передаются отдельно; сворачиваем IN (%s, %s, ...) разной длины
+    return _SPACES.sub(' ', _IN_LIST.sub('(%s, ...)', sql)).strip()
+
+
+class QueryRecorder:
+    # обертка для connection.execute_wrapper: число и время запросов, повторы сигнатур
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.signatures[sql_signature(sql)] += 1
+
+    def repeated(self, limit=5):
+        return [{'sql': sql, 'count': count} for sql, count in self.signatures.most_common(limit)
+                if count >= REPEAT_THRESHOLD]
+
+
+class QueryStatsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = self.start(request)
+        if recorder:
+            install_dispatch()
+        token = _recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.finish(request, response, recorder)
+        return response
+
+    async def __acall__(self, request):
+        # ORM из async-кода работает в потоке sync_to_async(thread_sensitive=True) -
+        # _dispatch ставим на соединение этого потока
+        recorder = self.start(request)
+        if recorder:
+            await sync_to_async(install_dispatch)()
+        token = _recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.finish(request, response, recorder)
+        return response
+
+    def start(self, request):
+        request._query_stats = {'started': time.perf_counter()}
+        rate = getattr(settings, 'CATALOG_QUERY_STATS_SAMPLE_RATE', 0)
+        return QueryRecorder() if rate and random.random() < rate else None
+
+    def finish(self, request, response, recorder):
+        stats = request._query_stats
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        slow_ms = getattr(settings, 'CATALOG_SLOW_REQUEST_MS', None)
+        if not recorder and not (slow_ms and total_ms >= slow_ms):
+            return
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'ts': round(time.time(), 3),
+            'url_name': (match.view_name if match else None) or '<unresolved>',
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'render_ms': stats.get('render_ms'),
+            'sampled': recorder is not None,
+        }
+        if recorder:
+            record.update(queries=recorder.count, db_ms=round(recorder.seconds * 1000, 2),
+                          repeated=recorder.repeated())
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+    def process_template_response(self, request, response):
+        # TemplateResponse рендерится после выхода из представления - засекаем рендер отдельно
+        stats = getattr(request, '_query_stats', None)
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats['render_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+def _dispatch(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_dispatch():
+    # один раз на соединение потока; без выбранного запроса _dispatch просто выполняет SQL
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+def log_files(path=None):
+    # RotatingFileHandler: query_stats.log.1 - предыдущий файл, .2 - еще старше и т. д.
+    path = str(path or settings.CATALOG_QUERY_STATS_LOG)
+    backups = []
+    while os.path.exists(f'{path}.{len(backups) + 1}'):
+        backups.append(f'{path}.{len(backups) + 1}')
+    return [*reversed(backups), *([path] if os.path.exists(path) else [])]
+
+
+def read_records(path=None):
+    for name in log_files(path):
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def aggregate(records, top=5):
+    views = {}
+    for record in records:
+        view = views.setdefault(record['url_name'], {
+            'requests': 0, 'sampled': 0, 'errors': 0, 'total': [], 'render': [], 'queries': [], 'db': [],
+            'repeated': Counter(),
+        })
+        view['requests'] += 1
+        view['errors'] += record['status'] >= 500
+        view['total'].append(record['total_ms'])
+        if record.get('render_ms') is not None:
+            view['render'].append(record['render_ms'])
+        if record.get('sampled'):
+            view['sampled'] += 1
+            view['queries'].append(record['queries'])
+            view['db'].append(record['db_ms'])
+            for item in record.get('repeated', []):
+                view['repeated'][item['sql']] += 1
+
+    report = []
+    for name, view in views.items():
+        report.append({
+            'url_name': name,
+            'requests': view['requests'],
+            'sampled': view['sampled'],
+            'errors': view['errors'],
+            **latency_summary(view['total']),
+            'render_ms': _mean(view['render']),
+            'queries': _mean(view['queries']),
+            'max_queries': max(view['queries'], default=None),
+            'db_ms': _mean(view['db']),
+            # сигнатура -> в скольких выборочных запросах она повторялась REPEAT_THRESHOLD+ раз
+            'repeated': [{'sql': sql, 'requests': count} for sql, count in view['repeated'].most_common(top)],
+        })
+    return sorted(report, key=lambda row: row['p95_ms'], reverse=True)
+
+
+def _mean(values):
+    return round(sum(values) / len(values), 2) if values else None
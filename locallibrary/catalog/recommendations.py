@@ -0,0 +1,124 @@
+import heapq
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Max
+
+from . import cache
+from .models import Book, BookInstance, BookRecommendation, CirculationEvent, JobWatermark
+
+# "Читатели также брали". История читателя - книги из событий выдачи CirculationEvent и текущие
+# выдачи BookInstance.borrower (выдачи до появления журнала есть только там). Для каждой пары книг
+# считается число читателей, бравших обе (разреженная матрица совместных выдач: словарь Counter
+# по книге, хранятся только ненулевые пары), и top-k соседей пишется в BookRecommendation.
+# Инкрементальное обновление пересчитывает только книги читателей с новыми выдачами.
+
+TOP_K = 10
+# истории длиннее - служебные учетные записи (библиотекари, бенчмарки), а не читатели:
+# они дали бы квадратичное число пар и связали бы все книги со всеми
+MAX_HISTORY = 200
+CHUNK_SIZE = 5000
+# последнее учтенное событие журнала - строка JobWatermark, а не поле строк рекомендаций: если пересчет
+# не дал ни одной строки (у всех читателей по одной книге), отметка все равно продвигается
+WATERMARK = 'recommendations_built_through'
+
+
+def _chunks(ids, size=500):
+    # списки id для IN (...) пачками: у SQLite ограничено число параметров запроса
+    ids = list(ids)
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+
+def _loans():
+    # журнал ссылается на книги без ограничения в базе - удаленные книги отбрасываем
+    events = CirculationEvent.objects.filter(action='checkout', borrower__isnull=False,
+                                             book_id__in=Book.objects.values('pk'))
+    loans = BookInstance.objects.filter(book__isnull=False, borrower__isnull=False)
+    return events.order_by(), loans.order_by()
+
+
+def histories(borrowers=None):
+    # {borrower_id: {book_id, ...}}; borrowers=None - все читатели
+    if borrowers is None:
+        querysets = _loans()
+    else:
+        querysets = [queryset.filter(borrower_id__in=chunk) for chunk in _chunks(borrowers) for queryset in _loans()]
+    result = defaultdict(set)
+    for queryset in querysets:
+        rows = queryset.values_list('borrower_id', 'book_id').distinct().iterator(chunk_size=CHUNK_SIZE)
+        for borrower_id, book_id in rows:
+            result[borrower_id].add(book_id)
+    return result
+
+
+def cooccurrence(books_by_borrower, books=None):
+    # {book_id: Counter({other_book_id: readers})} для книг из books (None - для всех)
+    matrix = defaultdict(Counter)
+    for history in books_by_borrower.values():
+        if len(history) < 2 or len(history) > MAX_HISTORY:
+            continue
+        for book_id in history if books is None else history & books:
+            # вся история одним update() на C-уровне; сама книга вычитается обратно
+            row = matrix[book_id]
+            row.update(history)
+            row[book_id] -= 1
+    return matrix
+
+
+def top_neighbours(row, top_k):
+    # больше общих читателей - выше; при равенстве - меньший id, чтобы порядок был стабильным
+    return heapq.nsmallest(top_k, ((-readers, book_id) for book_id, readers in row.items() if readers > 0))
+
+
+def readers_of(books):
+    # читатели, бравшие хотя бы одну из книг
+    readers = set()
+    for chunk in _chunks(books):
+        for queryset in _loans():
+            readers.update(queryset.filter(book_id__in=chunk).values_list('borrower_id', flat=True).distinct())
+    return readers
+
+
+def build_recommendations(full=False, top_k=TOP_K):
+    # возвращает {'books': пересчитано книг, 'rows': записано строк}
+    last_event = CirculationEvent.objects.aggregate(id=Max('id'))['id'] or 0
+    watermark = None if full else JobWatermark.objects.filter(name=WATERMARK).values_list('value', flat=True).first()
+
+    if watermark is None:
+        books = None
+        matrix = cooccurrence(histories())
+    else:
+        new_readers = set(CirculationEvent.objects.filter(id__gt=watermark, action='checkout', borrower__isnull=False)
+                          .order_by().values_list('borrower_id', flat=True).distinct())
+        if not new_readers:
+            JobWatermark.objects.filter(name=WATERMARK).update(value=last_event)
+            return {'books': 0, 'rows': 0}
+        # у книг новых выдач меняются соседи; чтобы пересчитать их строки целиком,
+        # нужны истории всех, кто эти книги брал
+        books = set().union(*histories(new_readers).values())
+        matrix = cooccurrence(histories(readers_of(books)), books)
+
+    rows = [
+        BookRecommendation(book_id=book_id, recommended_id=other, rank=rank, readers=-score)
+        for book_id, row in matrix.items()
+        for rank, (score, other) in enumerate(top_neighbours(row, top_k), 1)
+    ]
+    with transaction.atomic():
+        if books is None:
+            # страницы книг, у которых рекомендации были, тоже сбрасываются: их строк может не стать
+            changed = set(matrix) | set(BookRecommendation.objects.order_by().values_list('book_id', flat=True).distinct())
+            BookRecommendation.objects.all().delete()
+        else:
+            changed = books
+            for chunk in _chunks(books):
+                BookRecommendation.objects.filter(book_id__in=chunk).delete()
+        BookRecommendation.objects.bulk_create(rows, batch_size=1000)
+        JobWatermark.objects.update_or_create(name=WATERMARK, defaults={'value': last_event})
+    # сбрасываются только страницы пересчитанных книг
+    cache.bump(*(f'book:{book_id}' for book_id in changed))
+    return {'books': len(matrix) if books is None else len(books), 'rows': len(rows)}
+
+
+def recommendations_for(book_id):
+    # один запрос по уникальному индексу (book, rank)
+    return BookRecommendation.objects.filter(book_id=book_id).select_related('recommended').order_by('rank')
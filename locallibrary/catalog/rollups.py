@@ -0,0 +1,59 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Book, CirculationEvent, DailyAuthorLoans, DailyBookLoans, DailyGenreLoans
+
+# Сводки выдач по дням из журнала CirculationEvent. Пересчет инкрементальный: с последнего
+# уже посчитанного дня (он мог быть неполным) или с явной даты; строки сводок с этого дня
+# удаляются и строятся заново одним GROUP BY на таблицу. Аналитика читает только сводки.
+
+# сводка -> поле, по которому группируются выдачи
+ROLLUPS = (
+    (DailyBookLoans, 'book', 'book_id'),
+    (DailyGenreLoans, 'genre', 'book__genre'),
+    (DailyAuthorLoans, 'author', 'book__author'),
+)
+
+
+def rollup_start(full=False):
+    # день, с которого нужен пересчет: последний посчитанный или первый день журнала
+    last = None if full else DailyBookLoans.objects.aggregate(day=Max('day'))['day']
+    if last:
+        return last
+    first = CirculationEvent.objects.order_by('id').values_list('created', flat=True).first()
+    return timezone.localdate(first) if first else None
+
+
+def rollup_circulation(since=None, full=False):
+    # возвращает {имя сводки: строк записано} или None, если журнал пуст
+    since = since or rollup_start(full)
+    if since is None:
+        return None
+    start = timezone.make_aware(datetime.datetime.combine(since, datetime.time.min))
+    events = CirculationEvent.objects.filter(action='checkout', created__gte=start).order_by()
+    written = {}
+    with transaction.atomic():
+        for model, field, source in ROLLUPS:
+            model.objects.filter(day__gte=since).delete()
+            rows = (events.filter(**{f'{source}__isnull': False})
+                    .values(day=TruncDate('created'), key=F(source)).annotate(loans=Count('id')))
+            created = model.objects.bulk_create(
+                [model(day=row['day'], loans=row['loans'], **{f'{field}_id': row['key']}) for row in rows],
+                batch_size=1000,
+            )
+            written[model._meta.model_name] = len(created)
+    return written
+
+
+def most_borrowed_books(since, until=None, limit=10):
+    # [(книга, выдач)] за период по сводке DailyBookLoans, без чтения журнала
+    loans = DailyBookLoans.objects.filter(day__gte=since)
+    if until:
+        loans = loans.filter(day__lte=until)
+    top = list(loans.values('book_id').annotate(total=Sum('loans')).order_by('-total', 'book_id')[:limit])
+    books = Book.objects.only('title').in_bulk([row['book_id'] for row in top])
+    return [(books[row['book_id']], row['total']) for row in top if row['book_id'] in books]
@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Author, Book
+
+# поиск по каталогу: бэкенд выбирается настройкой CATALOG_SEARCH_BACKEND,
+# по умолчанию FTS5 на SQLite и обычный LIKE на остальных базах
+
+
+def _terms(q):
+    # слова запроса без "пустых" токенов из одной пунктуации
+    return [part for part in q.split() if any(ch.isalnum() for ch in part)]
+
+
+class LikeSearchBackend:
+    # запасной вариант для баз без FTS5: icontains по каждому слову запроса,
+    # совпадения по названию/фамилии выше остальных
+
+    def search_books(self, queryset, q):
+        terms = _terms(q)
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) |
+                Q(summary__icontains=term) |
+                Q(isbn__icontains=term) |
+                Q(author__last_name__icontains=term) |
+                Q(author__first_name__icontains=term)
+            )
+        return queryset.annotate(search_rank=Case(
+            When(title__icontains=q, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )).order_by('search_rank', 'title', 'pk')
+
+    def search_authors(self, queryset, q):
+        for term in _terms(q):
+            queryset = queryset.filter(Q(first_name__icontains=term) | Q(last_name__icontains=term))
+        return queryset.annotate(search_rank=Case(
+            When(last_name__icontains=q, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )).order_by('search_rank', 'last_name', 'pk')
+
+    def index_book(self, book):
+        pass
+
+    def remove_book(self, pk):
+        pass
+
+    def index_author(self, author):
+        pass
+
+    def index_books(self, books):
+        pass
+
+    def remove_author(self, pk):
+        pass
+
+    def rebuild(self, chunk_size=2000):
+        pass
+
+
+class FTS5SearchBackend(LikeSearchBackend):
+    # таблицы catalog_book_fts и catalog_author_fts создаются миграцией 0013,
+    # rowid в них совпадает с pk книги/автора
+    book_table = 'catalog_book_fts'
+    author_table = 'catalog_author_fts'
+    # веса колонок для bm25: title, summary, isbn, author
+    book_weights = (10.0, 1.0, 5.0, 5.0)
+
+    @staticmethod
+    def match_expression(q):
+        # каждое слово - отдельная фраза с префиксным поиском, слова объединяются через AND
+        return ' '.join('"%s"*' % term.replace('"', '""') for term in _terms(q))
+
+    def _search(self, queryset, q, table, rank):
+        match = self.match_expression(q)
+        if not match:
+            return queryset
+        model_table = queryset.model._meta.db_table
+        # search_rank - аннотация, а не extra(select=...): по ней фильтрует курсорная пагинация
+        return queryset.extra(
+            tables=[table],
+            where=[f'{table}.rowid = {model_table}.id', f'{table} MATCH %s'],
+            params=[match],
+        ).annotate(search_rank=RawSQL(rank, [], output_field=FloatField())).order_by('search_rank', 'pk')
+
+    def search_books(self, queryset, q):
+        weights = ', '.join(str(w) for w in self.book_weights)
+        return self._search(queryset, q, self.book_table, f'bm25({self.book_table}, {weights})')
+
+    def search_authors(self, queryset, q):
+        return self._search(queryset, q, self.author_table, f'bm25({self.author_table})')
+
+    def _book_rows(self, books):
+        for book in books:
+            author = book.author
+            author_name = f'{author.first_name} {author.last_name}' if author else ''
+            yield (book.pk, book.title, book.summary, book.isbn, author_name)
+
+    def _write_books(self, cursor, books):
+        rows = list(self._book_rows(books))
+        cursor.executemany(f'DELETE FROM {self.book_table} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {self.book_table} (rowid, title, summary, isbn, author) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+    def index_book(self, book):
+        with connection.cursor() as cursor:
+            self._write_books(cursor, [book])
+
+    def remove_book(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.book_table} WHERE rowid = %s', [pk])
+
+    def index_author(self, author):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.author_table} WHERE rowid = %s', [author.pk])
+            cursor.execute(
+                f'INSERT INTO {self.author_table} (rowid, first_name, last_name) VALUES (%s, %s, %s)',
+                [author.pk, author.first_name, author.last_name],
+            )
+
+    def index_books(self, books):
+        with connection.cursor() as cursor:
+            self._write_books(cursor, books.select_related('author'))
+
+    def remove_author(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.author_table} WHERE rowid = %s', [pk])
+
+    def rebuild(self, chunk_size=2000):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.book_table}')
+            cursor.execute(f'DELETE FROM {self.author_table}')
+            books = Book.objects.select_related('author').only(
+                'title', 'summary', 'isbn', 'author__first_name', 'author__last_name',
+            )
+            chunk = []
+            for book in books.iterator(chunk_size=chunk_size):
+                chunk.append(book)
+                if len(chunk) >= chunk_size:
+                    self._write_books(cursor, chunk)
+                    chunk = []
+            self._write_books(cursor, chunk)
+            cursor.executemany(
+                f'INSERT INTO {self.author_table} (rowid, first_name, last_name) VALUES (%s, %s, %s)',
+                Author.objects.values_list('pk', 'first_name', 'last_name').iterator(chunk_size=chunk_size),
+            )
+
+
+def get_search_backend():
+    path = getattr(settings, 'CATALOG_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return FTS5SearchBackend()
+    return LikeSearchBackend()
@@ -0,0 +1,252 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache, counters, covers, typeahead
+from .search import get_search_backend
+from .models import Author, Book, BookInstance, Genre, Language
+
+# поля, исходное значение которых запоминается при загрузке объекта, чтобы при
+# сохранении понять, как изменились счетчики, не делая лишний запрос в базу
+TRACKED_FIELDS = {
+    Book: 'title',
+    BookInstance: 'status',
+}
+
+
+@receiver(post_init, sender=Book)
+@receiver(post_init, sender=BookInstance)
+def remember_tracked_field(sender, instance, **kwargs):
+    # читаем через __dict__, чтобы отложенное поле (.only()/.defer()) не вызвало запрос
+    instance._tracked_initial = instance.__dict__.get(TRACKED_FIELDS[sender])
+
+
+@receiver(pre_save, sender=Book)
+@receiver(pre_save, sender=BookInstance)
+@receiver(pre_delete, sender=Book)
+@receiver(pre_delete, sender=BookInstance)
+def resolve_tracked_field(sender, instance, **kwargs):
+    # поле было отложено при загрузке - читаем значение из базы до того, как save()/delete() его изменит
+    if instance._tracked_initial is None and not instance._state.adding:
+        field = TRACKED_FIELDS[sender]
+        instance._tracked_initial = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def _book_counts(title):
+    return 1 if title else 0
+
+
+def _available(status):
+    return 1 if status == 'a' else 0
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.increment('num_books')
+        counters.increment('num_tbooks', _book_counts(instance.title))
+    else:
+        before = instance._tracked_initial
+        counters.increment('num_tbooks', _book_counts(instance.title) - _book_counts(before))
+    instance._tracked_initial = instance.title
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    counters.increment('num_books', -1)
+    counters.increment('num_tbooks', -_book_counts(instance._tracked_initial))
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.increment('num_instance')
+        counters.increment('num_instance_available', _available(instance.status))
+    else:
+        before = instance._tracked_initial
+        counters.increment('num_instance_available', _available(instance.status) - _available(before))
+    _adjust_book_available(instance, created)
+    instance._tracked_initial = instance.status
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_deleted(sender, instance, **kwargs):
+    counters.increment('num_instance', -1)
+    counters.increment('num_instance_available', -_available(instance._tracked_initial))
+    counters.adjust_available_copies(instance._cache_parent_initial, -_available(instance._tracked_initial))
+
+
+def _adjust_book_available(instance, created):
+    # Book.available_copies: экземпляр мог сменить и статус, и книгу; исходную книгу
+    # запомнил remember_cache_parent (ее сбрасывает bookinstance_cache_invalidate ниже)
+    after = _available(instance.status)
+    if created:
+        counters.adjust_available_copies(instance.book_id, after)
+        return
+    before = _available(instance._tracked_initial)
+    if instance._cache_parent_initial == instance.book_id:
+        counters.adjust_available_copies(instance.book_id, after - before)
+    else:
+        counters.adjust_available_copies(instance._cache_parent_initial, -before)
+        counters.adjust_available_copies(instance.book_id, after)
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.increment('num_authors')
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    counters.increment('num_authors', -1)
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.increment('num_genre')
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    counters.increment('num_genre', -1)
+
+
+@receiver(post_save, sender=Book)
+def book_search_index(sender, instance, **kwargs):
+    get_search_backend().index_book(instance)
+
+
+@receiver(post_delete, sender=Book)
+def book_search_remove(sender, instance, **kwargs):
+    get_search_backend().remove_book(instance.pk)
+
+
+@receiver(post_save, sender=Author)
+def author_search_index(sender, instance, created, **kwargs):
+    backend = get_search_backend()
+    backend.index_author(instance)
+    if not created:
+        # имя автора входит в индекс книг
+        backend.index_books(Book.objects.filter(author=instance))
+
+
+@receiver(pre_delete, sender=Author)
+def author_search_remember_books(sender, instance, **kwargs):
+    # к post_delete у книг автора уже будет author=NULL, поэтому запоминаем их заранее
+    instance._search_book_ids = list(Book.objects.filter(author=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def author_search_remove(sender, instance, **kwargs):
+    backend = get_search_backend()
+    backend.remove_author(instance.pk)
+    backend.index_books(Book.objects.filter(pk__in=instance._search_book_ids))
+
+
+# инвалидация кэша страниц (catalog/cache.py): книга и экземпляр запоминают
+# исходного автора/книгу, чтобы при переносе сбросить и старую страницу
+CACHE_PARENT_FIELDS = {
+    Book: 'author_id',
+    BookInstance: 'book_id',
+}
+
+
+@receiver(post_init, sender=Book)
+@receiver(post_init, sender=BookInstance)
+def remember_cache_parent(sender, instance, **kwargs):
+    instance._cache_parent_initial = instance.__dict__.get(CACHE_PARENT_FIELDS[sender])
+
+
+@receiver(pre_save, sender=BookInstance)
+@receiver(pre_delete, sender=BookInstance)
+def resolve_cache_parent(sender, instance, **kwargs):
+    # как resolve_tracked_field: книга была отложена при загрузке - читаем исходную из базы
+    if instance._cache_parent_initial is None and not instance._state.adding:
+        instance._cache_parent_initial = sender.objects.filter(pk=instance.pk).values_list('book_id', flat=True).first()
+
+
+def _parent_scopes(sender, instance, prefix):
+    parents = {instance._cache_parent_initial, getattr(instance, CACHE_PARENT_FIELDS[sender])}
+    return [f'{prefix}:{pk}' for pk in parents if pk is not None]
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_cache_invalidate(sender, instance, **kwargs):
+    cache.bump_on_commit('books', f'book:{instance.pk}', *_parent_scopes(sender, instance, 'author'))
+    instance._cache_parent_initial = instance.author_id
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_cache_invalidate(sender, instance, action, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Book):
+        cache.bump_on_commit(f'book:{instance.pk}', f'author:{instance.author_id}')
+    else:
+        # жанр изменен со стороны Genre.book_set
+        cache.bump_on_commit('lookups')
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_cache_invalidate(sender, instance, **kwargs):
+    # 'copies' - наличие экземпляров в списке книг и на странице автора
+    cache.bump_on_commit('copies', *_parent_scopes(sender, instance, 'book'))
+    instance._cache_parent_initial = instance.book_id
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def author_cache_invalidate(sender, instance, **kwargs):
+    # имя автора выводится в списке книг и на страницах его книг;
+    # при удалении книги уже отвязаны, их pk запомнил author_search_remember_books
+    if kwargs.get('created'):
+        book_ids = []
+    elif hasattr(instance, '_search_book_ids'):
+        book_ids = instance._search_book_ids
+    else:
+        book_ids = Book.objects.filter(author=instance).values_list('pk', flat=True)
+    cache.bump_on_commit('authors', 'books', f'author:{instance.pk}', *(f'book:{pk}' for pk in book_ids))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def lookups_cache_invalidate(sender, instance, **kwargs):
+    cache.bump_on_commit('lookups')
+
+
+# подсказки при наборе (catalog/typeahead.py): индекс в памяти процесса меняется после коммита
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_typeahead(sender, instance, **kwargs):
+    typeahead.book_changed(instance, deleted='created' not in kwargs)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def author_typeahead(sender, instance, **kwargs):
+    typeahead.author_changed(instance, deleted='created' not in kwargs)
+
+
+# обложка: новые уменьшенные копии строятся, когда файл обложки сменился
+@receiver(post_init, sender=Book)
+def remember_cover(sender, instance, **kwargs):
+    if 'cover' in instance.__dict__:
+        # до первого обращения через дескриптор здесь лежит строка из базы
+        cover = instance.__dict__['cover']
+        instance._cover_initial = getattr(cover, 'name', cover) or None
+
+
+@receiver(post_save, sender=Book)
+def book_cover_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'cover' not in update_fields:
+        return
+    name = instance.cover.name or None
+    # поле было отложено (only/defer) - считаем, что обложку не меняли
+    if name != getattr(instance, '_cover_initial', name):
+        covers.schedule_processing(instance.pk)
+    instance._cover_initial = name
@@ -0,0 +1,25 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from catalog.covers import srcset
+
+register = template.Library()
+
+
+@register.inclusion_tag('catalog/cover_picture.html')
+def cover_picture(book, sizes='160px', css_class=''):
+    # <picture> с AVIF/WEBP/JPEG-копиями обложки; пока копии не готовы - исходный файл
+    variants = book.cover_variants or {}
+    sources = [
+        {'type': f'image/{fmt}', 'srcset': srcset(variants, fmt)}
+        for fmt in ('avif', 'webp') if variants.get(fmt)
+    ]
+    jpeg = variants.get('jpeg', {})
+    return {
+        'book': book,
+        'sources': sources,
+        'srcset': srcset(variants, 'jpeg'),
+        'src': default_storage.url(next(iter(jpeg.values()))) if jpeg else (book.cover.url if book.cover else ''),
+        'sizes': sizes,
+        'css_class': css_class,
+    }
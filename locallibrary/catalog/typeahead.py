@@ -0,0 +1,189 @@
+import logging
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, transaction
+
+from . import cache
+from .models import Author, Book
+
+# Подсказки при наборе названия книги или имени автора без обращения к базе. В памяти процесса
+# для книг и авторов - отсортированный массив ключей и параллельный массив pk: ключ - нормализованная
+# строка, начиная с каждого слова ("война и мир", "и мир", "мир"), поэтому совпадение по префиксу
+# любого слова - бинарный поиск и чтение подряд идущих ключей.
+# Индекс строится при старте процесса (warm() в wsgi.py/asgi.py) или при первом запросе,
+# сигналы Book/Author обновляют его после коммита. Каждое такое изменение в любом процессе
+# увеличивает поколение области 'typeahead' (catalog/cache.py), массовые операции - 'all':
+# если поколение сменилось не только локальными изменениями, индекс перестраивается при следующем запросе.
+# Поколения видны другим процессам только через общий кэш (Redis, Memcached); с LocMemCache
+# чужие изменения доходят до индекса через CATALOG_TYPEAHEAD_MAX_AGE секунд - столько живет индекс.
+
+SCOPES = ('typeahead',)
+logger = logging.getLogger(__name__)
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    # регистр и ё не важны при наборе, пунктуация отбрасывается
+    return ' '.join(_WORD.findall((text or '').casefold().replace('ё', 'е')))
+
+
+def word_suffixes(text):
+    words = normalize(text).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+class PrefixIndex:
+    # keys[i] - ключ, ids[i] - pk объекта; labels - подпись для ответа
+
+    def __init__(self):
+        self.keys = []
+        self.ids = array('q')
+        self.labels = {}
+        self.entries = {}
+
+    def add(self, pk, label, texts):
+        self.remove(pk)
+        keys = set()
+        for text in texts:
+            keys |= word_suffixes(text)
+        for key in keys:
+            pos = bisect_left(self.keys, key)
+            self.keys.insert(pos, key)
+            self.ids.insert(pos, pk)
+        self.labels[pk] = label
+        self.entries[pk] = keys
+
+    def remove(self, pk):
+        for key in self.entries.pop(pk, ()):
+            pos = bisect_left(self.keys, key)
+            while self.ids[pos] != pk:
+                pos += 1
+            del self.keys[pos]
+            del self.ids[pos]
+        self.labels.pop(pk, None)
+
+    def load(self, rows):
+        # начальное построение: одна сортировка вместо вставок по одному
+        pairs = []
+        for pk, label, texts in rows:
+            keys = set()
+            for text in texts:
+                keys |= word_suffixes(text)
+            pairs.extend((key, pk) for key in keys)
+            self.labels[pk] = label
+            self.entries[pk] = keys
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ids = array('q', (pk for _, pk in pairs))
+
+    def search(self, q, limit):
+        prefix = normalize(q)
+        if not prefix:
+            return []
+        found = []
+        pos = bisect_left(self.keys, prefix)
+        while pos < len(self.keys) and self.keys[pos].startswith(prefix) and len(found) < limit:
+            if self.ids[pos] not in found:
+                found.append(self.ids[pos])
+            pos += 1
+        return [(pk, self.labels[pk]) for pk in found]
+
+
+def book_row(book):
+    return book.pk, book.title, [book.title]
+
+
+def author_row(author):
+    # искать можно и по фамилии, и по имени; подпись - как Author.__str__
+    return author.pk, str(author), [f'{author.last_name} {author.first_name}', author.first_name]
+
+
+class Typeahead:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # перестраивает один поток, остальные ждут его и используют готовый индекс
+        self.build_lock = threading.Lock()
+        self.books = None
+        self.authors = None
+        self.generation = None
+        self.built = None
+
+    def build(self):
+        books, authors = PrefixIndex(), PrefixIndex()
+        generation = cache.get_generations(SCOPES)
+        books.load(book_row(book) for book in Book.objects.only('title').order_by().iterator(chunk_size=5000))
+        authors.load(author_row(author) for author in
+                     Author.objects.only('first_name', 'last_name').order_by().iterator(chunk_size=5000))
+        with self.lock:
+            self.books, self.authors, self.generation = books, authors, generation
+            self.built = time.monotonic()
+
+    def is_fresh(self):
+        if self.books is None:
+            return False
+        if time.monotonic() - self.built >= getattr(settings, 'CATALOG_TYPEAHEAD_MAX_AGE', 300):
+            return False
+        return cache.get_generations(SCOPES) == self.generation
+
+    def ensure_fresh(self):
+        if self.is_fresh():
+            return
+        with self.build_lock:
+            if not self.is_fresh():
+                self.build()
+
+    def search(self, q, limit, kinds=('books', 'authors')):
+        self.ensure_fresh()
+        with self.lock:
+            return {kind: getattr(self, kind).search(q, limit) for kind in kinds}
+
+    def apply(self, kind, pk, row=None):
+        # изменение из сигнала после коммита: row=None - объект удален
+        number, = cache.bump(*SCOPES)
+        with self.lock:
+            index = getattr(self, kind)
+            if index is None:
+                return
+            if row is None:
+                index.remove(pk)
+            else:
+                index.add(*row)
+            # поколение продвигается, только если до этого изменения индекс был свежим;
+            # изменения другого процесса между ними оставят его устаревшим - ensure_fresh перестроит
+            prefix, seen = self.generation.rsplit('.', 1)
+            if seen == str(number - 1):
+                self.generation = f'{prefix}.{number}'
+
+
+typeahead = Typeahead()
+
+
+def warm():
+    # вызывается при старте рабочего процесса; без базы (например, до migrate) индекс
+    # построится при первом запросе
+    if isinstance(caches['default'], LocMemCache):
+        logger.warning('кэш в памяти процесса: изменения из других процессов появятся в подсказках поиска '
+                       'только при перестройке индекса, через CATALOG_TYPEAHEAD_MAX_AGE секунд')
+    try:
+        typeahead.build()
+    except DatabaseError:
+        logger.exception('индекс подсказок не построен при старте')
+
+
+def book_changed(book, deleted=False):
+    # pk запоминается сразу: после delete() у объекта pk=None
+    pk, row = book.pk, None if deleted else book_row(book)
+    transaction.on_commit(lambda: typeahead.apply('books', pk, row))
+
+
+def author_changed(author, deleted=False):
+    pk, row = author.pk, None if deleted else author_row(author)
+    transaction.on_commit(lambda: typeahead.apply('authors', pk, row))
@@ -14,17 +14,26 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.urls import path, include, re_path
-from . import views
+from . import api, async_views, views
 
-urlpatterns = [
-    path('', views.index, name='index'),
-    path('books/', views.BookListView.as_view(), name='books'),
-    path('book_detail/<int:pk>', views.BookDetailView.as_view(), name='book_detail'),
-    path('authors/', views.AuthorListView.as_view(), name='authors'),
-    path('author_detail/<int:pk>', views.AuthorDetailView.as_view(), name='author_detail'),
+
+def read_patterns(module):
+    # главная, списки и карточки: синхронные (views) или асинхронные (async_views) под ASGI
+    return [
+        path('', module.index, name='index'),
+        path('books/', module.BookListView.as_view(), name='books'),
+        path('book_detail/<int:pk>', module.BookDetailView.as_view(), name='book_detail'),
+        path('authors/', module.AuthorListView.as_view(), name='authors'),
+        path('author_detail/<int:pk>', module.AuthorDetailView.as_view(), name='author_detail'),
+    ]
+
+
+urlpatterns = read_patterns(async_views if getattr(settings, 'CATALOG_ASYNC_VIEWS', False) else views) + [
     path('my_books/', views.LoanedBookListView.as_view(), name='my_books'),
     path('my_tools/', views.MyToolsView.as_view(), name='my_tools'),
+    path('my_tools/bulk/', views.bulk_circulation, name='bulk_circulation'),
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='book_renew'),
     path('author/create/', views.AuthorCreate.as_view(), name='author_create'),
     path('author/<int:pk>/update/', views.AuthorUpdate.as_view(), name='author_update'),
@@ -34,4 +43,19 @@ urlpatterns = [
     path('book/<int:pk>/delete/', views.DeleteBookView.as_view(), name='book_delete'),
     path('reserve_book/<uuid:pk>', views.ReserveBook.as_view(), name='reserve_book'),
     path('return_book/<uuid:pk>', views.ReturnBookView.as_view(), name='return_book'),
+    path('book/<int:pk>/hold/', views.hold_book, name='hold_book'),
+    path('hold/<int:pk>/cancel/', views.cancel_hold_view, name='cancel_hold'),
+    path('export/', views.export_catalog, name='export_catalog'),
+    path('query-stats/', views.query_stats, name='query_stats'),
+    path('api/v1/books/', api.BookResource.as_view(), name='api_books'),
+    path('api/v1/books/<int:pk>/', api.BookResource.as_view(), name='api_book'),
+    path('api/v1/authors/', api.AuthorResource.as_view(), name='api_authors'),
+    path('api/v1/authors/<int:pk>/', api.AuthorResource.as_view(), name='api_author'),
+    path('api/v1/instances/', api.BookInstanceResource.as_view(), name='api_instances'),
+    path('api/v1/instances/<uuid:pk>/', api.BookInstanceResource.as_view(), name='api_instance'),
+    path('api/v1/availability/', api.AvailabilityView.as_view(), name='api_availability'),
+    path('api/v1/circulation/scan/', api.ScanView.as_view(), name='api_scan'),
+    path('api/v1/autocomplete/authors/', api.AuthorAutocomplete.as_view(), name='api_autocomplete_authors'),
+    path('api/v1/autocomplete/books/', api.BookAutocomplete.as_view(), name='api_autocomplete_books'),
+    path('api/v1/typeahead/', api.TypeaheadView.as_view(), name='api_typeahead'),
 ]
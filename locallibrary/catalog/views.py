@@ -1,54 +1,90 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, HttpResponseNotFound, Http404, HttpResponseRedirect
-from .models import Book, BookInstance, Author, Genre
+from django.http import HttpResponse, HttpResponseNotFound, Http404, HttpResponseRedirect, StreamingHttpResponse
+from .models import Book, BookInstance, Author, Genre, Hold
 from django.views import generic, View
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.urls import reverse, reverse_lazy
 import datetime
-from .forms import RenewBookModelForm, AuthorForm, ReserveBookForm
-from django.contrib.auth.decorators import permission_required
+import os
+from django.conf import settings
+from django.views.static import serve
+from .forms import RenewBookModelForm, AuthorForm, AutocompleteWidget, BulkCirculationForm, ConsoleFilterForm, ReserveBookForm
+from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
-from django.db.models import Q
+from django.db.models import F, Q
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+from .counters import get_counters
+from .search import get_search_backend
+from .pagination import CursorPaginationMixin
+from .circulation import (
+    DONE, OUTCOME_LABELS, CirculationConflict, mark_maintenance, renew_copies, renew_copy, reserve_copy, return_copies,
+    return_copy,
+)
+from .export import CONTENT_TYPES, stream_export
+from .holds import HoldError, cancel_hold, place_hold, queue_position, waiting
+from .querystats import aggregate, read_records
+from .cache import CachedPageMixin
+from .recommendations import recommendations_for
+from .visits import count_visit, remember_visit, site_visits, visitor_visits
 
 
 def index(request):
-    num_books = Book.objects.all().count()
-    num_instance = BookInstance.objects.all().count()
-    num_authors = Author.objects.count()
-    num_genre = Genre.objects.all().count()
-    num_instance_available = BookInstance.objects.filter(status__exact='a').count()
-    num_tbooks = Book.objects.exclude(title='').count()
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
-
-
-
-    return render(request, 'catalog/index.html', {'num_books': num_books, 'num_instance': num_instance,
-                                          'num_instance_available': num_instance_available, 'num_authors': num_authors, 
-                                          'num_genre': num_genre, 'num_tbooks': num_tbooks, 'num_visits': num_visits})
-
-class BookListView(generic.ListView):
+    # все счетчики читаются одним запросом из таблицы CatalogCounter
+    # счетчик читателя - в подписанной cookie, общий - в буфере процесса: страница не пишет в сессию
+    count_visit()
+    context = get_counters()
+    num_visits = visitor_visits(request)
+    context['num_visits'] = num_visits
+    context['num_site_visits'] = site_visits(context)
+    context['new_books'] = Book.objects.with_availability().order_by('-pk')[:5]
+
+    return remember_visit(render(request, 'catalog/index.html', context), num_visits + 1)
+
+class BookListView(CachedPageMixin, CursorPaginationMixin, generic.ListView):
     model = Book
     paginate_by = 10
+    cursor_key = 'title'
+    search_param = 'q'
+    cache_name = 'books'
     template_name = 'catalog/book_list.html'
     context_object_name = 'book_lst'
 
+    def cache_scopes(self):
+        return ['books', 'copies']
+
     def get_queryset(self):
-        queryset = Book.objects.all()
-        q = self.request.GET.get('q')
+        # "N из M доступно" для всей страницы тем же запросом, что и сами книги
+        queryset = Book.objects.with_availability().select_related('author')
+        q = self.request.GET.get('q', '').strip()
+
+        if self.request.GET.get('available'):
+            queryset = queryset.in_stock()
 
         if q:
-            queryset = queryset.filter(
-                Q(title__icontains=q) |
-                Q(author__last_name__icontains=q) |
-                Q(author__first_name__icontains=q)
-            )
+            queryset = get_search_backend().search_books(queryset, q)
 
         return queryset
     
-class BookDetailView(generic.DetailView):
+class BookDetailView(CachedPageMixin, generic.DetailView):
     model = Book
     template_name = 'catalog/book_detail.html'
+    cache_name = 'book_detail'
+
+    def cache_scopes(self):
+        return [f'book:{self.kwargs["pk"]}', 'lookups']
+
+    def get_queryset(self):
+        # жанры и экземпляры шаблон читает внутри кэшируемых фрагментов,
+        # по одному запросу на каждый - только если фрагмента нет в кэше
+        return Book.objects.select_related('author', 'language')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # ленивый queryset: выполняется внутри кэшируемого фрагмента
+        context['recommendations'] = recommendations_for(self.object.pk)
+        return context
 
 
 class AuthorListView(generic.ListView):
@@ -57,46 +93,93 @@ class AuthorListView(generic.ListView):
     template_name = 'catalog/author_list.html'
     context_object_name = 'author_lst'
 
-class AuthorListView(generic.ListView):
+class AuthorListView(CachedPageMixin, CursorPaginationMixin, generic.ListView):
     model = Author
     paginate_by = 10
     template_name = 'catalog/author_list.html'
     context_object_name = 'author_lst'
+    cursor_key = 'last_name'
+    search_param = 'q'
+    cache_name = 'authors'
+
+    def cache_scopes(self):
+        return ['authors']
 
     def get_queryset(self):
         queryset = Author.objects.all()
         q = self.request.GET.get('q', '').strip()
 
         if q:
-            parts = q.split()
-
-            query = Q()
-            for part in parts:
-                query &= (
-                    Q(first_name__icontains=part) |
-                    Q(last_name__icontains=part)
-                )
-
-            queryset = queryset.filter(query)
+            queryset = get_search_backend().search_authors(queryset, q)
 
         return queryset
     
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(CachedPageMixin, generic.DetailView):
     model = Author
     template_name = 'catalog/author_detail.html'
+    cache_name = 'author_detail'
+
+    def cache_scopes(self):
+        return [f'author:{self.kwargs["pk"]}', 'lookups', 'copies']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # ленивый queryset: выполняется в шаблоне, только если фрагмента нет в кэше
+        context['books'] = self.object.book_set.with_availability().select_related('language').prefetch_related('genre')
+        return context
     
 class MyView(LoginRequiredMixin, View):
     login_url = '/login/'
     redirect_field_name = 'redirect_to'
 
-class LoanedBookListView(LoginRequiredMixin, generic.ListView):
+class LoanedBookListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     model = BookInstance
     template_name = 'catalog/my_books.html'
     paginate_by = 10
+    cursor_key = 'due_back'
     context_object_name = 'borrower_lst'
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user, status__in=['o', 'r']).order_by('due_back')
+        return BookInstance.objects.with_overdue().select_related('book').filter(borrower=self.request.user, status__in=['o', 'r']).order_by('due_back')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # заявок у читателя немного: позиция каждой - один COUNT по индексу очереди
+        # и выполненные, экземпляр которых еще ждет читателя: от него можно отказаться
+        holds = list(Hold.objects.select_related('book', 'copy').filter(borrower=self.request.user).filter(
+            Q(status='w') | Q(status='f', copy__status='r', copy__borrower=F('borrower'))))
+        for hold in holds:
+            if hold.status == 'w':
+                hold.position = queue_position(hold)
+        context['holds'] = holds
+        return context
+
+
+@login_required
+def hold_book(request, pk):
+    book = get_object_or_404(Book, pk=pk)
+    error = None
+    if request.method == 'POST':
+        try:
+            place_hold(book, request.user)
+        except HoldError as e:
+            error = str(e)
+        else:
+            return HttpResponseRedirect(reverse('my_books'))
+    hold = waiting(book.pk).filter(borrower=request.user).first()
+    return render(request, 'catalog/hold_book.html', {
+        'book': book,
+        'error': error,
+        'position': queue_position(hold) if hold else None,
+        'queue_length': waiting(book.pk).count(),
+    }, status=409 if error else 200)
+
+
+@login_required
+@require_POST
+def cancel_hold_view(request, pk):
+    cancel_hold(pk, request.user)
+    return HttpResponseRedirect(reverse('my_books'))
     
 @permission_required('catalog.can_edit')
 def create_book_inline(request):
@@ -117,10 +200,12 @@ def renew_book_librarian(request, pk):
         form = RenewBookModelForm(request.POST)
 
         if form.is_valid():
-            book_inst.due_back = form.cleaned_data['due_back']
-            book_inst.save()
-
-            return HttpResponseRedirect(reverse('my_tools'))
+            try:
+                renew_copy(book_inst.pk, form.cleaned_data['due_back'])
+            except CirculationConflict as e:
+                form.add_error(None, str(e))
+            else:
+                return HttpResponseRedirect(reverse('my_tools'))
         
     else:
         proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
@@ -142,10 +227,19 @@ class AuthorDelete(DeleteView):
     model = Author
     success_url = reverse_lazy('authors')
 
-class BookCreate(CreateView):
+class BookCreate(PermissionRequiredMixin, CreateView):
+    # то же право, что у AutocompleteView: иначе поле автора в форме не получит вариантов
+    permission_required = 'catalog.can_edit'
     model = Book
     fields = '__all__'
 
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # автор выбирается через автодополнение, а не из <select> со всеми авторами
+        form.fields['author'].widget = AutocompleteWidget(reverse_lazy('api_autocomplete_authors'), Author,
+                                                          attrs={'placeholder': 'Фамилия автора'})
+        return form
+
 class BookUpdate(UpdateView):
     model = Book
     fields = ['title', 'author', 'summary', 'isbn', 'dislpay_genre', 'language']
@@ -154,37 +248,95 @@ class BookDelete(DeleteView):
     model = Book
     success_url = reverse_lazy('books')
 
-class MyToolsView(PermissionRequiredMixin, generic.ListView):
+class MyToolsView(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
     permission_required = ('catalog.can_mark_returned', 
                            'catalog.can_edit',)
     model = BookInstance
     template_name = 'catalog/my_tools.html'
     context_object_name = 'instances'
+    paginate_by = 25
+    cursor_key = 'due_back'
+
+    def use_cursor_pagination(self):
+        # выданных экземпляров может быть сколько угодно: без OFFSET и COUNT(*), ?count=1 - с общим числом
+        return True
 
     def get_queryset(self):
-        return BookInstance.objects.select_related('book', 'borrower').filter(book__isnull=False, borrower__isnull=False).order_by('book__title')
+        self.filter_form = ConsoleFilterForm(self.request.GET)
+        # неверные поля фильтра просто не применяются
+        self.filter_form.is_valid()
+        data = self.filter_form.cleaned_data
+        queryset = BookInstance.objects.with_overdue().select_related('book', 'borrower').filter(
+            book__isnull=False, borrower__isnull=False)
+        if data.get('borrower'):
+            queryset = queryset.filter(borrower__username=data['borrower'])
+        if data.get('status'):
+            queryset = queryset.filter(status=data['status'])
+        if data.get('book'):
+            queryset = queryset.filter(book=data['book'])
+        if data.get('author'):
+            queryset = queryset.filter(book__author=data['author'])
+        if data.get('overdue'):
+            queryset = queryset.overdue()
+        # оба порядка читают индекс bookinst_console_due_idx; с фильтром по читателю -
+        # индекс borrower_id, у одного читателя немного экземпляров
+        self.cursor_descending = data.get('sort') == '-due_back'
+        return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # provide an empty AuthorForm and list of authors for inline add/delete
-        context['author_form'] = AuthorForm()
-        context['authors'] = Author.objects.all().order_by('last_name', 'first_name')
-        # provide book form and books list for inline add/delete
-        from .forms import BookForm
-        context['book_form'] = BookForm()
-        context['books'] = Book.objects.all().order_by('title')
+        context['filter_form'] = self.filter_form
+        context['bulk_form'] = BulkCirculationForm(initial={
+            'due_back': datetime.date.today() + datetime.timedelta(weeks=3),
+        })
         return context
+
+
+@require_POST
+@permission_required('catalog.can_mark_returned')
+def bulk_circulation(request):
+    # массовые продление, возврат и отправка на обслуживание из консоли библиотекаря
+    back = request.POST.get('next', '')
+    if not url_has_allowed_host_and_scheme(back, allowed_hosts={request.get_host()}):
+        back = reverse('my_tools')
+    form = BulkCirculationForm(request.POST)
+    if not form.is_valid():
+        return render(request, 'catalog/bulk_circulation.html', {'form': form, 'back': back}, status=400)
+
+    pks = form.cleaned_data['copies']
+    action = form.cleaned_data['action']
+    if action == 'renew':
+        outcomes = renew_copies(pks, form.cleaned_data['due_back'])
+    elif action == 'return':
+        outcomes = return_copies(pks)
+    else:
+        outcomes = mark_maintenance(pks)
+
+    titles = dict(BookInstance.objects.filter(pk__in=pks).values_list('pk', 'book__title'))
+    results = [
+        {'pk': pk, 'title': titles.get(pk), 'done': outcome == DONE, 'label': OUTCOME_LABELS[outcome]}
+        for pk, outcome in outcomes.items()
+    ]
+    return render(request, 'catalog/bulk_circulation.html', {
+        'form': form,
+        'back': back,
+        'action': dict(BulkCirculationForm.ACTIONS)[action],
+        'results': results,
+        'done': sum(1 for item in results if item['done']),
+    })
     
-class ReserveBook(UpdateView):
+class ReserveBook(LoginRequiredMixin, UpdateView):
     model = BookInstance
     form_class = ReserveBookForm
     template_name = 'catalog/reserve_book.html'
     success_url = reverse_lazy('books')
 
     def form_valid(self, form):
-        form.instance.borrower = self.request.user
-        form.instance.status = 'o'
-        return super().form_valid(form)
+        try:
+            reserve_copy(self.object.pk, self.request.user, form.cleaned_data['due_back'])
+        except CirculationConflict as e:
+            return conflict_response(self, form, e)
+        return HttpResponseRedirect(self.get_success_url())
     
 class DeleteBookView(DeleteView):
     model = Book
@@ -203,7 +355,50 @@ class ReturnBookView(UpdateView):
     success_url = reverse_lazy('books')
 
     def form_valid(self, form):
-        form.instance.borrower = None
-        form.instance.status = 'a'
-        form.instance.due_back = None
-        return super().form_valid(form)
\ No newline at end of file
+        try:
+            return_copy(self.object.pk)
+        except CirculationConflict as e:
+            return conflict_response(self, form, e)
+        return HttpResponseRedirect(self.get_success_url())
+
+
+@staff_member_required
+def export_catalog(request):
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in CONTENT_TYPES:
+        raise Http404('Неизвестный формат выгрузки')
+    after = request.GET.get('after')
+    if after is not None and not after.isdigit():
+        raise Http404('Неверный pk для продолжения выгрузки')
+    response = StreamingHttpResponse(
+        stream_export(fmt, after=int(after) if after else None),
+        content_type=f'{CONTENT_TYPES[fmt]}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="catalog.{fmt}"'
+    return response
+
+
+@staff_member_required
+def query_stats(request):
+    return render(request, 'catalog/query_stats.html', {
+        'views': aggregate(read_records()),
+        'sample_rate': settings.CATALOG_QUERY_STATS_SAMPLE_RATE,
+        'slow_ms': settings.CATALOG_SLOW_REQUEST_MS,
+    })
+
+
+def serve_cover(request, path):
+    # только для разработки (DEBUG): в бою файлы отдает веб-сервер с теми же заголовками
+    response = serve(request, path, document_root=os.path.join(settings.MEDIA_ROOT, 'covers'))
+    if path.startswith('v/'):
+        # имена копий содержат хэш содержимого и никогда не меняются
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def conflict_response(view, form, error):
+    # экземпляр успели изменить в другом запросе - показываем форму с ошибкой и статусом 409
+    form.add_error(None, str(error))
+    response = view.form_invalid(form)
+    response.status_code = 409
+    return response
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import DatabaseError
+from django.db.models import F
+
+from .models import CatalogCounter
+
+# Посещения главной. Счетчик читателя хранится в подписанной cookie, а не в сессии: прежний
+# request.session['num_visits'] на каждый просмотр давал UPDATE/INSERT в django_session.
+# Общее число посещений копится в памяти процесса (VisitBuffer) и пишется в CatalogCounter
+# одним UPDATE на пачку: каждые CATALOG_VISIT_FLUSH_EVERY посещений или раз в
+# CATALOG_VISIT_FLUSH_SECONDS секунд, а также при завершении процесса.
+
+logger = logging.getLogger(__name__)
+
+COUNTER = 'num_site_visits'
+COOKIE = 'catalog_visits'
+COOKIE_SALT = 'catalog.visits'
+COOKIE_MAX_AGE = 365 * 24 * 3600
+
+
+class VisitBuffer:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.flushed = time.monotonic()
+
+    def hit(self):
+        # True - пора сбросить накопленное в базу
+        every = getattr(settings, 'CATALOG_VISIT_FLUSH_EVERY', 100)
+        seconds = getattr(settings, 'CATALOG_VISIT_FLUSH_SECONDS', 60)
+        with self.lock:
+            self.pending += 1
+            return self.pending >= every or time.monotonic() - self.flushed >= seconds
+
+    def flush(self, log_errors=True):
+        with self.lock:
+            pending, self.pending = self.pending, 0
+            self.flushed = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            if not CatalogCounter.objects.filter(name=COUNTER).update(value=F('value') + pending):
+                counter, created = CatalogCounter.objects.get_or_create(name=COUNTER, defaults={'value': pending})
+                if not created:
+                    CatalogCounter.objects.filter(name=COUNTER).update(value=F('value') + pending)
+        except DatabaseError:
+            # посещения не теряются: вернутся в буфер и уйдут со следующей пачкой
+            if log_errors:
+                logger.exception('не удалось записать %s посещений', pending)
+            with self.lock:
+                self.pending += pending
+            return 0
+        return pending
+
+
+buffer = VisitBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    # при остановке процесса база может быть уже недоступна
+    buffer.flush(log_errors=False)
+
+
+def count_visit():
+    if buffer.hit():
+        buffer.flush()
+
+
+async def acount_visit():
+    if buffer.hit():
+        await sync_to_async(buffer.flush)()
+
+
+def site_visits(counters):
+    # записанное в базу плюс еще не сброшенное этим процессом
+    return counters.get(COUNTER, 0) + buffer.pending
+
+
+def visitor_visits(request):
+    try:
+        return int(request.get_signed_cookie(COOKIE, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE))
+    except (KeyError, ValueError, signing.BadSignature):
+        return 0
+
+
+def remember_visit(response, visits):
+    response.set_signed_cookie(COOKIE, str(visits), salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE,
+                               httponly=True, samesite='Lax')
+    return response
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+# под ASGI страницы каталога обслуживаются асинхронными представлениями
+os.environ.setdefault('CATALOG_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+# индекс подсказок поиска строится при старте процесса, а не на первом запросе
+from catalog import typeahead  # noqa: E402
+
+typeahead.warm()
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'catalog.querystats.QueryStatsMiddleware',
 ]
 
 ROOT_URLCONF = 'locallibrary.urls'
@@ -78,10 +79,90 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # тестовая база - файл, а не общая in-memory (shared cache): там параллельная запись
+        # сразу падает с "database table is locked" без ожидания, а benchmark_asgi в
+        # tests/test_async_views.py выполняет запросы одновременно из потоков и цикла событий
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        # транзакция сразу берет блокировку записи (BEGIN IMMEDIATE) и ждет ее до timeout секунд;
+        # отложенная (DEFERRED) транзакция, начавшая с чтения, при параллельной записи
+        # получает "database is locked" сразу, без ожидания
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# локальный кэш процесса; при нескольких процессах на одном сервере используйте
+# 'django.core.cache.backends.filebased.FileBasedCache' с общим каталогом (LOCATION),
+# чтобы инвалидация из одного процесса была видна остальным
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'locallibrary',
+    }
+}
+
+# хранилище сессий: db (по умолчанию), cache - без записи в базу, но при LocMemCache сессии
+# живут только в своем процессе, cookies - подписанные cookie (django.contrib.sessions.backends.signed_cookies)
+# (все варианты сравнивает команда benchmark_visits)
+CATALOG_SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+CATALOG_SESSION_STORE = os.environ.get('CATALOG_SESSION_STORE', 'db')
+SESSION_ENGINE = CATALOG_SESSION_ENGINES[CATALOG_SESSION_STORE]
+
+# посещения главной копятся в памяти процесса и пишутся в базу пачкой (catalog/visits.py)
+CATALOG_VISIT_FLUSH_EVERY = 100
+CATALOG_VISIT_FLUSH_SECONDS = 60
+
+# время жизни кэша страниц каталога в секундах, 0 - кэш выключен
+CATALOG_PAGE_CACHE_TIMEOUT = 600
+# индекс подсказок поиска (catalog/typeahead.py) перестраивается не реже чем раз в столько секунд:
+# с LocMemCache поколения кэша не видны другим процессам, и только так до них доходят чужие изменения
+CATALOG_TYPEAHEAD_MAX_AGE = 300
+
+# асинхронные страницы чтения (catalog/async_views.py); включается в locallibrary/asgi.py,
+# под WSGI каждый async-view выполнялся бы через async_to_sync и только проигрывал
+CATALOG_ASYNC_VIEWS = os.environ.get('CATALOG_ASYNC_VIEWS', '0') == '1'
+
+# статистика SQL по представлениям (catalog/querystats.py): доля запросов, для которых пишутся
+# число и время SQL-запросов и повторы (0 - выключено, в бою достаточно 0.05)
+CATALOG_QUERY_STATS_SAMPLE_RATE = float(os.environ.get('CATALOG_QUERY_STATS_SAMPLE_RATE', '0'))
+# запросы дольше стольких миллисекунд пишутся в лог всегда, None - не писать
+CATALOG_SLOW_REQUEST_MS = 500
+CATALOG_QUERY_STATS_LOG = BASE_DIR / 'query_stats.log'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'query_stats': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': CATALOG_QUERY_STATS_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'delay': True,
+            'encoding': 'utf-8',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'catalog.querystats': {
+            'handlers': ['query_stats'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -118,6 +199,13 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# загруженные файлы (обложки книг)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# обрабатывать загруженные обложки в фоновом потоке (False - сразу после сохранения)
+CATALOG_COVERS_ASYNC = True
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
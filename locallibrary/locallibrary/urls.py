@@ -35,6 +35,12 @@ from django.conf.urls.static import static
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
+    # обложки книг с заголовками долгого кэширования
+    from catalog.views import serve_cover
+    urlpatterns += [
+        path('media/covers/<path:path>', serve_cover),
+    ]
+
 from django.views.generic import RedirectView
 
 # переименовываем старый адрес на новый с классом Redirectview() по схеме
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
 
 application = get_wsgi_application()
+
+# индекс подсказок поиска строится при старте процесса, а не на первом запросе
+from catalog import typeahead  # noqa: E402
+
+typeahead.warm()
@@ -0,0 +1,144 @@
+import datetime
+import unittest
+from unittest import mock
+from django import forms
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.pagination import EstimatedCountPaginator, estimated_count
+from tests.utils import QueryCountMixin
+
+
+class AdminPerformanceTest(QueryCountMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='12345')
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.genres = [Genre.objects.create(name=f'Жанр {num}') for num in range(3)]
+        cls.num = 0
+        cls.readers = [User.objects.create_user(f'reader{num}', password='12345') for num in range(5)]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_books(self, count=3):
+        for _ in range(count):
+            AdminPerformanceTest.num += 1
+            book = Book.objects.create(title=f'Книга {self.num}', summary='s', isbn=str(self.num), author=self.author)
+            book.genre.set(self.genres)
+            BookInstance.objects.create(book=book, imprint='i', status='o', borrower=self.readers[self.num % 5])
+        return book
+
+    def test_changelists_do_not_grow_with_rows(self):
+        self.add_books()
+        for name in ('book', 'bookinstance', 'author'):
+            self.assertConstantQueries(reverse(f'admin:catalog_{name}_changelist'), self.add_books)
+
+    def test_change_pages_use_autocomplete_and_limited_inlines(self):
+        book = self.add_books()
+        BookInstance.objects.bulk_create([BookInstance(book=book, imprint='i') for _ in range(30)])
+        resp = self.client.get(reverse('admin:catalog_book_change', args=[book.pk]))
+        self.assertEqual(resp.context['inline_admin_formsets'][0].formset.initial_form_count(), 20)
+        self.assertContains(resp, 'Все экземпляры (31)')
+        # ни списка читателей, ни списка книг и авторов в <select>
+        self.assertNotContains(resp, 'reader1</option>')
+        self.assertContains(resp, 'admin-autocomplete')
+
+        copy = book.bookinstance_set.first()
+        resp = self.client.get(reverse('admin:catalog_bookinstance_change', args=[copy.pk]))
+        self.assertNotContains(resp, '>Книга 1</option>')
+
+        resp = self.client.get(reverse('admin:catalog_author_change', args=[self.author.pk]))
+        self.assertEqual(resp.context['inline_admin_formsets'][0].formset.initial_form_count(), 3)
+
+    def form_data(self, resp):
+        # значения всех полей формы изменения, как их отправил бы браузер
+        bound = [resp.context['adminform'].form]
+        for inline in resp.context['inline_admin_formsets']:
+            bound += [inline.formset.management_form, *inline.formset.forms]
+        data = {}
+        for form in bound:
+            for field in form:
+                if isinstance(field.field, forms.FileField):
+                    continue
+                value = field.value()
+                if value is not None and value is not False:
+                    data[field.html_name] = value
+        return data
+
+    def test_limited_inline_binds_same_rows(self):
+        book = self.add_books(1)
+        book.language = Language.objects.create(lang='Русский')
+        book.save()
+        due_back = datetime.date.today()
+        BookInstance.objects.bulk_create([BookInstance(book=book, imprint='i', due_back=due_back) for _ in range(30)])
+        url = reverse('admin:catalog_book_change', args=[book.pk])
+        resp = self.client.get(url)
+        formset = resp.context['inline_admin_formsets'][0].formset
+        shown = [form.instance.pk for form in formset.forms]
+        # одинаковый due_back - следующим по порядку идет pk
+        expected = list(BookInstance.objects.filter(book=book).order_by('due_back', 'pk').values_list('pk', flat=True))
+        self.assertEqual(shown, expected[:20])
+
+        data = self.form_data(resp)
+        data['bookinstance_set-5-imprint'] = 'Измененный'
+        data['bookinstance_set-7-DELETE'] = 'on'
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(BookInstance.objects.get(pk=shown[5]).imprint, 'Измененный')
+        self.assertEqual(BookInstance.objects.filter(imprint='Измененный').count(), 1)
+        self.assertFalse(BookInstance.objects.filter(pk=shown[7]).exists())
+        self.assertEqual(BookInstance.objects.filter(book=book).count(), 30)
+
+    def test_author_inline_still_saves(self):
+        book = self.add_books(1)
+        url = reverse('admin:catalog_author_change', args=[self.author.pk])
+        data = {
+            'last_name': 'Толстой', 'first_name': 'Лев',
+            'book_set-TOTAL_FORMS': 1, 'book_set-INITIAL_FORMS': 1,
+            'book_set-0-id': book.pk, 'book_set-0-author': self.author.pk,
+            'book_set-0-title': 'Новое название', 'book_set-0-isbn': book.isbn,
+        }
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        book.refresh_from_db()
+        self.assertEqual(book.title, 'Новое название')
+
+
+class EstimatedCountTest(TestCase):
+
+    def test_estimate_for_unfiltered_lists_only(self):
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        self.assertEqual(estimated_count(Author), author.pk)
+        with mock.patch('catalog.pagination.estimated_count', return_value=50000):
+            paginator = EstimatedCountPaginator(Author.objects.all(), 10)
+            self.assertEqual(paginator.count, 50000)
+            self.assertEqual(paginator.num_pages, 5000)
+            with self.assertNumQueries(1):
+                # с фильтром - точный COUNT(*)
+                self.assertEqual(EstimatedCountPaginator(Author.objects.filter(last_name='Толстой'), 10).count, 1)
+        # маленькая таблица считается точно
+        self.assertEqual(EstimatedCountPaginator(Author.objects.all(), 10).count, 1)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'rowid есть только у SQLite')
+    def test_uuid_pk_estimate_without_count(self):
+        book = Book.objects.create(title='Война и мир', summary='s', isbn='1')
+        BookInstance.objects.bulk_create([BookInstance(book=book, imprint='i') for _ in range(3)])
+        with CaptureQueriesContext(connection) as queries:
+            estimate = estimated_count(BookInstance)
+        self.assertGreaterEqual(estimate, 3)
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries))
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'статистика sqlite_stat1')
+    def test_sqlite_stat_ignores_partial_indexes(self):
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        book = Book.objects.create(title='Война и мир', summary='s', isbn='1', author=author)
+        reader = User.objects.create_user('reader', password='12345')
+        # в частичный индекс bookinst_console_due_idx попадает только выданный экземпляр
+        BookInstance.objects.create(book=book, imprint='i', status='o', borrower=reader)
+        BookInstance.objects.bulk_create([BookInstance(book=book, imprint='i') for _ in range(7)])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_count(BookInstance), 8)
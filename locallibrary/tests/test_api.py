@@ -0,0 +1,91 @@
+import datetime
+from django.test import TestCase
+from django.urls import reverse
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class CatalogApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.genres = [Genre.objects.create(name=name) for name in ('Роман', 'Эпопея')]
+        cls.books = []
+        for num in range(5):
+            book = Book.objects.create(title='Книга %s' % num, summary='s', isbn=str(num), author=cls.author)
+            book.genre.set(cls.genres[:num % 3])
+            cls.books.append(book)
+        cls.due = datetime.date.today() + datetime.timedelta(days=3)
+        BookInstance.objects.create(book=cls.books[0], imprint='АСТ', status='a')
+        BookInstance.objects.create(book=cls.books[0], imprint='АСТ', status='o', due_back=cls.due)
+
+    def test_sparse_fields_single_query(self):
+        with self.assertNumQueries(1) as ctx:
+            resp = self.client.get(reverse('api_books'), {'fields': 'id,title'})
+        self.assertEqual(resp.json()['results'][0], {'id': self.books[0].pk, 'title': 'Книга 0'})
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('"summary"', sql)
+        self.assertNotIn('"isbn"', sql)
+
+    def test_unknown_field(self):
+        resp = self.client.get(reverse('api_books'), {'fields': 'title,password'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('password', resp.json()['error'])
+
+    def test_related_field_one_extra_query(self):
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse('api_books'), {'fields': 'title,genre'})
+        genres = [row['genre'] for row in resp.json()['results']]
+        self.assertEqual(genres[1], [self.genres[0].pk])
+        self.assertEqual(genres[3], [])
+
+    def test_ids_batch_keeps_order(self):
+        ids = [self.books[3].pk, self.books[1].pk, 999]
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse('api_books'), {'ids': ','.join(map(str, ids)), 'fields': 'id'})
+        self.assertEqual([row['id'] for row in resp.json()['results']], ids[:2])
+        self.assertEqual(self.client.get(reverse('api_books'), {'ids': 'a,b'}).status_code, 400)
+
+    def test_cursor_pagination(self):
+        url, titles = reverse('api_books'), []
+        params = {'limit': 2, 'fields': 'title', 'count': 1}
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.json()['count'], 5)
+        while True:
+            data = resp.json()
+            titles += [row['title'] for row in data['results']]
+            if not data['next']:
+                break
+            resp = self.client.get(data['next'])
+        self.assertEqual(titles, ['Книга %s' % num for num in range(5)])
+
+    def test_etag_not_modified(self):
+        url = reverse('api_author', kwargs={'pk': self.author.pk})
+        resp = self.client.get(url)
+        self.assertEqual(resp.json()['last_name'], 'Толстой')
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b'')
+        self.author.last_name = 'Толстой-старший'
+        self.author.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 200)
+
+    def test_instances_hide_borrower_and_filter(self):
+        resp = self.client.get(reverse('api_instances'), {'book': self.books[0].pk, 'status': 'o'})
+        rows = resp.json()['results']
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['due_back'], self.due.isoformat())
+        self.assertNotIn('borrower', rows[0])
+        self.assertEqual(self.client.get(reverse('api_instance', kwargs={'pk': rows[0]['id']})).status_code, 200)
+
+    def test_availability_batch(self):
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse('api_availability'), {'ids': f'{self.books[0].pk},{self.books[1].pk}'})
+        self.assertEqual(resp.json()['results'], [
+            {'book': self.books[0].pk, 'total': 2, 'available': 1, 'next_due_back': self.due.isoformat()},
+            {'book': self.books[1].pk, 'total': 0, 'available': 0, 'next_due_back': None},
+        ])
+        self.assertEqual(self.client.get(reverse('api_availability')).status_code, 400)
+
+    def test_read_only(self):
+        self.assertEqual(self.client.post(reverse('api_books')).status_code, 405)
@@ -0,0 +1,91 @@
+import datetime
+import json
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import include, path, reverse
+from catalog import async_views
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.urls import read_patterns
+from locallibrary import urls as project_urls
+
+# тот же сайт, но страницы чтения обслуживают асинхронные представления
+urlpatterns = [
+    path('catalog/', include(read_patterns(async_views))),
+    *project_urls.urlpatterns,
+]
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class AsyncViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        genre = Genre.objects.create(name='Роман')
+        for num in range(12):
+            book = Book.objects.create(title='Книга %02d' % num, summary='s', isbn=str(num), author=cls.author)
+            book.genre.add(genre)
+            BookInstance.objects.create(book=book, imprint='АСТ', status='o' if num % 2 else 'a',
+                                        due_back=datetime.date.today())
+        cls.book = book
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        return [
+            reverse('books'),
+            reverse('books') + '?page=2',
+            reverse('books') + '?after=',
+            reverse('books') + '?q=Книга',
+            reverse('authors'),
+            reverse('book_detail', kwargs={'pk': self.book.pk}),
+            reverse('author_detail', kwargs={'pk': self.author.pk}),
+        ]
+
+    def test_same_html_as_sync_views(self):
+        expected = [self.client.get(url).content for url in self.urls()]
+        with self.settings(ROOT_URLCONF=__name__):
+            self.assertIs(self.client.get(reverse('books')).resolver_match.func.view_class,
+                          async_views.BookListView)
+            for url, content in zip(self.urls(), expected):
+                self.assertEqual(self.client.get(url).content, content, url)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_not_found(self):
+        self.assertEqual(self.client.get(reverse('book_detail', kwargs={'pk': 999})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('books') + '?page=9').status_code, 404)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    async def test_index_under_asgi(self):
+        resp = await self.async_client.get(reverse('index'))
+        self.assertContains(resp, 'Новые поступления')
+        self.assertContains(resp, 'Книга 11')
+        self.assertEqual(resp.context['num_books'], 12)
+        resp = await self.async_client.get(reverse('index'))
+        self.assertEqual(resp.context['num_visits'], 1)
+
+    @override_settings(ROOT_URLCONF=__name__, CATALOG_PAGE_CACHE_TIMEOUT=600)
+    async def test_page_cache(self):
+        url = reverse('books')
+        first = await self.async_client.get(url)
+        second = await self.async_client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertIsNone(second.context)
+
+
+class BenchmarkModeTest(TransactionTestCase):
+
+    def test_each_mode_reports_throughput(self):
+        Book.objects.create(title='Книга', summary='s', isbn='1',
+                            author=Author.objects.create(first_name='Лев', last_name='Толстой'))
+        # запросы идут одновременно: первые из них параллельно пересчитывают счетчики главной
+        # страницы, что проверяет настройки SQLite в settings.DATABASES (файл, BEGIN IMMEDIATE)
+        for mode in ('wsgi', 'asgi'):
+            out = StringIO()
+            call_command('benchmark_asgi', mode=mode, requests=24, concurrency=4, stdout=out)
+            result = json.loads(out.getvalue())
+            self.assertEqual((result['requests'], result['errors']), (24, 0), mode)
+            self.assertGreater(result['rps'], 0)
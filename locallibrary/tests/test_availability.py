@@ -0,0 +1,112 @@
+import datetime
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from catalog.circulation import reserve_copy, return_copy
+from catalog.counters import rebuild_counters
+from catalog.models import Author, Book, BookInstance
+from .utils import QueryCountMixin
+
+
+class AvailabilityTest(QueryCountMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.book = Book.objects.create(title='Война и мир', summary='s', isbn='1', author=cls.author)
+        cls.other = Book.objects.create(title='Анна Каренина', summary='s', isbn='2', author=cls.author)
+        cls.user = User.objects.create_user(username='reader', password='12345')
+        cls.due = datetime.date.today() + datetime.timedelta(days=7)
+        for status, due in (('a', None), ('a', None), ('o', cls.due + datetime.timedelta(days=3)),
+                            ('o', cls.due), ('r', None), ('m', None)):
+            BookInstance.objects.create(book=cls.book, imprint='АСТ', status=status, due_back=due)
+
+    def setUp(self):
+        cache.clear()
+
+    def available_copies(self, book):
+        return Book.objects.values_list('available_copies', flat=True).get(pk=book.pk)
+
+    def test_annotations(self):
+        with self.assertNumQueries(1):
+            books = {book.pk: book for book in Book.objects.with_availability()}
+        book = books[self.book.pk]
+        self.assertEqual((book.copies_total, book.copies_available, book.copies_on_loan, book.copies_reserved),
+                         (6, 2, 2, 1))
+        self.assertEqual(book.next_due_back, self.due)
+        self.assertEqual(books[self.other.pk].copies_total, 0)
+        self.assertIsNone(books[self.other.pk].next_due_back)
+
+    def test_annotations_combine_with_search(self):
+        books = list(Book.objects.with_availability().filter(pk=self.book.pk).filter(title__contains='мир'))
+        self.assertEqual(books[0].copies_available, 2)
+
+    def test_denormalized_counter_follows_transitions(self):
+        self.assertEqual(self.available_copies(self.book), 2)
+        copy = BookInstance.objects.create(book=self.other, imprint='АСТ', status='a')
+        self.assertEqual(self.available_copies(self.other), 1)
+
+        reserve_copy(copy.pk, self.user, self.due)
+        self.assertEqual(self.available_copies(self.other), 0)
+        return_copy(copy.pk)
+        self.assertEqual(self.available_copies(self.other), 1)
+
+        copy = BookInstance.objects.only('status').get(pk=copy.pk)
+        copy.book = self.book
+        copy.save()
+        self.assertEqual((self.available_copies(self.book), self.available_copies(self.other)), (3, 0))
+
+        copy.delete()
+        self.assertEqual(self.available_copies(self.book), 2)
+        self.assertEqual(list(Book.objects.in_stock()), [self.book])
+
+    def test_rebuild_counters_fixes_drift(self):
+        Book.objects.update(available_copies=100)
+        rebuild_counters()
+        self.assertEqual(self.available_copies(self.book), 2)
+        self.assertEqual(self.available_copies(self.other), 0)
+
+    def test_book_list_shows_availability(self):
+        resp = self.client.get(reverse('books'))
+        self.assertContains(resp, '2 из 6 доступно')
+        self.assertContains(resp, 'Нет экземпляров')
+        resp = self.client.get(reverse('books'), {'available': 1})
+        self.assertNotContains(resp, 'Анна Каренина')
+
+    def test_page_links_keep_filters(self):
+        for i in range(12):
+            book = Book.objects.create(title=f'Том {i}', summary='s', isbn=f'x{i}', author=self.author)
+            BookInstance.objects.create(book=book, imprint='АСТ', status='a')
+        resp = self.client.get(reverse('books'), {'available': 1, 'q': 'Том'})
+        self.assertContains(resp, 'href="?available=1&amp;q=%D0%A2%D0%BE%D0%BC&amp;page=2"')
+        resp = self.client.get(reverse('books'), {'available': 1, 'q': 'Том', 'page': 2})
+        self.assertContains(resp, 'href="?available=1&amp;q=%D0%A2%D0%BE%D0%BC&amp;page=1"')
+
+    def test_cached_list_refreshed_after_checkout(self):
+        self.assertContains(self.client.get(reverse('books')), '2 из 6 доступно')
+        copy = BookInstance.objects.filter(book=self.book, status='a').first()
+        reserve_copy(copy.pk, self.user, self.due)
+        self.assertContains(self.client.get(reverse('books')), '1 из 6 доступно')
+        self.assertContains(self.client.get(reverse('author_detail', kwargs={'pk': self.author.pk})),
+                            '1 из 6 доступно')
+
+    def add_books(self):
+        for num in range(3):
+            book = Book.objects.create(title='Книга %s' % num, summary='s', isbn=str(num),
+                                       author=Author.objects.create(first_name='И', last_name='Автор %s' % num))
+            for status in ('a', 'o', 'r'):
+                BookInstance.objects.create(book=book, imprint='АСТ', status=status, due_back=self.due)
+
+    def add_author_books(self):
+        for status in ('a', 'o'):
+            book = Book.objects.create(title='Повесть', summary='s', isbn='3', author=self.author)
+            BookInstance.objects.create(book=book, imprint='АСТ', status=status, due_back=self.due)
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+    def test_pages_run_constant_queries(self):
+        self.assertConstantQueries(reverse('books'), self.add_books)
+        # таблица счетчиков заполняется лениво при первом открытии главной
+        rebuild_counters()
+        self.assertConstantQueries(reverse('index'), self.add_books)
+        self.assertConstantQueries(reverse('author_detail', kwargs={'pk': self.author.pk}), self.add_author_books)
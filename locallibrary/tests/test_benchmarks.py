@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from catalog import urls as catalog_urls, visits
+from catalog.counters import get_counters
+from catalog.models import Author, Book, BookInstance, CatalogCounter, Hold
+
+
+class SeedLibraryTest(TestCase):
+
+    def seed(self, **options):
+        call_command('seed_library', books=30, copies_per_book=2, users=5, seed=7, chunk_size=10,
+                     stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return (list(Book.objects.order_by('pk').values_list('title', 'isbn', 'author__last_name')),
+                sorted(BookInstance.objects.values_list('id', 'status', 'borrower__username')))
+
+    def test_generates_dataset(self):
+        self.seed()
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(User.objects.filter(username__startswith='reader').count(), 5)
+        self.assertTrue(self.client.login(username='reader0', password='password'))
+        copies = BookInstance.objects.count()
+        self.assertEqual(get_counters()['num_instance'], copies)
+        self.assertFalse(BookInstance.objects.filter(status='o', borrower__isnull=True).exists())
+        self.assertFalse(Book.objects.filter(genre__isnull=True).exists())
+
+    def test_same_seed_same_data(self):
+        self.seed()
+        first = self.snapshot()
+        Book.objects.all().delete()
+        BookInstance.objects.all().delete()
+        Author.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+
+
+class BenchmarkViewsTest(TestCase):
+
+    def test_writes_json_for_every_catalog_url(self):
+        call_command('seed_library', books=5, users=2, stdout=StringIO())
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        call_command('benchmark_views', repeat=2, user='reader0', output=path, stdout=StringIO(), stderr=StringIO())
+        with open(path, encoding='utf-8') as f:
+            result = json.load(f)
+        names = {pattern.name for pattern in catalog_urls.urlpatterns if pattern.name}
+        self.assertEqual(set(result['views']), names)
+        self.assertEqual(result['dataset']['books'], 5)
+        books = result['views']['books']
+        self.assertEqual(books['status'], 200)
+        self.assertGreater(books['queries'], 0)
+        self.assertGreater(books['peak_kb'], 0)
+        self.assertLessEqual(books['p50_ms'], books['p95_ms'])
+        self.assertEqual(result['views']['api_availability']['status'], 200)
+
+        out = StringIO()
+        call_command('benchmark_views', repeat=1, compare=path, stdout=out, stderr=StringIO())
+        self.assertIn('books:', out.getvalue())
+
+
+class BenchmarkCheckoutTest(TestCase):
+
+    def test_scan_is_faster_than_forms_and_restores_copies(self):
+        call_command('seed_library', books=10, copies_per_book=3, users=2, stdout=StringIO())
+        before = sorted(BookInstance.objects.values_list('id', 'status', 'borrower_id', 'due_back'))
+        out = StringIO()
+        call_command('benchmark_checkout', batch=5, rounds=2, form_copies=2, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(set(result['scan']), {'checkout', 'return'})
+        self.assertGreater(result['scan']['checkout']['ms_per_item'], 0)
+        self.assertGreater(result['form']['ms_per_item'], 0)
+        self.assertEqual(sorted(BookInstance.objects.values_list('id', 'status', 'borrower_id', 'due_back')), before)
+        self.assertFalse(User.objects.filter(username__startswith='bench_').exists())
+
+
+class BenchmarkHoldsTest(TestCase):
+
+    def test_dispatch_walks_the_queue_and_cleans_up(self):
+        out = StringIO()
+        call_command('benchmark_holds', holds=20, rounds=5, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(set(result['dispatch']), {'p50_ms', 'p95_ms', 'max_ms'})
+        self.assertIn('hold_queue_idx', result['next_hold_plan'])
+        self.assertFalse(Book.objects.filter(isbn='bench-holds').exists())
+        self.assertFalse(Hold.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='bench_').exists())
+
+
+class BenchmarkVisitsTest(TestCase):
+
+    def test_buffer_removes_session_writes(self):
+        visits.buffer.flush()
+        site_visits = list(CatalogCounter.objects.filter(name=visits.COUNTER).values_list('value', flat=True))
+        out = StringIO()
+        call_command('benchmark_visits', hits=40, visitors=4, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result['modes']['before']['tables']['django_session'], 40)
+        self.assertNotIn('django_session', result['modes']['after_db']['tables'])
+        self.assertEqual(result['modes']['after_cookies']['tables'].get('catalog_catalogcounter', 0),
+                         result['modes']['after_cookies']['writes'])
+        # просмотры бенчмарка в общий счетчик не попадают
+        self.assertEqual(list(CatalogCounter.objects.filter(name=visits.COUNTER).values_list('value', flat=True)),
+                         site_visits)
@@ -0,0 +1,101 @@
+import datetime
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from catalog import views
+from catalog.circulation import reserve_copy
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class PageCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.genre = Genre.objects.create(name='Роман')
+        cls.book = Book.objects.create(title='Война и мир', summary='s', isbn='1', author=cls.author)
+        cls.book.genre.add(cls.genre)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='АСТ', status='a')
+        cls.user = User.objects.create_user(username='reader', password='12345')
+
+    def setUp(self):
+        cache.clear()
+
+    def book_url(self):
+        return reverse('book_detail', kwargs={'pk': self.book.pk})
+
+    def test_anonymous_pages_served_from_cache(self):
+        for url in (reverse('books'), reverse('authors'), self.book_url(),
+                    reverse('author_detail', kwargs={'pk': self.author.pk})):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.content, second.content)
+            self.assertEqual(first.headers, second.headers)
+
+    def test_cached_page_keeps_headers(self):
+        render = views.BookListView.render_to_response
+
+        def render_with_header(view, context, **kwargs):
+            response = render(view, context, **kwargs)
+            response['Content-Language'] = 'ru'
+            return response
+
+        with mock.patch.object(views.BookListView, 'render_to_response', render_with_header):
+            self.client.get(reverse('books'))
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('books'))
+        self.assertEqual(resp['Content-Language'], 'ru')
+
+    def test_query_string_is_part_of_key(self):
+        self.client.get(reverse('books'))
+        resp = self.client.get(reverse('books'), {'q': 'Анна'})
+        self.assertNotContains(resp, 'Война и мир')
+
+    def test_copy_status_change_invalidates_book_page(self):
+        self.assertContains(self.client.get(self.book_url()), 'Доступна')
+        reserve_copy(self.copy.pk, self.user, datetime.date.today())
+        self.assertContains(self.client.get(self.book_url()), 'В использовании')
+
+    def test_related_changes_invalidate(self):
+        self.client.get(self.book_url())
+        self.client.get(reverse('books'))
+        # сигналы сбрасывают кэш после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            self.genre.name = 'Эпопея'
+            self.genre.save()
+        self.assertContains(self.client.get(self.book_url()), 'Эпопея')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.last_name = 'Толстой-старший'
+            self.author.save()
+        self.assertContains(self.client.get(reverse('books')), 'Толстой-старший')
+        self.assertContains(self.client.get(self.book_url()), 'Толстой-старший')
+
+    def test_moving_book_invalidates_old_author(self):
+        url = reverse('author_detail', kwargs={'pk': self.author.pk})
+        self.assertContains(self.client.get(url), 'Война и мир')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.author = Author.objects.create(first_name='Антон', last_name='Чехов')
+            self.book.save()
+        self.assertNotContains(self.client.get(url), 'Война и мир')
+
+    def test_invalidation_waits_for_commit(self):
+        self.assertContains(self.client.get(self.book_url()), 'Война и мир')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book.title = 'Анна Каренина'
+            self.book.save()
+            # до коммита новая страница не строится под новым поколением со старыми строками
+            self.assertContains(self.client.get(self.book_url()), 'Война и мир')
+        for callback in callbacks:
+            callback()
+        self.assertContains(self.client.get(self.book_url()), 'Анна Каренина')
+
+    def test_reserve_button_depends_on_user(self):
+        self.assertNotContains(self.client.get(self.book_url()), 'Арендовать')
+        self.client.login(username='reader', password='12345')
+        self.assertContains(self.client.get(self.book_url()), 'Арендовать')
+        self.assertContains(self.client.get(self.book_url()), 'reader')
+        self.client.logout()
+        self.assertNotContains(self.client.get(self.book_url()), 'Арендовать')
@@ -0,0 +1,204 @@
+import datetime
+import threading
+import uuid
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from catalog import circulation
+from catalog.circulation import (
+    CONFLICT, DONE, NOT_FOUND, CirculationConflict, mark_maintenance, renew_copies, reserve_copy, return_copies,
+    return_copy,
+)
+from catalog.counters import get_counters, rebuild_counters
+from catalog.models import Book, BookInstance
+
+
+class ReservationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='12345')
+        cls.other = User.objects.create_user(username='other', password='12345')
+        cls.book = Book.objects.create(title='Book', summary='s', isbn='1')
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='imprint', status='a')
+
+    def test_reserve_and_return(self):
+        rebuild_counters()
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        reserve_copy(self.copy.pk, self.user, due_back)
+        self.copy.refresh_from_db()
+        self.assertEqual((self.copy.status, self.copy.borrower, self.copy.due_back), ('o', self.user, due_back))
+        self.assertEqual(get_counters()['num_instance_available'], 0)
+        with self.assertRaises(CirculationConflict):
+            reserve_copy(self.copy.pk, self.other, due_back)
+        return_copy(self.copy.pk)
+        self.copy.refresh_from_db()
+        self.assertEqual((self.copy.status, self.copy.borrower, self.copy.due_back), ('a', None, None))
+        self.assertEqual(get_counters()['num_instance_available'], 1)
+        with self.assertRaises(CirculationConflict):
+            return_copy(self.copy.pk)
+
+    def test_reserve_view_conflict(self):
+        BookInstance.objects.filter(pk=self.copy.pk).update(status='o', borrower=self.other)
+        self.client.login(username='reader', password='12345')
+        resp = self.client.post(reverse('reserve_book', kwargs={'pk': self.copy.pk}), {'due_back': datetime.date.today()})
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).borrower, self.other)
+
+    def test_reserve_view_success(self):
+        self.client.login(username='reader', password='12345')
+        resp = self.client.post(reverse('reserve_book', kwargs={'pk': self.copy.pk}), {'due_back': datetime.date.today()})
+        self.assertRedirects(resp, reverse('books'))
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).borrower, self.user)
+        resp = self.client.post(reverse('return_book', kwargs={'pk': self.copy.pk}))
+        self.assertRedirects(resp, reverse('books'))
+        resp = self.client.post(reverse('return_book', kwargs={'pk': self.copy.pk}))
+        self.assertEqual(resp.status_code, 409)
+
+
+class BulkCirculationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='12345')
+        cls.librarian = User.objects.create_superuser(username='librarian', password='12345')
+        cls.books = [Book.objects.create(title=f'Book {num}', summary='s', isbn=str(num)) for num in range(3)]
+        due_back = datetime.date.today()
+        cls.loaned = [BookInstance.objects.create(book=cls.books[num % 3], imprint='imprint', status='o',
+                                                  borrower=cls.user, due_back=due_back) for num in range(6)]
+        cls.available = BookInstance.objects.create(book=cls.books[0], imprint='imprint', status='a')
+
+    def setUp(self):
+        rebuild_counters()
+
+    def assertCountersConsistent(self):
+        counted = get_counters()['num_instance_available']
+        self.assertEqual(counted, BookInstance.objects.filter(status='a').count())
+        for book in Book.objects.all():
+            self.assertEqual(book.available_copies, book.bookinstance_set.filter(status='a').count())
+
+    def test_return_reports_each_copy(self):
+        missing = uuid.uuid4()
+        pks = [copy.pk for copy in self.loaned] + [self.available.pk, missing]
+        # savepoint, чтение статусов, один UPDATE экземпляров, общий счетчик,
+        # проверка очередей на книги, available_copies одним UPDATE (у всех книг delta=+2),
+        # события одним INSERT, release
+        with self.assertNumQueries(8):
+            outcomes = return_copies(pks)
+        self.assertEqual(list(outcomes), pks)
+        self.assertEqual(outcomes[self.available.pk], CONFLICT)
+        self.assertEqual(outcomes[missing], NOT_FOUND)
+        self.assertEqual([outcomes[copy.pk] for copy in self.loaned], [DONE] * 6)
+        self.assertFalse(BookInstance.objects.filter(borrower__isnull=False).exists())
+        self.assertCountersConsistent()
+
+    def test_renew_and_maintenance(self):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        outcomes = renew_copies([self.loaned[0].pk, self.available.pk], due_back)
+        self.assertEqual(list(outcomes.values()), [DONE, CONFLICT])
+        self.assertEqual(BookInstance.objects.get(pk=self.loaned[0].pk).due_back, due_back)
+        outcomes = mark_maintenance([self.loaned[1].pk, self.available.pk])
+        self.assertEqual(list(outcomes.values()), [DONE, DONE])
+        self.assertEqual(BookInstance.objects.filter(status='m').count(), 2)
+        self.assertCountersConsistent()
+
+    def test_batches(self):
+        pks = [copy.pk for copy in self.loaned]
+        original = circulation.BULK_BATCH_SIZE
+        circulation.BULK_BATCH_SIZE = 4
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                outcomes = return_copies(pks)
+        finally:
+            circulation.BULK_BATCH_SIZE = original
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "catalog_bookinstance"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(set(outcomes.values()), {DONE})
+        self.assertCountersConsistent()
+
+    def test_console_bulk_view(self):
+        self.client.login(username='librarian', password='12345')
+        back = reverse('my_tools') + '?sort=-due_back'
+        resp = self.client.post(reverse('bulk_circulation'), {
+            'action': 'return', 'copies': [self.loaned[0].pk, self.available.pk], 'next': back,
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['done'], 1)
+        self.assertContains(resp, 'статус экземпляра не позволяет')
+        self.assertContains(resp, f'href="{back}"')
+        self.assertEqual(BookInstance.objects.get(pk=self.loaned[0].pk).status, 'a')
+
+    def test_console_bulk_view_validates(self):
+        self.client.login(username='librarian', password='12345')
+        pks = [self.loaned[0].pk]
+        for data in [
+            {'action': 'renew', 'copies': pks, 'due_back': datetime.date.today() - datetime.timedelta(days=1)},
+            {'action': 'renew', 'copies': pks},
+            {'action': 'return', 'copies': ['not-a-uuid']},
+            {'action': 'return'},
+        ]:
+            self.assertEqual(self.client.post(reverse('bulk_circulation'), data).status_code, 400, data)
+        resp = self.client.post(reverse('bulk_circulation'), {'action': 'return', 'copies': pks,
+                                                              'next': 'https://example.com/'})
+        self.assertEqual(resp.context['back'], reverse('my_tools'))
+        self.assertEqual(BookInstance.objects.filter(status='o').count(), 5)
+
+    def test_console_bulk_view_permission(self):
+        self.client.login(username='reader', password='12345')
+        resp = self.client.post(reverse('bulk_circulation'), {'action': 'return', 'copies': [self.loaned[0].pk]})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(BookInstance.objects.get(pk=self.loaned[0].pk).status, 'o')
+
+    def test_admin_actions(self):
+        self.client.login(username='librarian', password='12345')
+        url = reverse('admin:catalog_bookinstance_changelist')
+        resp = self.client.post(url, {
+            'action': 'return_selected', '_selected_action': [self.loaned[0].pk, self.available.pk],
+        }, follow=True)
+        messages = [str(message) for message in resp.context['messages']]
+        self.assertIn('Выполнено: 1 из 2', messages)
+        self.assertIn(f'{self.available.pk}: статус экземпляра не позволяет', messages)
+        self.client.post(url, {'action': 'renew_selected', '_selected_action': [self.loaned[1].pk]})
+        self.assertEqual(BookInstance.objects.get(pk=self.loaned[1].pk).due_back,
+                         datetime.date.today() + datetime.timedelta(weeks=3))
+        self.assertCountersConsistent()
+
+
+class ConcurrentReservationStressTest(TransactionTestCase):
+    # много потоков одновременно пытаются взять один экземпляр - выиграть должен ровно один
+    threads = 16
+
+    def test_only_one_reservation_wins(self):
+        users = [User.objects.create_user(username='reader%s' % num) for num in range(self.threads)]
+        book = Book.objects.create(title='Book', summary='s', isbn='1')
+        copy = BookInstance.objects.create(book=book, imprint='imprint', status='a')
+        rebuild_counters()
+        barrier = threading.Barrier(self.threads)
+        results = []
+
+        def reserve(user):
+            # тестовая база - файл, транзакции начинаются с BEGIN IMMEDIATE (settings.DATABASES):
+            # потоки ждут блокировку записи до timeout, а не получают "database is locked"
+            try:
+                barrier.wait()
+                reserve_copy(copy.pk, user, datetime.date.today())
+                results.append(user)
+            except CirculationConflict:
+                results.append(None)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=reserve, args=(user,)) for user in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        winners = [user for user in results if user is not None]
+        self.assertEqual(len(results), self.threads)
+        self.assertEqual(len(winners), 1)
+        copy.refresh_from_db()
+        self.assertEqual(copy.borrower, winners[0])
+        self.assertEqual(get_counters()['num_instance_available'], 0)
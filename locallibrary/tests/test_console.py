@@ -0,0 +1,140 @@
+import datetime
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+from catalog.forms import ConsoleFilterForm
+from catalog.models import Author, Book, BookInstance
+from catalog.typeahead import typeahead
+from tests.utils import QueryCountMixin
+
+
+class LibrarianConsoleTest(QueryCountMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='12345', is_staff=True)
+        cls.librarian.user_permissions.add(*Permission.objects.filter(codename__in=['can_mark_returned', 'can_edit']))
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        other = User.objects.create_user(username='other', password='12345')
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        Author.objects.create(first_name='Антон', last_name='Чехов')
+        cls.book = Book.objects.create(title='Война и мир', summary='s', isbn='1', author=cls.author)
+        cls.other_book = Book.objects.create(title='Анна Каренина', summary='s', isbn='2', author=cls.author)
+        today = datetime.date.today()
+        for num in range(30):
+            BookInstance.objects.create(
+                book=cls.book if num % 2 else cls.other_book, imprint='АСТ',
+                borrower=cls.reader if num % 3 else other, status='r' if num % 5 == 0 else 'o',
+                due_back=today + datetime.timedelta(days=num - 5),
+            )
+        # не выдан - в консоли не показывается
+        BookInstance.objects.create(book=cls.book, imprint='АСТ', status='a')
+
+    def setUp(self):
+        self.client.login(username='librarian', password='12345')
+
+    def walk(self, params=None):
+        params = dict(params or {})
+        copies = []
+        while True:
+            resp = self.client.get(reverse('my_tools'), params)
+            self.assertEqual(resp.status_code, 200)
+            copies += resp.context['instances']
+            if not resp.context['page_obj'].has_next:
+                return copies
+            params['after'] = resp.context['page_obj'].next_cursor
+
+    def test_requires_permissions(self):
+        self.client.login(username='reader', password='12345')
+        self.assertEqual(self.client.get(reverse('my_tools')).status_code, 403)
+
+    def test_pages_in_both_orders(self):
+        copies = self.walk()
+        self.assertEqual(len(copies), 30)
+        self.assertEqual([c.due_back for c in copies], sorted(c.due_back for c in copies))
+        desc = self.walk({'sort': '-due_back'})
+        self.assertEqual([c.pk for c in desc], [c.pk for c in reversed(copies)])
+
+    def test_filters(self):
+        today = datetime.date.today()
+        copies = self.walk({'borrower': 'reader', 'status': 'o', 'book': self.book.pk})
+        self.assertTrue(copies)
+        self.assertTrue(all((c.borrower, c.status, c.book) == (self.reader, 'o', self.book) for c in copies))
+        self.assertEqual(len(self.walk({'author': self.author.pk})), 30)
+        self.assertEqual(self.walk({'author': Author.objects.get(last_name='Чехов').pk}), [])
+        overdue = self.walk({'overdue': '1'})
+        self.assertEqual({c.pk for c in overdue},
+                         set(BookInstance.objects.filter(status='o', due_back__lt=today).values_list('pk', flat=True)))
+        self.assertTrue(all(c.is_overdue for c in overdue))
+        # неверное значение фильтра не применяется
+        self.assertEqual(len(self.walk({'status': 'x'})), 30)
+        # статусы без читателя в консоли не выбираются
+        self.assertNotIn('a', dict(ConsoleFilterForm.base_fields['status'].choices))
+        self.assertEqual(len(self.walk({'status': 'a'})), 30)
+
+    def test_filters_are_kept_in_page_links(self):
+        resp = self.client.get(reverse('my_tools'), {'book': self.book.pk})
+        self.assertContains(resp, 'value="Война и мир"')
+        resp = self.client.get(reverse('my_tools'), {'borrower': '', 'sort': '-due_back'})
+        self.assertIn('sort=-due_back', resp.context['next_page_query'])
+
+    def test_no_full_preloads(self):
+        resp = self.client.get(reverse('my_tools'))
+        self.assertNotIn('authors', resp.context)
+        self.assertNotIn('books', resp.context)
+        self.assertNotContains(resp, 'Чехов')
+        self.assertConstantQueries(reverse('my_tools'), lambda: BookInstance.objects.create(
+            book=Book.objects.create(title='Книга', summary='s', isbn='4', author=self.author),
+            imprint='АСТ', borrower=self.reader, status='o', due_back=datetime.date.today(),
+        ))
+
+    def test_book_create_picks_author_by_autocomplete(self):
+        resp = self.client.get(reverse('book_create'))
+        self.assertContains(resp, 'data-autocomplete-url="%s"' % reverse('api_autocomplete_authors'))
+        self.assertNotContains(resp, 'Чехов')
+
+
+class AutocompleteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        librarian = User.objects.create_user(username='librarian', password='12345')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_edit'))
+        User.objects.create_user(username='reader', password='12345')
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        Author.objects.create(first_name='Алексей', last_name='Толстой')
+        Author.objects.create(first_name='Антон', last_name='Чехов')
+        for num in range(15):
+            Book.objects.create(title='Книга %02d' % num, summary='s', isbn=str(num), author=cls.author)
+
+    def setUp(self):
+        # данные setUpTestData откатываются без сигналов - индекс подсказок строится заново
+        typeahead.build()
+        self.client.login(username='librarian', password='12345')
+
+    def test_authors(self):
+        resp = self.client.get(reverse('api_autocomplete_authors'), {'q': 'Тол'})
+        self.assertEqual([item['text'] for item in resp.json()['results']], ['Толстой, Алексей', 'Толстой, Лев'])
+        self.assertEqual(resp.json()['results'][1]['id'], self.author.pk)
+
+    def test_prefix_ignores_case_of_cyrillic(self):
+        for q in ('тол', 'ТОЛ', 'лев'):
+            resp = self.client.get(reverse('api_autocomplete_authors'), {'q': q})
+            self.assertIn(self.author.pk, [item['id'] for item in resp.json()['results']], q)
+
+    def test_books_limited(self):
+        with self.assertNumQueries(4):
+            # сессия, пользователь и два запроса прав; варианты - из индекса в памяти
+            resp = self.client.get(reverse('api_autocomplete_books'), {'q': 'книга'})
+        results = resp.json()['results']
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0]['text'], 'Книга 00')
+        self.assertEqual(self.client.get(reverse('api_autocomplete_books')).json(), {'results': []})
+
+    def test_requires_permission(self):
+        self.client.login(username='reader', password='12345')
+        resp = self.client.get(reverse('api_autocomplete_books'), {'q': 'К'})
+        self.assertEqual(resp.status_code, 403)
+        self.assertIn('error', resp.json())
+        # форма книги с этим полем требует то же право
+        self.assertEqual(self.client.get(reverse('book_create')).status_code, 403)
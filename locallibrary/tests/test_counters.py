@@ -0,0 +1,78 @@
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from catalog.circulation import checkout_copies
+from catalog.counters import COUNTERS, adjust_available_copies_many, get_counters, rebuild_counters
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class CatalogCounterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.book = Book.objects.create(title='Война и мир', summary='...', isbn='1234567890123', author=cls.author)
+        Genre.objects.create(name='Роман')
+        BookInstance.objects.create(book=cls.book, imprint='2020', status='a')
+        BookInstance.objects.create(book=cls.book, imprint='2021', status='o')
+
+    def setUp(self):
+        rebuild_counters()
+
+    def assertCountersMatchDatabase(self):
+        expected = {name: count() for name, count in COUNTERS.items()}
+        self.assertEqual(get_counters(), expected)
+
+    def test_rebuild(self):
+        self.assertEqual(get_counters()['num_instance'], 2)
+        self.assertEqual(get_counters()['num_instance_available'], 1)
+
+    def test_create_and_delete_are_tracked(self):
+        Genre.objects.create(name='Драма')
+        Author.objects.create(first_name='Антон', last_name='Чехов')
+        copy = BookInstance.objects.create(book=self.book, imprint='2022')
+        self.assertCountersMatchDatabase()
+        copy.delete()
+        Book.objects.create(title='', summary='...', isbn='1')
+        self.assertCountersMatchDatabase()
+        self.book.delete()
+        self.assertCountersMatchDatabase()
+
+    def test_status_and_title_changes_are_tracked(self):
+        copy = BookInstance.objects.get(status='o')
+        copy.status = 'a'
+        copy.save()
+        self.assertCountersMatchDatabase()
+        copy = BookInstance.objects.only('pk').get(pk=copy.pk)
+        copy.status = 'm'
+        copy.save()
+        self.assertCountersMatchDatabase()
+        self.book.title = ''
+        self.book.save()
+        self.assertCountersMatchDatabase()
+
+    def test_drifted_available_copies_do_not_go_negative(self):
+        # счетчик обнулен в обход сигналов, а экземпляр на полке есть - выдача не должна падать
+        Book.objects.filter(pk=self.book.pk).update(available_copies=0)
+        checkout_copies([BookInstance.objects.get(status='a').pk], User.objects.create_user('reader'),
+                        datetime.date.today())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        adjust_available_copies_many({self.book.pk: -2})
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+
+    def test_index_reads_counters_in_one_query(self):
+        with self.assertNumQueries(1):
+            get_counters()
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.context['num_books'], 1)
+        self.assertEqual(resp.context['num_instance_available'], 1)
+
+    def test_management_command(self):
+        BookInstance.objects.update(status='a')
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(get_counters()['num_instance_available'], 2)
@@ -0,0 +1,99 @@
+import io
+import shutil
+import tempfile
+from io import StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from catalog.models import Book
+from catalog.views import serve_cover
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(size=(800, 1200), fmt='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, fmt)
+    return SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CATALOG_COVERS_ASYNC=False, CATALOG_PAGE_CACHE_TIMEOUT=0)
+class CoverPipelineTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_book(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='Book', summary='s', isbn='1', cover=make_image())
+        book.refresh_from_db()
+        return book
+
+    def test_upload_generates_hashed_variants(self):
+        book = self.create_book()
+        self.assertEqual(sorted(book.cover_variants['webp']), ['160', '320', '640'])
+        self.assertIn('jpeg', book.cover_variants)
+        name = book.cover_variants['webp']['160']
+        self.assertRegex(name, r'^covers/v/[0-9a-f]{16}-160\.webp$')
+        with Image.open(f'{MEDIA_ROOT}/{name}') as image:
+            self.assertEqual(image.size, (160, 240))
+
+    def test_list_and_detail_use_srcset(self):
+        book = self.create_book()
+        resp = self.client.get(reverse('books'))
+        self.assertContains(resp, 'type="image/webp"')
+        self.assertContains(resp, '160w')
+        resp = self.client.get(reverse('book_detail', kwargs={'pk': book.pk}))
+        self.assertContains(resp, 'srcset=')
+
+    def test_variants_served_with_long_cache_headers(self):
+        book = self.create_book()
+        path = book.cover_variants['jpeg']['160'].removeprefix('covers/')
+        resp = serve_cover(RequestFactory().get('/media/covers/' + path), path)
+        self.assertIn('immutable', resp['Cache-Control'])
+
+    def test_management_command_thread_pool(self):
+        # обложка загружена в обход сигналов (например, импортом) - копий еще нет
+        book = Book.objects.create(title='Book', summary='s', isbn='1')
+        name = default_storage.save('covers/imported.jpg', make_image((300, 300)))
+        Book.objects.filter(pk=book.pk).update(cover=name)
+        out = StringIO()
+        call_command('process_covers', workers=2, stdout=out)
+        book.refresh_from_db()
+        self.assertEqual(sorted(book.cover_variants['jpeg']), ['160'])
+        self.assertIn('Обработано обложек: 1', out.getvalue())
+
+    def test_management_command_process_pool(self):
+        # пул процессов запускается через spawn: дочерние процессы не видят
+        # override_settings, поэтому хранилище остается в основном процессе
+        book = Book.objects.create(title='Book', summary='s', isbn='1')
+        name = default_storage.save('covers/imported.jpg', make_image((300, 300)))
+        Book.objects.filter(pk=book.pk).update(cover=name)
+        out = StringIO()
+        call_command('process_covers', workers=1, processes=True, stdout=out)
+        book.refresh_from_db()
+        self.assertEqual(sorted(book.cover_variants['jpeg']), ['160'])
+        self.assertTrue(default_storage.exists(book.cover_variants['jpeg']['160']))
+
+    def test_new_cover_removes_previous_variants(self):
+        # у книг с одинаковой обложкой копии общие (имя - хэш исходника)
+        book, other = self.create_book(), self.create_book()
+        old = book.cover_variants['jpeg']['160']
+        self.assertEqual(other.cover_variants['jpeg']['160'], old)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.cover = make_image((500, 500))
+            other.save()
+        other.refresh_from_db()
+        self.assertNotEqual(other.cover_variants['jpeg']['160'], old)
+        self.assertTrue(default_storage.exists(old))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.cover = make_image((400, 400))
+            book.save()
+        self.assertFalse(default_storage.exists(old))
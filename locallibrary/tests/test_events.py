@@ -0,0 +1,108 @@
+import datetime
+from io import StringIO
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from catalog.circulation import mark_maintenance, renew_copy, reserve_copy, return_copies, return_copy
+from catalog.models import (
+    Author, Book, BookInstance, CirculationEvent, DailyAuthorLoans, DailyBookLoans, DailyGenreLoans, Genre,
+)
+from catalog.rollups import most_borrowed_books, rollup_circulation
+
+
+class CirculationEventTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        cls.librarian = User.objects.create_user(username='librarian', password='12345')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        cls.book = Book.objects.create(title='Book', summary='s', isbn='1')
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint='imprint', status='a') for _ in range(3)]
+
+    def test_single_copy_transitions(self):
+        copy = self.copies[0]
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        reserve_copy(copy.pk, self.reader, due_back)
+        renew_copy(copy.pk, due_back + datetime.timedelta(weeks=1))
+        return_copy(copy.pk)
+        events = list(copy.events.values_list('action', 'status_from', 'status_to', 'borrower_id', 'due_back', 'book_id'))
+        self.assertEqual(events, [
+            ('checkout', 'a', 'o', self.reader.pk, due_back, self.book.pk),
+            ('renew', 'o', 'o', self.reader.pk, due_back + datetime.timedelta(weeks=1), self.book.pk),
+            # возврат хранит читателя и срок, которые у экземпляра стерлись
+            ('return', 'o', 'a', self.reader.pk, due_back + datetime.timedelta(weeks=1), self.book.pk),
+        ])
+
+    def test_bulk_transitions_write_events_for_done_copies(self):
+        reserve_copy(self.copies[0].pk, self.reader, datetime.date.today())
+        return_copies([self.copies[0].pk, self.copies[1].pk])
+        mark_maintenance([self.copies[2].pk])
+        self.assertEqual(
+            list(CirculationEvent.objects.values_list('action', 'copy_id', 'status_to')),
+            [('checkout', self.copies[0].pk, 'o'), ('return', self.copies[0].pk, 'a'),
+             ('maintenance', self.copies[2].pk, 'm')],
+        )
+
+    def test_renew_view_records_event(self):
+        copy = self.copies[0]
+        reserve_copy(copy.pk, self.reader, datetime.date.today())
+        self.client.force_login(self.librarian)
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        resp = self.client.post(reverse('book_renew', kwargs={'pk': copy.pk}), {'due_back': due_back})
+        self.assertRedirects(resp, reverse('my_tools'), fetch_redirect_response=False)
+        self.assertEqual(copy.events.last().action, 'renew')
+        # доступный экземпляр продлевать нечего
+        resp = self.client.post(reverse('book_renew', kwargs={'pk': self.copies[1].pk}), {'due_back': due_back})
+        self.assertContains(resp, 'продлевать нечего')
+        self.assertFalse(self.copies[1].events.exists())
+
+
+class RollupTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        genres = [Genre.objects.create(name='Роман'), Genre.objects.create(name='Драма')]
+        cls.books = [Book.objects.create(title=f'Книга {num}', summary='s', isbn=str(num), author=author)
+                     for num in range(2)]
+        cls.books[0].genre.set(genres)
+        cls.copies = [BookInstance.objects.create(book=book, imprint='i', status='a') for book in cls.books]
+
+    def loan(self, copy, days_ago):
+        reserve_copy(copy.pk, self.reader, datetime.date.today())
+        return_copy(copy.pk)
+        CirculationEvent.objects.filter(copy=copy, created__gte=timezone.now() - datetime.timedelta(minutes=1)).update(
+            created=timezone.now() - datetime.timedelta(days=days_ago),
+        )
+
+    def test_incremental_rollup(self):
+        self.assertIsNone(rollup_circulation())
+        self.loan(self.copies[0], 3)
+        self.loan(self.copies[0], 3)
+        self.loan(self.copies[1], 3)
+        self.loan(self.copies[0], 0)
+        rollup_circulation()
+        day = timezone.localdate() - datetime.timedelta(days=3)
+        self.assertEqual(DailyBookLoans.objects.get(day=day, book=self.books[0]).loans, 2)
+        self.assertEqual(DailyGenreLoans.objects.filter(day=day).count(), 2)
+        self.assertEqual(DailyAuthorLoans.objects.get(day=day).loans, 3)
+        self.assertEqual(most_borrowed_books(day), [(self.books[0], 3), (self.books[1], 1)])
+
+        # повторный запуск пересчитывает только последний день, старые строки не трогает
+        old = DailyBookLoans.objects.get(day=day, book=self.books[0]).pk
+        self.loan(self.copies[1], 0)
+        rollup_circulation()
+        self.assertEqual(DailyBookLoans.objects.get(day=day, book=self.books[0]).pk, old)
+        self.assertEqual(DailyBookLoans.objects.get(day=timezone.localdate(), book=self.books[1]).loans, 1)
+        self.assertEqual(most_borrowed_books(timezone.localdate()), [(self.books[0], 1), (self.books[1], 1)])
+
+    def test_command(self):
+        self.loan(self.copies[1], 0)
+        out = StringIO()
+        call_command('rollup_circulation', full=True, top=5, stdout=out)
+        self.assertIn('dailybookloans: 1', out.getvalue())
+        self.assertIn('Книга 1', out.getvalue())
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from catalog.export import iter_books
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class ExportCatalogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        genre = Genre.objects.create(name='Роман')
+        cls.books = []
+        for num in range(5):
+            book = Book.objects.create(title='Книга %s' % num, summary='s', isbn=str(num), author=author)
+            book.genre.add(genre)
+            for status in ('a', 'o')[:num % 3]:
+                BookInstance.objects.create(book=book, imprint='АСТ', status=status)
+            cls.books.append(book)
+        User.objects.create_user(username='staff', password='12345', is_staff=True)
+        User.objects.create_user(username='reader', password='12345')
+
+    def export(self, **options):
+        out = StringIO()
+        call_command('export_catalog', stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_jsonl(self):
+        records = [json.loads(line) for line in self.export(format='jsonl').splitlines()]
+        self.assertEqual([r['id'] for r in records], [b.pk for b in self.books])
+        self.assertEqual(records[0]['author'], 'Толстой, Лев')
+        self.assertEqual(records[0]['genres'], ['Роман'])
+        self.assertEqual([len(r['copies']) for r in records], [0, 1, 2, 0, 1])
+
+    def test_csv_has_row_per_copy(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(format='csv'))))
+        # книги без экземпляров дают по одной строке: 1 + 1 + 2 + 1 + 1
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['copy_id'], '')
+
+    def test_query_count_does_not_depend_on_size(self):
+        # один курсор по книгам + жанры и экземпляры на каждую пачку
+        with self.assertNumQueries(3):
+            self.export(format='jsonl', chunk_size=100)
+        with self.assertNumQueries(7):
+            self.export(format='jsonl', chunk_size=2)
+
+    def output_paths(self, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        checkpoint = path + '.checkpoint'
+        self.addCleanup(os.remove, path)
+        # после полной выгрузки контрольной точки уже нет
+        self.addCleanup(lambda: os.path.exists(checkpoint) and os.remove(checkpoint))
+        return path, checkpoint
+
+    def test_resume_from_checkpoint(self):
+        path, checkpoint = self.output_paths('.jsonl')
+        with open(checkpoint, 'w') as f:
+            f.write(str(self.books[2].pk))
+        self.export(format='jsonl', output=path, checkpoint=checkpoint)
+        with open(path) as f:
+            ids = [json.loads(line)['id'] for line in f]
+        self.assertEqual(ids, [b.pk for b in self.books[3:]])
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_repeated_export_is_complete(self):
+        # ночная выгрузка с одним и тем же --checkpoint каждый раз пишет файл целиком
+        path, checkpoint = self.output_paths('.jsonl')
+        for _ in range(2):
+            self.export(format='jsonl', output=path, checkpoint=checkpoint, chunk_size=2)
+            with open(path) as f:
+                ids = [json.loads(line)['id'] for line in f]
+            self.assertEqual(ids, [b.pk for b in self.books])
+            self.assertFalse(os.path.exists(checkpoint))
+
+    def test_resume_truncates_rows_after_checkpoint(self):
+        path, checkpoint = self.output_paths('.csv')
+
+        def crash_after_three(after, chunk_size):
+            for num, book in enumerate(iter_books(after, chunk_size)):
+                if num == 3:
+                    raise RuntimeError('сбой')
+                yield book
+
+        # контрольная точка после второй книги, третья успела попасть в файл до сбоя
+        with mock.patch('catalog.management.commands.export_catalog.iter_books', crash_after_three):
+            with self.assertRaises(RuntimeError):
+                self.export(format='csv', output=path, checkpoint=checkpoint, chunk_size=2)
+        self.export(format='csv', output=path, checkpoint=checkpoint, chunk_size=2)
+        with open(path, newline='') as f:
+            resumed = f.read()
+        self.assertEqual(resumed, self.export(format='csv'))
+
+    def test_after_without_checkpoint_overwrites(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as f:
+            f.write('old\n')
+        self.export(format='csv', output=path, after=self.books[2].pk)
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual({row['book_id'] for row in rows}, {str(b.pk) for b in self.books[3:]})
+
+    def test_streaming_endpoint_is_staff_only(self):
+        self.client.login(username='reader', password='12345')
+        resp = self.client.get(reverse('export_catalog'))
+        self.assertEqual(resp.status_code, 302)
+        self.client.login(username='staff', password='12345')
+        resp = self.client.get(reverse('export_catalog'), {'format': 'ndjson', 'after': self.books[3].pk})
+        self.assertTrue(resp.streaming)
+        lines = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.books[4].pk])
@@ -0,0 +1,152 @@
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from catalog.circulation import (
+    CONFLICT, CirculationConflict, checkout_copies, mark_maintenance, renew_copies, renew_copy, reserve_copy,
+    return_copies, return_copy,
+)
+from catalog.counters import get_counters, rebuild_counters
+from catalog.holds import HoldError, cancel_hold, next_holds, place_hold, queue_position
+from catalog.models import Book, BookInstance, CirculationEvent, Hold
+
+
+class HoldQueueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'reader{num}', password='12345') for num in range(4)]
+        cls.book = Book.objects.create(title='Book', summary='s', isbn='1')
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint='imprint', status='a') for _ in range(2)]
+
+    def setUp(self):
+        for copy in self.copies:
+            reserve_copy(copy.pk, self.users[0], datetime.date.today())
+        self.book.refresh_from_db()
+
+    def test_fifo_with_priority(self):
+        first = place_hold(self.book, self.users[1])
+        second = place_hold(self.book, self.users[2])
+        urgent = place_hold(self.book, self.users[3], priority=1)
+        self.assertEqual([queue_position(hold) for hold in (urgent, first, second)], [1, 2, 3])
+        self.assertEqual(list(next_holds(self.book.pk, 2)), [urgent, first])
+        with self.assertRaises(HoldError):
+            place_hold(self.book, self.users[1])
+        self.assertTrue(cancel_hold(first.pk, self.users[1]))
+        self.assertFalse(cancel_hold(first.pk, self.users[1]))
+        self.assertEqual(queue_position(second), 2)
+
+    def test_no_hold_while_copies_available(self):
+        return_copy(self.copies[0].pk)
+        # book загружен до возврата: доступность перечитывается из базы
+        self.assertEqual(self.book.available_copies, 0)
+        with self.assertRaises(HoldError):
+            place_hold(self.book, self.users[1])
+        self.assertFalse(Hold.objects.exists())
+
+    def test_return_hands_copy_to_next_holder(self):
+        rebuild_counters()
+        hold = place_hold(self.book, self.users[1])
+        return_copy(self.copies[0].pk)
+        copy = BookInstance.objects.get(pk=self.copies[0].pk)
+        self.assertEqual((copy.status, copy.borrower), ('r', self.users[1]))
+        hold.refresh_from_db()
+        self.assertEqual((hold.status, hold.copy_id), ('f', copy.pk))
+        # экземпляр так и не стал доступным
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(get_counters()['num_instance_available'], 0)
+        self.assertEqual(list(copy.events.values_list('action', 'status_to')), [('checkout', 'o'), ('return', 'a'), ('hold', 'r')])
+
+        # выдать отложенный экземпляр можно только тому, кому он отложен
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        self.assertEqual(checkout_copies([copy.pk], self.users[2], due_back), {copy.pk: 'conflict'})
+        self.assertEqual(checkout_copies([copy.pk], self.users[1], due_back), {copy.pk: 'done'})
+
+        # очередь пуста - следующий возврат делает экземпляр доступным
+        return_copy(copy.pk)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+    def test_bulk_return_serves_queue_in_order(self):
+        holds = [place_hold(self.book, user) for user in self.users[1:]]
+        return_copies([copy.pk for copy in self.copies])
+        self.assertEqual(
+            sorted(BookInstance.objects.values_list('status', 'borrower')),
+            [('r', self.users[1].pk), ('r', self.users[2].pk)],
+        )
+        self.assertEqual(queue_position(holds[2]), 1)
+        self.assertEqual(CirculationEvent.objects.filter(action='hold').count(), 2)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+
+    def test_views(self):
+        self.client.force_login(self.users[1])
+        url = reverse('hold_book', kwargs={'pk': self.book.pk})
+        self.assertContains(self.client.get(reverse('book_detail', kwargs={'pk': self.book.pk})), url)
+        self.assertContains(self.client.get(url), 'Встать в очередь')
+        self.assertRedirects(self.client.post(url), reverse('my_books'))
+        self.assertEqual(self.client.post(url).status_code, 409)
+        hold = Hold.objects.get()
+        resp = self.client.get(reverse('my_books'))
+        self.assertContains(resp, 'Место в очереди: 1')
+        self.client.post(reverse('cancel_hold', kwargs={'pk': hold.pk}))
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, 'c')
+
+    def test_uncollected_copy_expires_to_next_holder(self):
+        rebuild_counters()
+        first, second = place_hold(self.book, self.users[1]), place_hold(self.book, self.users[2])
+        return_copy(self.copies[0].pk)
+        copy = BookInstance.objects.with_overdue(datetime.date.today() + datetime.timedelta(weeks=1)).get(
+            pk=self.copies[0].pk)
+        # срок получения - не срок возврата
+        self.assertFalse(copy.is_overdue)
+        # до срока получения ничего не снимается
+        call_command('expire_holds', stdout=StringIO())
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).borrower, self.users[1])
+
+        call_command('expire_holds', date=copy.due_back + datetime.timedelta(days=1), stdout=StringIO())
+        copy = BookInstance.objects.get(pk=copy.pk)
+        self.assertEqual((copy.status, copy.borrower), ('r', self.users[2]))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ('e', 'f'))
+        self.assertEqual(list(copy.events.values_list('action', flat=True))[-2:], ['release', 'hold'])
+
+        # очереди больше нет - экземпляр возвращается на полку
+        call_command('expire_holds', date=copy.due_back + datetime.timedelta(days=1), stdout=StringIO())
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).status, 'a')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+        self.assertEqual(get_counters()['num_instance_available'], 1)
+
+    def test_held_copy_cannot_be_renewed_or_sent_to_maintenance(self):
+        hold = place_hold(self.book, self.users[1])
+        return_copy(self.copies[0].pk)
+        hold.refresh_from_db()
+        pickup_due = BookInstance.objects.get(pk=self.copies[0].pk).due_back
+        later = datetime.date.today() + datetime.timedelta(weeks=4)
+        with self.assertRaises(CirculationConflict):
+            renew_copy(self.copies[0].pk, later)
+        self.assertEqual(renew_copies([self.copies[0].pk], later), {self.copies[0].pk: CONFLICT})
+        self.assertEqual(mark_maintenance([self.copies[0].pk]), {self.copies[0].pk: CONFLICT})
+        copy = BookInstance.objects.get(pk=self.copies[0].pk)
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('r', self.users[1], pickup_due))
+        self.assertEqual((hold.status, hold.copy_id), ('f', copy.pk))
+
+    def test_cancel_releases_held_copy(self):
+        hold = place_hold(self.book, self.users[1])
+        return_copy(self.copies[0].pk)
+        self.client.force_login(self.users[1])
+        resp = self.client.get(reverse('my_books'))
+        self.assertContains(resp, 'Отказаться')
+        self.assertNotContains(resp, 'Просрочено')
+        self.client.post(reverse('cancel_hold', kwargs={'pk': hold.pk}))
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, 'c')
+        self.assertEqual(BookInstance.objects.get(pk=self.copies[0].pk).status, 'a')
+        # выданный по заявке экземпляр отказом не снимается
+        self.assertFalse(cancel_hold(hold.pk, self.users[1]))
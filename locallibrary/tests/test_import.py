@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from catalog.counters import get_counters
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class ImportCatalogTest(TestCase):
+
+    def write(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_csv_dedupes_lookups(self):
+        Author.objects.create(first_name='Лев', last_name='Толстой')
+        path = self.write('.csv', (
+            'title,summary,isbn,author_first_name,author_last_name,language,genres,copies,imprint\n'
+            'Война и мир,Эпопея,1,Лев,Толстой,Русский,Роман;История,2,АСТ\n'
+            'Анна Каренина,Роман,2,Лев,Толстой,Русский,Роман,1,Эксмо\n'
+            'Вишнёвый сад,Пьеса,3,Антон,Чехов,Русский,Драма,3,АСТ\n'
+        ))
+        call_command('import_catalog', path, chunk_size=2, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Genre.objects.count(), 3)
+        self.assertEqual(Language.objects.count(), 1)
+        self.assertEqual(BookInstance.objects.count(), 6)
+        war = Book.objects.get(title='Война и мир')
+        self.assertEqual(sorted(g.name for g in war.genre.all()), ['История', 'Роман'])
+        self.assertEqual(war.author.last_name, 'Толстой')
+        self.assertEqual(get_counters()['num_instance_available'], 6)
+        resp = self.client.get(reverse('books'), {'q': 'Чехов'})
+        self.assertEqual([b.title for b in resp.context['book_lst']], ['Вишнёвый сад'])
+
+    def test_import_jsonl(self):
+        rows = [
+            {'title': 'Book %s' % num, 'summary': 's', 'isbn': str(num), 'author_last_name': 'Smith',
+             'genres': ['Fantasy'], 'language': 'English'}
+            for num in range(5)
+        ]
+        path = self.write('.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        with self.assertNumQueries(11):
+            call_command('import_catalog', path, chunk_size=10, no_rebuild=True, stdout=StringIO())
+        self.assertEqual(Book.objects.filter(author__last_name='Smith', genre__name='Fantasy').count(), 5)
+        self.assertEqual(BookInstance.objects.count(), 5)
+
+    def test_import_jsonl_nulls_and_copies(self):
+        rows = [
+            {'title': 'Без автора', 'summary': None, 'isbn': None, 'author_first_name': None,
+             'author_last_name': 'Аноним', 'copies': 0},
+            {'title': 'Два экземпляра', 'author_last_name': 'Аноним', 'copies': '2'},
+        ]
+        path = self.write('.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        call_command('import_catalog', path, stdout=StringIO())
+        book = Book.objects.get(title='Без автора')
+        self.assertEqual((book.summary, book.isbn, book.author.first_name), ('', '', ''))
+        self.assertEqual(book.bookinstance_set.count(), 0)
+        self.assertEqual(BookInstance.objects.count(), 2)
+
+    def test_bad_copies_names_row_and_rebuilds_committed_chunks(self):
+        rows = [{'title': f'Книга {num}', 'copies': 1} for num in range(3)] + [{'title': 'Плохая', 'copies': 'много'}]
+        path = self.write('.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        with self.assertRaisesMessage(CommandError, 'Строка 4'):
+            call_command('import_catalog', path, chunk_size=2, stdout=StringIO())
+        # первый пакет записан, счетчики и поиск пересчитаны
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(get_counters()['num_books'], 2)
+        resp = self.client.get(reverse('books'), {'q': 'Книга'})
+        self.assertEqual(len(resp.context['book_lst']), 2)
@@ -0,0 +1,54 @@
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from catalog.models import Book, BookInstance
+
+
+class OverdueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        cls.book = Book.objects.create(title='Book Title', summary='s', isbn='1')
+        cls.users = [
+            User.objects.create_user(username='reader%s' % num, password='12345',
+                                     email='reader%s@example.com' % num if num < 3 else '')
+            for num in range(4)
+        ]
+        for num, user in enumerate(cls.users):
+            for days in (-10, -1, 5):
+                BookInstance.objects.create(book=cls.book, imprint='imprint', status='o', borrower=user,
+                                            due_back=today + datetime.timedelta(days=days + num))
+        # возвращенная книга с прошедшей датой не считается просроченной выдачей
+        BookInstance.objects.create(book=cls.book, imprint='imprint', status='a',
+                                    due_back=today - datetime.timedelta(days=30))
+
+    def test_queryset_overdue_matches_property(self):
+        copies = BookInstance.objects.with_overdue()
+        for copy in copies:
+            self.assertEqual(copy.is_overdue, copy.due_back < datetime.date.today())
+        self.assertEqual(BookInstance.objects.overdue().count(), 5)
+
+    def test_my_books_uses_annotation(self):
+        self.client.login(username='reader0', password='12345')
+        # плюс один запрос заявок в очереди (их нет - позиции не считаются)
+        with self.assertNumQueries(5):
+            resp = self.client.get(reverse('my_books'))
+        self.assertContains(resp, 'Просрочено', count=2)
+
+    def test_scan_sends_one_notice_per_borrower(self):
+        out = StringIO()
+        call_command('scan_overdue', batch_size=2, stdout=out)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['reader0@example.com', 'reader1@example.com', 'reader2@example.com'])
+        self.assertEqual(mail.outbox[0].body.count('просрочено на'), 2)
+        self.assertIn('без email: 1', out.getvalue())
+
+    def test_dry_run(self):
+        call_command('scan_overdue', dry_run=True, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 0)
@@ -0,0 +1,93 @@
+import datetime
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from catalog.models import Author, Book, BookInstance
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # одинаковые фамилии проверяют, что pk разрешает совпадения ключа
+        for num in range(25):
+            Author.objects.create(first_name='Name %s' % num, last_name='Surname %s' % (num // 3))
+
+    def walk(self, url, params=None):
+        params = dict(params or {}, after='')
+        pages = []
+        while True:
+            resp = self.client.get(url, params)
+            self.assertEqual(resp.status_code, 200)
+            self.assertTrue(resp.context['cursor_pagination'])
+            pages.append(list(resp.context['object_list']))
+            if not resp.context['page_obj'].has_next:
+                return pages
+            params['after'] = resp.context['page_obj'].next_cursor
+
+    def test_walks_every_author_once_in_order(self):
+        pages = self.walk(reverse('authors'))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        authors = [author for page in pages for author in page]
+        self.assertEqual(authors, list(Author.objects.order_by('last_name', 'pk')))
+
+    def test_no_count_query_unless_asked(self):
+        resp = self.client.get(reverse('authors'), {'after': ''})
+        self.assertIsNone(resp.context['page_obj'].total)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('authors'), {'after': resp.context['page_obj'].next_cursor})
+        resp = self.client.get(reverse('authors'), {'after': '', 'count': '1'})
+        self.assertEqual(resp.context['page_obj'].total, 25)
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(reverse('authors'), {'after': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_page_parameter_keeps_offset_pagination(self):
+        resp = self.client.get(reverse('authors'), {'page': 2})
+        self.assertNotIn('cursor_pagination', resp.context)
+        self.assertEqual(resp.context['page_obj'].number, 2)
+
+    @override_settings(CATALOG_CURSOR_PAGINATION=True)
+    def test_setting_enables_cursor_mode(self):
+        resp = self.client.get(reverse('authors'))
+        self.assertTrue(resp.context['cursor_pagination'])
+        self.assertContains(resp, 'after=')
+
+    def check_search_walk(self):
+        for num in range(12):
+            Book.objects.create(title='Title %02d' % num, summary='s', isbn='1')
+        # совпадение только в описании - ниже совпадений в названии, хотя по алфавиту первое
+        other = Book.objects.create(title='Alpha', summary='Title', isbn='1')
+        pages = self.walk(reverse('books'), {'q': 'Title'})
+        books = [book for page in pages for book in page]
+        self.assertEqual([len(page) for page in pages], [10, 3])
+        self.assertEqual(books[-1], other)
+        resp = self.client.get(reverse('books'), {'q': 'Title', 'page': 1})
+        resp2 = self.client.get(reverse('books'), {'q': 'Title', 'page': 2})
+        self.assertEqual(books, list(resp.context['object_list']) + list(resp2.context['object_list']))
+
+    def test_search_walks_by_rank(self):
+        self.check_search_walk()
+
+    @override_settings(CATALOG_SEARCH_BACKEND='catalog.search.LikeSearchBackend')
+    def test_like_search_walks_by_rank(self):
+        self.check_search_walk()
+
+    def test_search_cursor_rejects_plain_cursor(self):
+        resp = self.client.get(reverse('authors'), {'after': ''})
+        resp = self.client.get(reverse('authors'), {'q': 'Surname', 'after': resp.context['page_obj'].next_cursor})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_loaned_books_with_null_due_back(self):
+        user = User.objects.create_user(username='reader', password='12345')
+        book = Book.objects.create(title='Book', summary='s', isbn='1')
+        for num in range(13):
+            due_back = None if num % 4 == 0 else datetime.date.today() + datetime.timedelta(days=num % 3)
+            BookInstance.objects.create(book=book, imprint='imprint', borrower=user, status='o', due_back=due_back)
+        self.client.login(username='reader', password='12345')
+        pages = self.walk(reverse('my_books'))
+        copies = [copy.pk for page in pages for copy in page]
+        self.assertEqual(len(copies), 13)
+        self.assertEqual(len(set(copies)), 13)
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import tempfile
+from io import StringIO
+from types import SimpleNamespace
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from catalog.models import Author, Book
+from catalog.querystats import QueryRecorder, QueryStatsMiddleware, aggregate, read_records, sql_signature
+
+
+def record(url_name, total_ms, queries=None, repeated=(), status=200):
+    data = {'ts': 0, 'url_name': url_name, 'method': 'GET', 'status': status, 'total_ms': total_ms,
+            'render_ms': 1.0, 'sampled': queries is not None}
+    if queries is not None:
+        data.update(queries=queries, db_ms=queries / 10, repeated=[{'sql': sql, 'count': 3} for sql in repeated])
+    return data
+
+
+class QueryRecorderTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.books = [Book.objects.create(title=f'Книга {num}', summary='s', isbn=str(num), author=author)
+                     for num in range(4)]
+
+    def test_signature_collapses_in_lists(self):
+        self.assertEqual(sql_signature('SELECT 1 FROM t\n  WHERE id IN (%s, %s, %s)'),
+                         'SELECT 1 FROM t WHERE id IN (%s, ...)')
+
+    def test_repeated_queries(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for book in Book.objects.all():
+                str(book.author)
+            Book.objects.count()
+        self.assertEqual(recorder.count, 6)
+        self.assertGreater(recorder.seconds, 0)
+        [repeated] = recorder.repeated()
+        self.assertEqual(repeated['count'], 4)
+        self.assertIn('catalog_author', repeated['sql'])
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class QueryStatsMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.create(title='Книга', summary='s', isbn='1',
+                            author=Author.objects.create(first_name='Лев', last_name='Толстой'))
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(CATALOG_QUERY_STATS_SAMPLE_RATE=1)
+    def test_sampled_request_is_logged(self):
+        with self.assertLogs('catalog.querystats') as logs:
+            self.client.get(reverse('books'))
+        [data] = [json.loads(rec.getMessage()) for rec in logs.records]
+        self.assertEqual((data['url_name'], data['status'], data['sampled']), ('books', 200, True))
+        self.assertGreater(data['queries'], 0)
+        self.assertIsNotNone(data['render_ms'])
+        self.assertGreaterEqual(data['total_ms'], data['db_ms'])
+
+    @override_settings(CATALOG_QUERY_STATS_SAMPLE_RATE=1)
+    async def test_async_request(self):
+        with self.assertLogs('catalog.querystats') as logs:
+            await self.async_client.get(reverse('books'))
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual(data['url_name'], 'books')
+        self.assertGreater(data['queries'], 0)
+
+    @override_settings(CATALOG_QUERY_STATS_SAMPLE_RATE=1)
+    async def test_overlapping_async_requests_count_own_queries(self):
+        # оба запроса выполняют SQL на одном соединении потока thread_sensitive
+        first_queried, second_done = asyncio.Event(), asyncio.Event()
+
+        async def view(request):
+            if request.path == '/first':
+                await sync_to_async(Book.objects.count)()
+                first_queried.set()
+                await second_done.wait()
+            else:
+                await first_queried.wait()
+                for _ in range(3):
+                    await sync_to_async(Book.objects.count)()
+                second_done.set()
+            return HttpResponse()
+
+        middleware = QueryStatsMiddleware(view)
+        requests = [RequestFactory().get(path) for path in ('/first', '/second')]
+        for request in requests:
+            request.resolver_match = SimpleNamespace(view_name=request.path)
+        with self.assertLogs('catalog.querystats') as logs:
+            await asyncio.gather(*(middleware(request) for request in requests))
+        records = [json.loads(rec.getMessage()) for rec in logs.records]
+        counts = {data['url_name']: data['queries'] for data in records}
+        self.assertEqual(counts, {'/first': 1, '/second': 3})
+
+    @override_settings(CATALOG_QUERY_STATS_SAMPLE_RATE=0, CATALOG_SLOW_REQUEST_MS=None)
+    def test_unsampled_request_is_not_logged(self):
+        with self.assertNoLogs('catalog.querystats'):
+            self.client.get(reverse('books'))
+
+    @override_settings(CATALOG_QUERY_STATS_SAMPLE_RATE=0, CATALOG_SLOW_REQUEST_MS=0.001)
+    def test_slow_request_is_logged_without_sql(self):
+        with self.assertLogs('catalog.querystats') as logs:
+            self.client.get(reverse('books'))
+        data = json.loads(logs.records[0].getMessage())
+        self.assertFalse(data['sampled'])
+        self.assertNotIn('queries', data)
+
+
+class QueryReportTest(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log = os.path.join(tmp.name, 'query_stats.log')
+        # архив .1 старше текущего файла
+        with open(self.log + '.1', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(record('books', 10, queries=4)) + '\n')
+        with open(self.log, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(record('books', 30, queries=8, repeated=['SELECT author'])) + '\n')
+            f.write('обрезанная строка\n')
+            f.write(json.dumps(record('index', 600, status=500)) + '\n')
+
+    def test_aggregate(self):
+        self.assertEqual([r['total_ms'] for r in read_records(self.log)], [10, 30, 600])
+        index, books = aggregate(read_records(self.log))
+        self.assertEqual(index['url_name'], 'index')
+        self.assertEqual((index['errors'], index['sampled'], index['queries']), (1, 0, None))
+        self.assertEqual((books['requests'], books['queries'], books['max_queries']), (2, 6, 8))
+        self.assertEqual(books['p50_ms'], 20)
+        self.assertEqual(books['repeated'], [{'sql': 'SELECT author', 'requests': 1}])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('query_report', log=self.log, stdout=out)
+        self.assertIn('books: 2 запр.', out.getvalue())
+        self.assertIn('SELECT author', out.getvalue())
+        out = StringIO()
+        call_command('query_report', log=self.log, top=1, json=True, stdout=out)
+        self.assertEqual([r['url_name'] for r in json.loads(out.getvalue())], ['index'])
+        with self.assertRaises(CommandError):
+            call_command('query_report', log=self.log + '.missing')
+
+    def test_staff_page(self):
+        User.objects.create_user(username='reader', password='12345')
+        User.objects.create_user(username='staff', password='12345', is_staff=True)
+        with self.settings(CATALOG_QUERY_STATS_LOG=self.log):
+            self.client.login(username='reader', password='12345')
+            self.assertEqual(self.client.get(reverse('query_stats')).status_code, 302)
+            self.client.login(username='staff', password='12345')
+            resp = self.client.get(reverse('query_stats'))
+        self.assertContains(resp, 'SELECT author')
+        self.assertEqual([v['url_name'] for v in resp.context['views']], ['index', 'books'])
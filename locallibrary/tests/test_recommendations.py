@@ -0,0 +1,89 @@
+import datetime
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Max
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from catalog.cache import get_generations
+from catalog.circulation import checkout_copies, return_copies
+from catalog.counters import get_counters
+from catalog.models import Book, BookInstance, BookRecommendation, CirculationEvent, JobWatermark
+from catalog.recommendations import WATERMARK, build_recommendations, cooccurrence, recommendations_for
+
+
+class CooccurrenceTest(TestCase):
+
+    def test_counts_shared_readers(self):
+        matrix = cooccurrence({1: {10, 20, 30}, 2: {10, 20}, 3: {10}})
+        self.assertEqual(+matrix[10], {20: 2, 30: 1})
+        self.assertEqual(+matrix[30], {10: 1, 20: 1})
+        # только для указанных книг
+        self.assertEqual(set(cooccurrence({1: {10, 20, 30}}, {20})), {20})
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class RecommendationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.readers = [User.objects.create_user(username=f'reader{num}', password='12345') for num in range(3)]
+        cls.books = [Book.objects.create(title=f'Книга {num}', summary='s', isbn=str(num)) for num in range(4)]
+        cls.copies = [BookInstance.objects.create(book=book, imprint='i', status='a') for book in cls.books]
+
+    def borrow(self, reader, *books):
+        pks = [self.copies[num].pk for num in books]
+        checkout_copies(pks, self.readers[reader], datetime.date.today())
+        return_copies(pks)
+
+    def neighbours(self, book):
+        return [(rec.recommended_id, rec.readers) for rec in recommendations_for(self.books[book].pk)]
+
+    def test_full_and_incremental_build(self):
+        self.borrow(0, 0, 1, 2)
+        self.borrow(1, 0, 1)
+        # текущая выдача тоже часть истории
+        checkout_copies([self.copies[3].pk], self.readers[2], datetime.date.today())
+        self.borrow(2, 0)
+        self.assertEqual(build_recommendations(), {'books': 4, 'rows': 8})
+        self.assertEqual(self.neighbours(0), [(self.books[1].pk, 2), (self.books[2].pk, 1), (self.books[3].pk, 1)])
+
+        self.assertEqual(build_recommendations(), {'books': 0, 'rows': 0})
+        # новая выдача читателя 1 затрагивает только его книги
+        untouched = list(BookRecommendation.objects.filter(book=self.books[3]).values_list('pk', flat=True))
+        page = get_generations([f'book:{self.books[3].pk}'])
+        self.borrow(1, 2)
+        self.assertEqual(build_recommendations()['books'], 3)
+        # кэш страницы незатронутой книги не сбрасывается
+        self.assertEqual(get_generations([f'book:{self.books[3].pk}']), page)
+        self.assertEqual(list(BookRecommendation.objects.filter(book=self.books[3]).values_list('pk', flat=True)),
+                         untouched)
+        self.assertEqual(self.neighbours(2), [(self.books[0].pk, 2), (self.books[1].pk, 2)])
+
+    def test_watermark_advances_without_rows(self):
+        # у каждого читателя одна книга - пар нет, строк рекомендаций не будет
+        self.borrow(0, 0)
+        self.assertEqual(build_recommendations(), {'books': 0, 'rows': 0})
+        last_event = CirculationEvent.objects.aggregate(id=Max('id'))['id']
+        self.assertEqual(JobWatermark.objects.get(name=WATERMARK).value, last_event)
+        # отметка задачи не попадает в счетчики главной страницы
+        self.assertNotIn(WATERMARK, get_counters())
+        # без новых выдач истории не перечитываются
+        with mock.patch('catalog.recommendations.histories') as histories:
+            self.assertEqual(build_recommendations(), {'books': 0, 'rows': 0})
+        histories.assert_not_called()
+        self.borrow(1, 1)
+        self.assertEqual(build_recommendations(), {'books': 1, 'rows': 0})
+        self.assertEqual(JobWatermark.objects.get(name=WATERMARK).value,
+                         CirculationEvent.objects.aggregate(id=Max('id'))['id'])
+
+    def test_book_detail_shows_recommendations(self):
+        self.borrow(0, 0, 1)
+        call_command('build_recommendations', full=True, stdout=StringIO())
+        url = reverse('book_detail', kwargs={'pk': self.books[0].pk})
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Читатели также брали')
+        self.assertContains(resp, self.books[1].get_absolute_url())
+        self.assertNotContains(self.client.get(reverse('book_detail', kwargs={'pk': self.books[3].pk})),
+                               'Читатели также брали')
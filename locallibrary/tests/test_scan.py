@@ -0,0 +1,109 @@
+import datetime
+import json
+import uuid
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+from catalog.counters import get_counters, rebuild_counters
+from catalog.models import Book, BookInstance
+
+
+class ScanStationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='12345')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        cls.other = User.objects.create_user(username='other', password='12345')
+        cls.book = Book.objects.create(title='Book', summary='s', isbn='9785170000001')
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint='imprint', status='a') for _ in range(3)]
+
+    def setUp(self):
+        rebuild_counters()
+        self.client.login(username='librarian', password='12345')
+
+    def scan(self, **data):
+        return self.client.post(reverse('api_scan'), json.dumps(data), content_type='application/json')
+
+    def test_checkout_and_return_batch(self):
+        pks = [str(copy.pk) for copy in self.copies[:2]]
+        missing = str(uuid.uuid4())
+        with self.assertNumQueries(12):
+            # сессия, пользователь, два запроса прав, читатель; затем savepoint, статусы, UPDATE экземпляров,
+            # общий счетчик, available_copies, события, release; ISBN не сканировали
+            resp = self.scan(action='checkout', borrower='reader', items=[*pks, missing, 'abc'])
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['done'], 2)
+        self.assertEqual([row['result'] for row in data['results']], ['done', 'done', 'not_found', 'invalid'])
+        self.assertEqual(data['results'][0], {'item': pks[0], 'copy': pks[0], 'result': 'done'})
+        copy = BookInstance.objects.get(pk=pks[0])
+        self.assertEqual((copy.status, copy.borrower), ('o', self.reader))
+        self.assertEqual(copy.due_back, datetime.date.today() + datetime.timedelta(weeks=3))
+        self.assertEqual(get_counters()['num_instance_available'], 1)
+
+        data = self.scan(action='return', items=[pks[0], pks[0], str(self.copies[2].pk)]).json()
+        # повторный скан того же экземпляра не считается второй операцией
+        self.assertEqual([row['result'] for row in data['results']], ['done', 'duplicate', 'conflict'])
+        self.assertEqual(data['done'], 1)
+        self.assertEqual(get_counters()['num_instance_available'], 2)
+        self.assertEqual(Book.objects.get(pk=self.book.pk).available_copies, 2)
+
+    def test_isbn_picks_distinct_copies(self):
+        due_back = (datetime.date.today() + datetime.timedelta(days=5)).isoformat()
+        isbn = '978-5-17-000000-1'
+        data = self.scan(action='checkout', borrower='reader', due_back=due_back,
+                         items=[isbn, str(self.copies[0].pk), isbn, isbn]).json()
+        self.assertEqual([row['result'] for row in data['results']], ['done', 'done', 'done', 'not_found'])
+        self.assertEqual(len({row['copy'] for row in data['results'][:3]}), 3)
+        self.assertFalse(BookInstance.objects.filter(status='a').exists())
+
+        BookInstance.objects.filter(pk=self.copies[1].pk).update(borrower=self.other)
+        # по ISBN возвращаются только экземпляры этого читателя
+        data = self.scan(action='return', borrower='reader', items=[isbn, isbn, isbn]).json()
+        self.assertEqual([row['result'] for row in data['results']], ['done', 'done', 'not_found'])
+        self.assertEqual(BookInstance.objects.get(pk=self.copies[1].pk).status, 'o')
+
+    def test_isbn_stored_with_hyphens(self):
+        book = Book.objects.create(title='Other', summary='s', isbn='0-306-40615-x')
+        copy = BookInstance.objects.create(book=book, imprint='imprint', status='a')
+        data = self.scan(action='checkout', borrower='reader', items=['030640615X']).json()
+        self.assertEqual(data['results'], [{'item': '030640615X', 'copy': str(copy.pk), 'result': 'done'}])
+
+    def test_isbn_prefers_copy_reserved_for_borrower(self):
+        reserved = self.copies[2]
+        BookInstance.objects.filter(pk=reserved.pk).update(status='r', borrower=self.reader)
+        rebuild_counters()
+        data = self.scan(action='checkout', borrower='reader', items=['9785170000001']).json()
+        self.assertEqual(data['results'][0]['copy'], str(reserved.pk))
+        self.assertEqual(BookInstance.objects.filter(status='a').count(), 2)
+        # чужой отложенный экземпляр по ISBN не выдается
+        BookInstance.objects.filter(pk__in=[copy.pk for copy in self.copies[:2]]).update(status='r', borrower=self.other)
+        data = self.scan(action='checkout', borrower='reader', items=['9785170000001']).json()
+        self.assertEqual(data['results'][0]['result'], 'not_found')
+
+    def test_invalid_requests(self):
+        for data in [
+            {'action': 'renew', 'items': ['x']},
+            {'action': 'checkout', 'items': [str(self.copies[0].pk)]},
+            {'action': 'checkout', 'borrower': 'nobody', 'items': [str(self.copies[0].pk)]},
+            {'action': 'return', 'items': []},
+            {'action': 'return', 'items': 'x' * 5},
+            {'action': 'checkout', 'borrower': 'reader', 'due_back': '2000-01-01', 'items': [str(self.copies[0].pk)]},
+            {'action': 'checkout', 'borrower': 'reader', 'items': [str(self.copies[0].pk)],
+             'due_back': (datetime.date.today() + datetime.timedelta(weeks=5)).isoformat()},
+            {'action': 'checkout', 'borrower': 'reader', 'due_back': 'soon', 'items': [str(self.copies[0].pk)]},
+        ]:
+            resp = self.scan(**data)
+            self.assertEqual(resp.status_code, 400, data)
+            self.assertIn('error', resp.json())
+        resp = self.client.post(reverse('api_scan'), 'not json', content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_scan')).status_code, 405)
+        self.assertFalse(BookInstance.objects.exclude(status='a').exists())
+
+    def test_requires_permission(self):
+        self.client.login(username='reader', password='12345')
+        resp = self.scan(action='return', items=[str(self.copies[0].pk)])
+        self.assertEqual(resp.status_code, 403)
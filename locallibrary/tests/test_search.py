@@ -0,0 +1,77 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from catalog.models import Author, Book
+from catalog.search import FTS5SearchBackend, get_search_backend
+
+
+class SearchTestMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tolstoy = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.chekhov = Author.objects.create(first_name='Антон', last_name='Чехов')
+        cls.war = Book.objects.create(title='Война и мир', summary='Роман-эпопея', isbn='9785170906307', author=cls.tolstoy)
+        cls.anna = Book.objects.create(title='Анна Каренина', summary='Роман о войне в семье', isbn='9785699123', author=cls.tolstoy)
+        cls.garden = Book.objects.create(title='Вишнёвый сад', summary='Пьеса', isbn='9785040000', author=cls.chekhov)
+
+    def search_books(self, q):
+        resp = self.client.get(reverse('books'), {'q': q})
+        self.assertEqual(resp.status_code, 200)
+        return list(resp.context['book_lst'])
+
+    def search_authors(self, q):
+        resp = self.client.get(reverse('authors'), {'q': q})
+        self.assertEqual(resp.status_code, 200)
+        return list(resp.context['author_lst'])
+
+    def test_search_by_title_author_and_isbn(self):
+        self.assertEqual(self.search_books('сад'), [self.garden])
+        self.assertEqual(set(self.search_books('Толстой')), {self.war, self.anna})
+        self.assertEqual(self.search_books('978504'), [self.garden])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search_books('Лев Каренина'), [self.anna])
+        self.assertEqual(self.search_authors('Антон Чехов'), [self.chekhov])
+        self.assertEqual(self.search_authors('Антон Толстой'), [])
+
+    def test_title_match_ranked_first(self):
+        self.assertEqual(self.search_books('Война')[0], self.war)
+
+    def test_index_follows_model_changes(self):
+        self.garden.title = 'Чайка'
+        self.garden.save()
+        self.assertEqual(self.search_books('Чайка'), [self.garden])
+        self.assertEqual(self.search_books('сад'), [])
+        self.chekhov.last_name = 'Чехонте'
+        self.chekhov.save()
+        self.assertEqual(self.search_books('Чехонте'), [self.garden])
+        self.assertEqual(self.search_authors('Чехонте'), [self.chekhov])
+        self.chekhov.delete()
+        self.assertEqual(self.search_books('Чехонте'), [])
+        self.assertEqual(self.search_authors('Чехонте'), [])
+
+    def test_punctuation_only_query(self):
+        self.assertEqual(len(self.search_books('"')), 3)
+
+
+# страницы не кэшируются: сигналы сбрасывают кэш после коммита, а в TestCase его нет
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class FTS5SearchTest(SearchTestMixin, TestCase):
+
+    def test_default_backend_on_sqlite(self):
+        self.assertIsInstance(get_search_backend(), FTS5SearchBackend)
+
+    def test_case_insensitive_cyrillic(self):
+        # LIKE в SQLite не сворачивает регистр кириллицы, unicode61 - сворачивает
+        self.assertEqual(set(self.search_books('толстой')), {self.war, self.anna})
+
+    def test_rebuild(self):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.assertEqual(self.search_books('Вишнёвый'), [self.garden])
+        self.assertEqual(self.search_authors('Лев'), [self.tolstoy])
+
+
+@override_settings(CATALOG_SEARCH_BACKEND='catalog.search.LikeSearchBackend', CATALOG_PAGE_CACHE_TIMEOUT=0)
+class LikeSearchTest(SearchTestMixin, TestCase):
+    pass
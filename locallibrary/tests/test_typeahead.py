@@ -0,0 +1,135 @@
+import threading
+import time
+from unittest import mock
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from catalog import cache
+from catalog.models import Author, Book
+from catalog.cache import get_generations
+from catalog.typeahead import SCOPES, PrefixIndex, normalize, typeahead, warm
+
+
+class PrefixIndexTest(TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(normalize('  Ёжик   в ТУМАНЕ! '), 'ежик в тумане')
+
+    def test_prefix_of_any_word(self):
+        index = PrefixIndex()
+        index.load([(1, 'Война и мир', ['Война и мир']), (2, 'War and Peace', ['War and Peace'])])
+        self.assertEqual(index.search('мир', 10), [(1, 'Война и мир')])
+        self.assertEqual(index.search('вой', 10), [(1, 'Война и мир')])
+        self.assertEqual(index.search('PEA', 10), [(2, 'War and Peace')])
+        self.assertEqual(index.search('и м', 10), [(1, 'Война и мир')])
+        self.assertEqual(index.search('мира', 10), [])
+        self.assertEqual(index.search('', 10), [])
+
+        index.add(3, 'Мир приключений', ['Мир приключений'])
+        self.assertEqual([pk for pk, _ in index.search('мир', 10)], [1, 3])
+        self.assertEqual(len(index.search('мир', 1)), 1)
+        index.add(1, 'Анна Каренина', ['Анна Каренина'])
+        index.remove(3)
+        self.assertEqual(index.search('мир', 10), [])
+        self.assertEqual(index.search('карен', 10), [(1, 'Анна Каренина')])
+        self.assertEqual(len(index.keys), len(index.ids))
+
+
+class TypeaheadViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Лев', last_name='Толстой')
+        cls.other = Author.objects.create(first_name='Arthur', last_name='Doyle')
+        cls.book = Book.objects.create(title='Война и мир', summary='s', isbn='1', author=cls.author)
+        Book.objects.create(title='The Hound of the Baskervilles', summary='s', isbn='2', author=cls.other)
+
+    def setUp(self):
+        # данные setUpTestData откатываются без сигналов - индекс строится заново для каждого теста
+        typeahead.build()
+
+    def suggest(self, q, kind='books'):
+        resp = self.client.get(reverse('api_typeahead'), {'q': q, 'kind': kind})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()['results']
+
+    def test_books_and_authors_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('мир'), [
+                {'id': self.book.pk, 'text': 'Война и мир', 'url': self.book.get_absolute_url()},
+            ])
+            self.assertEqual([row['text'] for row in self.suggest('bask')], ['The Hound of the Baskervilles'])
+            self.assertEqual([row['id'] for row in self.suggest('лев', 'authors')], [self.author.pk])
+            self.assertEqual([row['id'] for row in self.suggest('doy', 'authors')], [self.other.pk])
+        self.assertEqual(self.client.get(reverse('api_typeahead'), {'kind': 'genres'}).status_code, 400)
+
+    def test_signals_update_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='Анна Каренина', summary='s', isbn='3', author=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.last_name = 'Толстой-Каренин'
+            self.author.save()
+        with self.assertNumQueries(0):
+            self.assertEqual([row['id'] for row in self.suggest('карен')], [book.pk])
+            self.assertEqual([row['text'] for row in self.suggest('карен', 'authors')], ['Толстой-Каренин, Лев'])
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('карен'), [])
+
+    def test_rebuilds_after_change_elsewhere(self):
+        # изменения в обход сигналов (другой процесс, массовый импорт) видны по поколениям кэша
+        Book.objects.filter(pk=self.book.pk).update(title='Мир приключений')
+        cache.invalidate_all()
+        self.assertEqual([row['text'] for row in self.suggest('прикл')], ['Мир приключений'])
+        self.assertEqual(self.suggest('война'), [])
+
+    def test_change_in_other_process_not_absorbed_by_local_change(self):
+        # другой процесс переименовал книгу и увеличил поколение, затем здесь добавлена книга
+        Book.objects.filter(pk=self.book.pk).update(title='Мир приключений')
+        cache.bump('typeahead')
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='Анна Каренина', summary='s', isbn='3', author=self.author)
+        self.assertEqual([row['text'] for row in self.suggest('прикл')], ['Мир приключений'])
+        self.assertEqual(len(self.suggest('карен')), 1)
+
+    def test_bump_from_other_cache_client_rebuilds(self):
+        # другой процесс с общим кэшем: отдельный клиент того же хранилища
+        other = caches.create_connection('default')
+        self.assertIsNot(other, caches['default'])
+        Book.objects.filter(pk=self.book.pk).update(title='Мир приключений')
+        other.incr(cache.GENERATION_KEY % 'typeahead')
+        self.assertEqual([row['text'] for row in self.suggest('прикл')], ['Мир приключений'])
+
+    def test_index_expires_without_shared_cache(self):
+        # поколения не изменились (кэш процесса), но индекс старше CATALOG_TYPEAHEAD_MAX_AGE
+        Book.objects.filter(pk=self.book.pk).update(title='Мир приключений')
+        self.assertEqual(self.suggest('прикл'), [])
+        with override_settings(CATALOG_TYPEAHEAD_MAX_AGE=0):
+            self.assertEqual([row['text'] for row in self.suggest('прикл')], ['Мир приключений'])
+
+    def test_warm_warns_about_process_local_cache(self):
+        with self.assertLogs('catalog.typeahead', 'WARNING'):
+            warm()
+
+    def test_concurrent_requests_rebuild_once(self):
+        cache.invalidate_all()
+        builds = []
+
+        def slow_build():
+            # без базы: у потоков тестов свои соединения
+            builds.append(1)
+            time.sleep(0.05)
+            typeahead.generation = get_generations(SCOPES)
+
+        with mock.patch.object(typeahead, 'build', slow_build):
+            threads = [threading.Thread(target=typeahead.ensure_fresh) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(builds), 1)
+
+    def test_search_pages_use_typeahead(self):
+        self.assertContains(self.client.get(reverse('books')), 'data-typeahead-url')
+        self.assertContains(self.client.get(reverse('authors')), 'data-typeahead-url')
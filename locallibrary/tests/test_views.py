@@ -1,10 +1,13 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from catalog.models import BookInstance, Book, Genre, Language, Author
 from django.urls import reverse
 from django.contrib.auth.models import User 
 import datetime
 from django.utils import timezone
 from django.contrib.auth.models import Permission
+from tests.utils import QueryCountMixin
+from io import StringIO
+from django.core.management import call_command
 
 class YourTestClass(TestCase):
 
@@ -29,6 +32,8 @@ class YourTestClass(TestCase):
         print("Method: test_one_plus_one_equals_two.")
         self.assertEqual(1 + 1, 2)
 
+# ответы из кэша страниц не содержат context, поэтому кэш здесь выключен
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
 class AuthorListViewTest(TestCase):
 
     @classmethod
@@ -155,4 +160,56 @@ class RenewBookInstancesViewTest(TestCase):
             invalid_date_in_future = datetime.date.today() + datetime.timedelta(weeks=5)
             resp = self.client.post(reverse('renew-book-librarian', kwargs={'pk':self.test_bookinstance1.pk,}), {'renewal_date':invalid_date_in_future} )
             self.assertEqual( resp.status_code,200)
-            self.assertFormError(resp, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
\ No newline at end of file
+            self.assertFormError(resp, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
+
+class DetailViewQueryCountTest(QueryCountMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.language = Language.objects.create(lang='English')
+        cls.book = cls.add_book()
+        cls.user = User.objects.create_user(username='reader', password='12345')
+
+    @classmethod
+    def add_book(cls):
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG', author=cls.author, language=cls.language)
+        book.genre.add(Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Drama'))
+        return book
+
+    def add_copies(self):
+        for status in ('a', 'o', 'm'):
+            BookInstance.objects.create(book=self.book, imprint='Unlikely Imprint, 2016', status=status, due_back=datetime.date.today())
+        self.book.genre.add(Genre.objects.create(name='Horror'))
+
+    def test_book_detail_queries_do_not_grow_with_copies(self):
+        self.client.login(username='reader', password='12345')
+        self.assertConstantQueries(reverse('book_detail', kwargs={'pk': self.book.pk}), self.add_copies)
+
+    def test_author_detail_queries_do_not_grow_with_books(self):
+        self.assertConstantQueries(reverse('author_detail', kwargs={'pk': self.author.pk}), self.add_book)
+
+
+class QueryPlanTest(TestCase):
+
+    def test_list_and_detail_views_use_indexes(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG', author=author)
+        book.genre.add(Genre.objects.create(name='Fantasy'))
+        user = User.objects.create_user(username='reader', password='12345')
+        BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='o', borrower=user)
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('my_books: проверено', out.getvalue())
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=600)
+    def test_warm_page_cache_does_not_hide_queries(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG', author=author)
+        self.client.get(reverse('books'))
+        self.client.get(reverse('book_detail', kwargs={'pk': book.pk}))
+        out = StringIO()
+        call_command('check_query_plans', verbosity=2, stdout=out)
+        plans = [line for line in out.getvalue().splitlines() if line.startswith(('books: ', 'book_detail: '))]
+        self.assertGreater(len(plans), 2)
+        self.assertNotIn('ни одного SELECT', out.getvalue())
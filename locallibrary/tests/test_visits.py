@@ -0,0 +1,40 @@
+from django.contrib.sessions.models import Session
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from catalog import visits
+from catalog.counters import get_counters
+from catalog.models import CatalogCounter
+
+
+class VisitCounterTest(TestCase):
+
+    def setUp(self):
+        visits.buffer.flush()
+        CatalogCounter.objects.filter(name=visits.COUNTER).delete()
+
+    def test_visitor_count_lives_in_signed_cookie(self):
+        for expected in range(3):
+            resp = self.client.get(reverse('index'))
+            self.assertEqual(resp.context['num_visits'], expected)
+        self.assertIn(visits.COOKIE, resp.cookies)
+        self.assertFalse(Session.objects.exists())
+        # подделанная cookie не принимается
+        self.client.cookies[visits.COOKIE] = '100'
+        self.assertEqual(self.client.get(reverse('index')).context['num_visits'], 0)
+
+    @override_settings(CATALOG_VISIT_FLUSH_EVERY=5, CATALOG_VISIT_FLUSH_SECONDS=3600)
+    def test_site_visits_are_flushed_in_batches(self):
+        url = reverse('index')
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            # счетчики и новые поступления, без записей
+            self.client.get(url)
+        self.client.get(url)
+        self.client.get(url)
+        resp = self.client.get(url)
+        self.assertEqual(get_counters()[visits.COUNTER], 5)
+        self.assertEqual(resp.context['num_site_visits'], 5)
+        self.client.get(url)
+        self.assertEqual(self.client.get(url).context['num_site_visits'], 7)
+        self.assertEqual(visits.buffer.flush(), 2)
+        self.assertEqual(get_counters()[visits.COUNTER], 7)
@@ -0,0 +1,25 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from catalog import visits
+
+
+class QueryCountMixin:
+    # проверка на N+1: число запросов страницы не должно зависеть от объема данных
+
+    def count_queries(self, url):
+        # накопленные посещения главной сбрасываются заранее, чтобы их запись не попала в замер
+        visits.buffer.flush()
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url, grow, rounds=2):
+        # grow() добавляет данные в фикстуру, после каждого вызова число запросов сравнивается с исходным
+        expected = self.count_queries(url)
+        for _ in range(rounds):
+            # кэш страниц сбрасывается после коммита
+            with self.captureOnCommitCallbacks(execute=True):
+                grow()
+            self.assertEqual(self.count_queries(url), expected, f'число запросов к {url} растет вместе с данными')
+        return expected